@@ -11,10 +11,13 @@ Note:
     rather than day-to-day SFM XML generation.
 """
 
-import pandas as pd
+from columnar_lookup import read_site_table
 
 # Check if the coordinates are in the right columns
-df = pd.read_csv("strsLookup.csv")
+df = read_site_table(
+    "strsLookup.csv",
+    columns=["REGION", "SITE", "LATITUDE", "LONGITUDE", "SURVEY_SIZE"],
+)
 sample = df[df["REGION"] == "MARI"].iloc[0]
 
 print(f"--- DATA AUDIT ---")
@@ -0,0 +1,283 @@
+"""
+Batch Record Resolver
+=====================
+Purpose:
+    Resolves a whole batch of manifest rows against the lookup tables at
+    once. Instead of walking site row -> island -> dictionary keywords ->
+    island region -> region keywords -> ship one granule at a time, every
+    step is a single vectorized join of the batch's key column against the
+    lookup table (a pandas Index.get_indexer hash join), so resolving a
+    100k-granule run is a handful of joins per batch.
+
+    Manifests list most sites as several tars (..._part1of3.tar, part2of3,
+    ...) that differ only in size, UUID and name, so each site is resolved
+    once per (design, mission, site) and its lookup rows reused for every
+    part, in this batch and the ones after it.
+
+    The joins produce row numbers into each LookupTable, not copies of the
+    values, so the rows handed on are the same dicts the per-record lookups
+    return and a granule's XML and input hash don't depend on which path
+    resolved it.
+
+Usage:
+    resolver = BatchResolver(lookupStore)
+    for resolution in resolver.resolve(tarFileNames):
+        if resolution.unresolved:
+            print(resolution.tar_name, "failed on", resolution.unresolved)
+
+    unresolved lists the dimensions that failed, in DIMENSIONS order; see
+    UNRESOLVED_REASONS for how xmlGenerate.py reports each one.
+"""
+
+from collections import OrderedDict, namedtuple
+
+from granule_name import GranuleNameError, parse_granule_name
+from lookup_store import (
+    dictionaryFileName,
+    fixedLookup,
+    islandLookup,
+    regionKeywordLookupTable,
+    shipLookup,
+    strsLookup,
+)
+
+Resolution = namedtuple(
+    "Resolution",
+    [
+        "tar_name",
+        "granule",
+        "lookup_file",
+        "template",
+        "site",
+        "mission_start",
+        "mission_end",
+        "site_row",
+        "dictionary_row",
+        "island_row",
+        "region_row",
+        "ship_row",
+        "unresolved",
+    ],
+)
+
+# What every part of a site shares: the Resolution fields past site, and
+# whether they depend on nothing but (design, mission, site).
+SiteResolution = namedtuple(
+    "SiteResolution",
+    ["mission_start", "mission_end", "site_row", "rows", "unresolved", "shared"],
+)
+
+# Sites kept for the parts still to come; a manifest lists a site's parts
+# together, so this only needs to span a batch or two.
+SITE_CACHE_SIZE = 4096
+
+# The site lookup table and template for each GranuleName.design.
+DESIGNS = {
+    "FIXED": (fixedLookup, "xmlTemplate_fixed.xml"),
+    "StRS": (strsLookup, "xmlTemplate_StRS.xml"),
+}
+
+DIMENSIONS = ("filename", "site", "dictionary", "island", "region", "ship")
+
+# The badFileList reason xmlGenerate.py reports for each dimension.
+UNRESOLVED_REASONS = {
+    "filename": "filename issue",
+    "site": "rowNumber issue",
+    "dictionary": "dictionaryRowNumber issue",
+    "island": "islandRowNumber issue",
+    "region": "regionNumber issue",
+    "ship": "shipName lookup issue",
+}
+
+
+def unparsed(tar_name):
+    """The Resolution of a tar name that isn't a well-formed granule name."""
+    return Resolution(tar_name, *[None] * 11, unresolved=["filename"])
+
+
+def first_rows(table, key, keys):
+    """Row number of the first row of table whose key equals each of keys.
+
+    key is a column name or a tuple of them (then keys holds tuples).
+    Returns a numpy array aligned with keys, -1 where nothing matched.
+    """
+    import numpy as np
+    import pandas as pd
+
+    values, row_numbers = table.join_index(key)
+    found = values.get_indexer(pd.Index(keys, dtype=object, tupleize_cols=False))
+    return np.where(found >= 0, row_numbers[found], -1)
+
+
+class BatchResolver:
+    """Resolves batches of tar names against one LookupStore."""
+
+    def __init__(self, store):
+        self.store = store
+        self._sites = OrderedDict()
+
+    def resolve(self, tar_names):
+        """Returns a Resolution for each tar name, in order."""
+        tar_names = list(tar_names)
+        resolutions = [None] * len(tar_names)
+        by_design = {}
+        for position, tar_name in enumerate(tar_names):
+            try:
+                granule = parse_granule_name(tar_name)
+            except GranuleNameError:
+                resolutions[position] = unparsed(tar_name)
+            else:
+                by_design.setdefault(granule.design, []).append((position, granule))
+
+        for design, parsed in by_design.items():
+            positions = [position for position, _ in parsed]
+            for position, resolution in zip(
+                positions,
+                self._resolve_design(
+                    design,
+                    [tar_names[position] for position in positions],
+                    [granule for _, granule in parsed],
+                ),
+            ):
+                resolutions[position] = resolution
+        return resolutions
+
+    def _resolve_design(self, design, names, granules):
+        lookup_file, template = DESIGNS[design]
+        keys = [(design, granule.mission, granule.site) for granule in granules]
+
+        # One join per site not seen yet, for the first of its parts.
+        sites = {}
+        first = {}
+        for position, key in enumerate(keys):
+            if key in self._sites:
+                self._sites.move_to_end(key)
+                sites[key] = self._sites[key]
+            elif key not in first:
+                first[key] = position
+        positions = list(first.values())
+        for key, site in zip(
+            first,
+            self._resolve_sites(
+                lookup_file,
+                [names[position] for position in positions],
+                [granules[position] for position in positions],
+            ),
+        ):
+            sites[key] = site
+            if site.shared:
+                self._sites[key] = site
+                if len(self._sites) > SITE_CACHE_SIZE:
+                    self._sites.popitem(last=False)
+
+        # The rare site resolved through a fallback that looks at the whole
+        # tar name is resolved again for each of its other parts.
+        resolved = [sites[key] for key in keys]
+        again = [
+            position
+            for position, key in enumerate(keys)
+            if not resolved[position].shared and first.get(key) != position
+        ]
+        for position, site in zip(
+            again,
+            self._resolve_sites(
+                lookup_file,
+                [names[position] for position in again],
+                [granules[position] for position in again],
+            ),
+        ):
+            resolved[position] = site
+
+        return [
+            Resolution(
+                name,
+                granule,
+                lookup_file,
+                template,
+                granule.site,
+                site.mission_start,
+                site.mission_end,
+                site.site_row,
+                *site.rows,
+                list(site.unresolved),
+            )
+            for name, granule, site in zip(names, granules, resolved)
+        ]
+
+    def _resolve_sites(self, lookup_file, names, granules):
+        """Returns a SiteResolution for each tar name, by batch joins."""
+        if not names:
+            return []
+        store = self.store
+        table = store.table(lookup_file)
+        sites = [granule.site for granule in granules]
+        missions = [granule.mission for granule in granules]
+        # Site: the row for (SITE, mission in the filename); the few with no
+        # such row but some row for the site get LookupStore.site_row's
+        # dual-match, so both paths pick the same row.
+        exact = first_rows(table, ("SITE", "MISSION"), list(zip(sites, missions)))
+        any_mission = first_rows(table, "SITE", sites)
+        site_rows = []
+        for name, site, exact_row, site_row in zip(names, sites, exact, any_mission):
+            if exact_row >= 0:
+                site_rows.append(table.rows[exact_row])
+            elif site_row >= 0:
+                site_rows.append(store.site_row(lookup_file, site, name))
+            else:
+                site_rows.append(None)
+
+        # Everything else hangs off the site row.
+        found = [row for row in site_rows if row is not None]
+        islands = [row.get("ISLAND") for row in found]
+        ship_codes = [
+            row["MISSION"][:2] if isinstance(row.get("MISSION"), str) else None
+            for row in found
+        ]
+        dictionary = store.table(dictionaryFileName)
+        island_table = store.table(islandLookup)
+        region_table = store.table(regionKeywordLookupTable)
+        ship_table = store.table(shipLookup)
+        dictionary_rows = _rows(
+            dictionary, first_rows(dictionary, "Island_Code", islands)
+        )
+        island_rows = _rows(
+            island_table, first_rows(island_table, "Island_Code", islands)
+        )
+        region_codes = [
+            row["Region_Code"] if row is not None else None for row in island_rows
+        ]
+        region_rows = _rows(
+            region_table, first_rows(region_table, "Region_Code", region_codes)
+        )
+        ship_rows = _rows(
+            ship_table, first_rows(ship_table, "Ship_Two_letter_code", ship_codes)
+        )
+        joined = iter(zip(dictionary_rows, island_rows, region_rows, ship_rows))
+
+        mission_dates = store.mission_dates(lookup_file)
+        resolutions = []
+        for name, granule, site_row, exact_row, any_row in zip(
+            names, granules, site_rows, exact, any_mission
+        ):
+            bounds = mission_dates.bounds.get(granule.mission)
+            start, end = bounds or mission_dates.bounds_for(name)
+            if site_row is None:
+                rows, unresolved = (None, None, None, None), ["site"]
+            else:
+                rows = next(joined)
+                unresolved = [
+                    dimension
+                    for dimension, row in zip(DIMENSIONS[2:], rows)
+                    if row is None
+                ]
+            # The dual-match and date fallbacks also look at the tar name.
+            shared = bounds is not None and (exact_row >= 0 or any_row < 0)
+            resolutions.append(
+                SiteResolution(start, end, site_row, rows, unresolved, shared)
+            )
+        return resolutions
+
+
+def _rows(table, row_numbers):
+    """The rows of table at row_numbers from first_rows, None for -1."""
+    return [table.rows[n] if n >= 0 else None for n in row_numbers.tolist()]
@@ -0,0 +1,346 @@
+"""
+Generator Benchmark Suite
+=========================
+Purpose:
+    Measures how xmlGenerate.py scales by timing each stage of the pipeline
+    on synthetic manifests of 1k, 10k and 100k granules (see synthesize.py)
+    and comparing records/sec and peak RSS against stored baselines, so a
+    regression in a hot path is caught before it reaches a production run.
+
+Stages:
+    manifest_parse  - ManifestReader over the .mnf
+    lookup          - site (dual-match), dictionary, island, region, ship rows
+    date_bounds     - mission start/end for every granule
+    resolve         - BatchResolver: the lookup and date_bounds work as batch joins
+    uuid            - get-or-create against the UUID registry
+    render          - processRecord on the resolve stage's Resolutions, as in
+                      a run: site context, input hash and template render
+    write           - writeXml, on the first --io-sample rendered records
+    post_qa         - validate_xml.py over those files
+
+Startup:
+    import          - python -c "import xmlGenerate" (no pandas/numpy/chardet)
+    one_granule     - a complete one-granule batch run of xmlGenerate.py
+    Both are checked against the absolute STARTUP_TARGETS, not baselines:
+    a tiny job should never pay for machinery it doesn't use.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # 1k, 10k, 100k
+    python benchmarks/run_benchmarks.py --sizes 1000 --check  # exit 1 on regression
+    python benchmarks/run_benchmarks.py --update-baselines
+
+    Each size runs in its own subprocess so peak RSS is measured per size.
+    Baselines are machine-specific; refresh them with --update-baselines
+    when moving to new hardware.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+BASELINE_FILE = os.path.join(BENCHMARK_DIRECTORY, "baselines.json")
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_IO_SAMPLE = 2000
+# Allowed slowdown before a stage counts as a regression; small I/O samples are noisy.
+DEFAULT_TOLERANCE = 0.5
+
+# Seconds; the best of STARTUP_REPEATS runs must come in under these.
+STARTUP_TARGETS = {"import": 0.15, "one_granule": 1.0}
+STARTUP_REPEATS = 3
+
+STAGES = [
+    "manifest_parse",
+    "lookup",
+    "date_bounds",
+    "resolve",
+    "uuid",
+    "render",
+    "write",
+    "post_qa",
+]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+class StageTimer:
+    def __init__(self):
+        self.results = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, records):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.results[name] = {
+            "records": records,
+            "seconds": round(seconds, 4),
+            "records_per_sec": round(records / seconds, 1) if seconds else None,
+        }
+
+
+def run_single(granules, io_sample, workdir):
+    """Synthesizes one dataset in workdir, times every stage, returns a dict."""
+    sys.path.insert(0, REPO_DIRECTORY)
+    sys.path.insert(0, BENCHMARK_DIRECTORY)
+    from synthesize import synthesize
+
+    manifest = synthesize(granules, workdir)
+    # xmlGenerate reads its lookup tables from the working directory.
+    os.chdir(workdir)
+    # xmlGenerate loads pandas on first use; import it up front so its import
+    # time isn't charged to whichever stage reads the first lookup table.
+    import pandas  # noqa: F401
+    import validate_xml
+    import xmlGenerate
+    from batch_resolver import DESIGNS, BatchResolver
+    from granule_name import parse_granule_name
+    from manifest_reader import ManifestReader
+
+    xmlGenerate.outputRoot = os.path.join(workdir, "output")
+    timer = StageTimer()
+
+    with timer.stage("manifest_parse", granules):
+        records = list(ManifestReader(workdir, [manifest]).records())
+    tarFileNames = [xmlGenerate.getTarFileName(record) for record in records]
+    lookupFiles = [DESIGNS[parse_granule_name(name).design][0] for name in tarFileNames]
+
+    store = xmlGenerate.lookupStore
+    with timer.stage("lookup", len(records)):
+        for tarFileName, lookupFile in zip(tarFileNames, lookupFiles):
+            siteRow = store.site_row(
+                lookupFile, parse_granule_name(tarFileName).site, tarFileName
+            )
+            store.dictionary_row(siteRow["ISLAND"])
+            islandRow = store.island_row(siteRow["ISLAND"])
+            store.region_row(islandRow["Region_Code"])
+            store.ship_row(siteRow["MISSION"][:2])
+
+    with timer.stage("date_bounds", len(records)):
+        for tarFileName, lookupFile in zip(tarFileNames, lookupFiles):
+            xmlGenerate.getDateRange(lookupFile, "min", tarFileName)
+            xmlGenerate.getDateRange(lookupFile, "max", tarFileName)
+
+    resolver = BatchResolver(store)
+    resolutions = []
+    with timer.stage("resolve", len(records)):
+        for batch in xmlGenerate.iterBatches(
+            tarFileNames, xmlGenerate.RESOLVE_BATCH_SIZE
+        ):
+            resolutions.extend(resolver.resolve(batch))
+
+    with timer.stage("uuid", len(records)):
+        uuids = [xmlGenerate.getUUID(name) for name in tarFileNames]
+    xmlGenerate.uuidRegistry.close()
+
+    today = datetime.date.today()
+    rendered = []
+    with timer.stage("render", len(records)):
+        for record, tarFileName, myUUID, resolution in zip(
+            records, tarFileNames, uuids, resolutions
+        ):
+            xmlRecord, badEntries, inputHash = xmlGenerate.processRecord(
+                record, tarFileName, myUUID, today, resolution=resolution
+            )
+            if len(rendered) < io_sample:
+                rendered.append(xmlRecord)
+
+    with timer.stage("write", len(rendered)):
+        folders = {os.path.dirname(xmlGenerate.writeXml(*xml)) for xml in rendered}
+
+    with timer.stage("post_qa", len(rendered)):
+        validate_xml.validate(sorted(folders))
+
+    return {
+        "granules": granules,
+        "stages": timer.results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_size(granules, io_sample):
+    """Runs one size in a fresh interpreter and returns its result dict."""
+    with tempfile.TemporaryDirectory(prefix="sfm_bench_") as workdir:
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--single",
+                str(granules),
+                "--io-sample",
+                str(io_sample),
+                "--workdir",
+                workdir,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def timed_run(command, cwd):
+    """Best wall-clock time of STARTUP_REPEATS runs of command, in seconds."""
+    best = None
+    for _ in range(STARTUP_REPEATS):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, capture_output=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return round(best, 3)
+
+
+def measure_startup():
+    """Times importing xmlGenerate and a one-granule batch run."""
+    sys.path.insert(0, BENCHMARK_DIRECTORY)
+    from synthesize import synthesize
+
+    with tempfile.TemporaryDirectory(prefix="sfm_startup_") as workdir:
+        manifest = synthesize(1, workdir)
+        return {
+            "import": timed_run(
+                [
+                    sys.executable,
+                    "-c",
+                    f"import sys; sys.path.insert(0, {REPO_DIRECTORY!r}); "
+                    "import xmlGenerate",
+                ],
+                workdir,
+            ),
+            "one_granule": timed_run(
+                [
+                    sys.executable,
+                    os.path.join(REPO_DIRECTORY, "xmlGenerate.py"),
+                    "--input",
+                    manifest,
+                    "--full",
+                    "-q",
+                ],
+                workdir,
+            ),
+        }
+
+
+def compare_startup(startup):
+    return [
+        f"startup {name}: {startup[name]}s vs target {target}s"
+        for name, target in STARTUP_TARGETS.items()
+        if startup.get(name) is not None and startup[name] > target
+    ]
+
+
+def compare(result, baseline, tolerance):
+    """Returns human-readable regressions of result against its baseline."""
+    regressions = []
+    for stage in STAGES:
+        now = result["stages"].get(stage, {}).get("records_per_sec")
+        then = baseline.get("stages", {}).get(stage, {}).get("records_per_sec")
+        if now and then and now < then * (1 - tolerance):
+            regressions.append(
+                f"{result['granules']} granules, {stage}: {now:,.0f} rec/s "
+                f"vs baseline {then:,.0f} rec/s"
+            )
+    now, then = result.get("peak_rss_mb"), baseline.get("peak_rss_mb")
+    if now and then and now > then * (1 + tolerance):
+        regressions.append(
+            f"{result['granules']} granules, peak RSS: {now} MB vs baseline {then} MB"
+        )
+    return regressions
+
+
+def print_table(results):
+    print(
+        f"{'GRANULES'.ljust(10)} | {'STAGE'.ljust(15)} | {'REC/S'.rjust(12)} | SECONDS"
+    )
+    print("-" * 56)
+    for result in results:
+        for stage in STAGES:
+            timing = result["stages"][stage]
+            print(
+                f"{str(result['granules']).ljust(10)} | {stage.ljust(15)} | "
+                f"{timing['records_per_sec'] or 0:>12,.0f} | {timing['seconds']}"
+            )
+        print(
+            f"{str(result['granules']).ljust(10)} | {'peak RSS (MB)'.ljust(15)} | "
+            f"{result['peak_rss_mb']}"
+        )
+        print("-" * 56)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--io-sample", type=int, default=DEFAULT_IO_SAMPLE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.single:
+        result = run_single(arguments.single, arguments.io_sample, arguments.workdir)
+        print(json.dumps(result))
+        return 0
+
+    results = [run_size(size, arguments.io_sample) for size in arguments.sizes]
+    startup = measure_startup()
+    if arguments.json:
+        print(json.dumps({"sizes": results, "startup": startup}, indent=2))
+    else:
+        print_table(results)
+        for name, seconds in startup.items():
+            print(
+                f"{'startup'.ljust(10)} | {name.ljust(15)} | {seconds:>11}s | "
+                f"target {STARTUP_TARGETS[name]}s"
+            )
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if arguments.update_baselines:
+        for result in results:
+            baselines[str(result["granules"])] = result
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines saved to {BASELINE_FILE}")
+        return 0
+
+    regressions = compare_startup(startup)
+    for result in results:
+        if str(result["granules"]) in baselines:
+            regressions += compare(
+                result, baselines[str(result["granules"])], arguments.tolerance
+            )
+    for regression in regressions:
+        print("REGRESSION: " + regression)
+    if arguments.check and regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
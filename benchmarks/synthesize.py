@@ -0,0 +1,158 @@
+"""
+Synthetic Benchmark Data
+========================
+Purpose:
+    Builds a self-contained working directory for benchmarking xmlGenerate.py:
+    a .mnf manifest of N granules plus matching strsLookup.csv,
+    fixedLookup.csv and uuidLookup.csv. The small dictionaries and XML
+    templates are copied from the repository so every lookup resolves the
+    same way it does in production.
+
+Usage:
+    python benchmarks/synthesize.py 10000 /tmp/sfm_bench_10k
+
+    Granules are spread over several missions, islands and both designs,
+    with one to three tar parts per site, like a real multi-cruise delivery.
+    The same size and seed always produce the same files.
+"""
+
+import csv
+import os
+import random
+import shutil
+import sys
+import uuid
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Copied unchanged; the site tables, manifest and UUID list are synthesized.
+STATIC_FILES = [
+    "SfM_Dictionary.csv",
+    "islandLookup.csv",
+    "Region_Keywords.csv",
+    "shipLookup.csv",
+    "projectLookup.csv",
+    "xmlTemplate_StRS.xml",
+    "xmlTemplate_fixed.xml",
+]
+
+# Share of granules that already have a UUID, as on a rerun of old cruises.
+KNOWN_UUID_SHARE = 0.9
+
+
+def read_header(file_name):
+    with open(os.path.join(REPO_DIRECTORY, file_name), newline="") as f:
+        return next(csv.reader(f))
+
+
+def load_islands():
+    """Returns (island code, region code) pairs every lookup table knows."""
+    with open(
+        os.path.join(REPO_DIRECTORY, "islandLookup.csv"), encoding="utf-8-sig"
+    ) as f:
+        islands = [
+            (row["Island_Code"], row["Region_Code"]) for row in csv.DictReader(f)
+        ]
+    with open(os.path.join(REPO_DIRECTORY, "SfM_Dictionary.csv")) as f:
+        dictionary = {row["Island_Code"] for row in csv.DictReader(f)}
+    return [island for island in islands if island[0] in dictionary]
+
+
+def synthesize(granules, directory, seed=0):
+    """Writes a benchmark working directory with about `granules` tar rows.
+
+    Returns the path of the manifest it wrote.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for file_name in STATIC_FILES:
+        shutil.copy(os.path.join(REPO_DIRECTORY, file_name), directory)
+
+    islands = load_islands()
+    ships = ["SE", "HA", "NF", "RA", "MP"]
+    missions = []
+    for number in range(max(2, granules // 2000)):
+        year = 2019 + number % 6
+        missions.append((f"{ships[number % len(ships)]}{year % 100}{number:02d}", year))
+
+    headers = {
+        "StRS": read_header("strsLookup.csv"),
+        "FIXED": read_header("fixedLookup.csv"),
+    }
+    site_rows = {"StRS": [], "FIXED": []}
+    manifest_rows = []
+    uuid_rows = []
+    site_number = 0
+    while len(manifest_rows) < granules:
+        site_number += 1
+        design = "FIXED" if site_number % 4 == 0 else "StRS"
+        mission, year = missions[site_number % len(missions)]
+        island, region = islands[site_number % len(islands)]
+        site = f"{island}-{site_number:05d}"
+        month, day = rng.randint(4, 9), rng.randint(1, 28)
+        latitude = round(rng.uniform(-15.0, 28.0), 6)
+        longitude = round(rng.uniform(-178.0, 145.0), 6)
+        images = rng.randint(500, 4500)
+
+        row = dict.fromkeys(headers[design], "")
+        row.update(
+            {
+                "YEAR": year,
+                "REGION": region,
+                "ISLAND": island,
+                "MISSION": mission,
+                "SITE": site,
+                "DATE": f"{month}/{day}/{year}",
+                "LATITUDE": latitude,
+                "LONGITUDE": longitude,
+                "SURVEY_SIZE": "3x20m" if design == "StRS" else "12m",
+                "NUMBER OF IMAGES": images,
+                "CAMERA_MODEL": "Canon SL2",
+                "LENS_FOCAL_LENGTH": "18mm",
+                "EXPOSURE_CORRECTION": "N",
+                "COLOR_CORRECTED": "N",
+            }
+        )
+        site_rows[design].append(row)
+
+        parts = rng.randint(1, 3)
+        for part in range(1, parts + 1):
+            tar_name = (
+                f"NCRMP_SFM_{design}_{year}_{mission}_{region}_{island}_{site}"
+                f"_c{year + 1}0903_part{part}of{parts}.tar"
+            )
+            manifest_rows.append(
+                [
+                    tar_name,
+                    f"{rng.getrandbits(128):032x}",
+                    rng.randint(10**9, 2 * 10**10),
+                    str(uuid.UUID(int=rng.getrandbits(128))),
+                    "20260205",
+                ]
+            )
+            if rng.random() < KNOWN_UUID_SHARE:
+                uuid_rows.append([tar_name, str(uuid.UUID(int=rng.getrandbits(128)))])
+
+    for design, file_name in (("StRS", "strsLookup.csv"), ("FIXED", "fixedLookup.csv")):
+        with open(os.path.join(directory, file_name), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=headers[design])
+            writer.writeheader()
+            writer.writerows(site_rows[design])
+
+    with open(os.path.join(directory, "uuidLookup.csv"), "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Filename", "UUID"])
+        writer.writerows(uuid_rows)
+
+    manifest = os.path.join(directory, f"Synthetic_{granules}.mnf")
+    with open(manifest, "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows(manifest_rows[:granules])
+    return manifest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python benchmarks/synthesize.py <granules> <directory>")
+        sys.exit(2)
+    path = synthesize(int(sys.argv[1]), sys.argv[2])
+    print(f"Wrote {path}")
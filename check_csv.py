@@ -10,16 +10,16 @@ Usage:
     catch missing coordinates or invalid data types before generation.
 """
 
-import pandas as pd
+from columnar_lookup import read_site_table
+from lookup_store import MissionDateIndex, fixedLookup
 
-# Load the CSV
-df = pd.read_csv("fixedLookup.csv")
+# Load just the columns needed (from the typed Parquet copy when it is
+# current) and reuse the generator's per-mission date index, which parses
+# the DATE column with the same explicit format xmlGenerate.py uses.
+frame = read_site_table(fixedLookup, columns=["MISSION", "DATE"])
 
-# Convert the DATE column to actual datetime objects
-df["DATE"] = pd.to_datetime(df["DATE"])
-
-# Group by Mission and find the min and max dates for each
-summary = df.groupby("MISSION")["DATE"].agg(["min", "max"])
+# Min and max dates for each Mission
+summary = MissionDateIndex(frame).summary
 
 print("--- EXPECTED MISSION DATES FROM CSV ---")
 print(summary)
@@ -8,45 +8,236 @@ Purpose:
 Usage:
     Identifies any dropped sites or failed generations within a batch run
     to ensure 100% data completeness before catalog submission.
+
+    python check_missing.py                      # every *_metadata.csv here
+    python check_missing.py answer_keys --receipt uuidLookup.csv --json
+
+    Every granule filename in the receipt (uuidLookup.csv) is parsed once
+    with granule_name.py into its parts (design, mission, site, part N of M
+    and so on) and indexed, so each answer key is checked with set
+    operations on exact site IDs rather than a substring search per site.
+    For each answer key this reports the sites that are missing, the extra
+    sites generated for the same mission, design and region (every region
+    of the mission if the answer key names none), and the partial sites
+    that are missing some parts of a multi-part tar. Exits 1 if any answer
+    key has missing or partial sites.
 """
 
-import pandas as pd
+import argparse
+import csv
+import fnmatch
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+
+from granule_name import GranuleNameError, canonical_design, parse_granule_name
+
+# NCRMP_SFM_StRS_2024_SE2406_MHI_metadata.csv (region is optional)
+ANSWER_KEY_PATTERN = re.compile(
+    r"^(?P<program>[A-Z]*CRMP)_SFM_(?P<design>FIXED|STRS)_(?P<year>\d{4})"
+    r"_(?P<mission>[A-Z]{2}\d{4})(?:_(?P<region>[^_]+))?_",
+    re.IGNORECASE,
+)
+
+DEFAULT_RECEIPT = "uuidLookup.csv"
+DEFAULT_PATTERN = "*_metadata.csv"
+
+
+class GranuleIndex:
+    """Generated granules grouped by (design, mission, region), then by site.
+
+    parts[(design, mission, region, site)] maps each part count M seen for
+    that site to the set of part numbers present, so part2of3 missing from
+    part1of3 + part3of3 shows up as a partial site.
+    """
+
+    def __init__(self, filenames):
+        self.sites = defaultdict(set)
+        self.parts = defaultdict(lambda: defaultdict(set))
+        self.unparsed = []
+        for filename in filenames:
+            try:
+                granule = parse_granule_name(filename)
+            except GranuleNameError:
+                self.unparsed.append(filename)
+                continue
+            scope = (granule.design, granule.mission.upper(), granule.region.upper())
+            self.sites[scope].add(granule.site)
+            self.parts[scope + (granule.site,)][granule.parts].add(granule.part)
+
+    @classmethod
+    def from_receipt(cls, receipt_file):
+        """Builds the index from the filename column of uuidLookup.csv."""
+        with open(receipt_file, newline="", encoding="utf-8", errors="ignore") as f:
+            reader = csv.reader(f)
+            return cls(row[0] for row in reader if row and row[0] != "Filename")
+
+    def scopes(self, design, mission, region=None):
+        """Returns the (design, mission, region) groups an answer key covers:
+        its one region, or every region of the mission if region is None."""
+        return [
+            scope
+            for scope in self.sites
+            if scope[:2] == (design, mission) and region in (None, scope[2])
+        ]
+
+    def is_complete(self, design, mission, region, site):
+        """True if some part count M has every part 1..M present."""
+        return any(
+            present.issuperset(range(1, parts + 1))
+            for parts, present in self.parts[(design, mission, region, site)].items()
+        )
 
-# --- CHANGE THIS LINE TO TEST DIFFERENT CRUISES ---
-answer_key_file = "NCRMP_SFM_StRS_2024_SE2406_MHI_metadata.csv"
-receipt_file = "uuidLookup.csv"
 
-print(f"--- Checking {answer_key_file} ---")
+def read_answer_key(answer_key_file):
+    """Returns the expected {(design, mission, region): set of sites} of an
+    answer key.
 
-try:
-    # Load the Team Lead's CSV and your UUID list
-    expected_df = pd.read_csv(answer_key_file)
-    # Assuming uuidLookup has no headers, just filename and uuid
-    actual_df = pd.read_csv(receipt_file, header=None, names=["filename", "uuid"])
+    Design, mission and region come from the answer key's filename (region
+    is None if it names none); a MISSION column, if the CSV has one,
+    overrides the mission row by row.
+    """
+    name = ANSWER_KEY_PATTERN.match(os.path.basename(answer_key_file))
+    if name is None:
+        raise ValueError("filename doesn't name a design and mission")
+    design, mission = canonical_design(name["design"]), name["mission"].upper()
+    region = name["region"].upper() if name["region"] else None
 
-    # Grab all the sites your Team Lead expects
-    expected_sites = expected_df["SITE"].dropna().unique()
+    expected = defaultdict(set)
+    with open(answer_key_file, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if "SITE" not in (reader.fieldnames or []):
+            raise ValueError("no SITE column")
+        for row in reader:
+            site = (row["SITE"] or "").strip()
+            if not site:
+                continue
+            row_mission = (row.get("MISSION") or "").strip().upper() or mission
+            expected[(design, row_mission, region)].add(site)
+    return expected
 
-    missing_sites = []
-    found_count = 0
 
-    for site in expected_sites:
-        # If the site ID exists anywhere in your completed filename list, it's a match
-        if actual_df["filename"].str.contains(str(site), regex=False).any():
-            found_count += 1
-        else:
-            missing_sites.append(site)
+def audit(answer_key_file, index):
+    """Compares one answer key with the index and returns its result dict."""
+    expected = read_answer_key(answer_key_file)
+    missing, extra, partial = set(), set(), set()
+    expected_count = found_count = 0
+    for key_scope, sites in expected.items():
+        scopes = index.scopes(*key_scope)
+        generated = set().union(*(index.sites[scope] for scope in scopes))
+        found = sites & generated
+        expected_count += len(sites)
+        found_count += len(found)
+        missing |= sites - generated
+        extra |= generated - sites
+        partial |= {
+            site
+            for site in found
+            if not any(
+                index.is_complete(*scope, site)
+                for scope in scopes
+                if site in index.sites[scope]
+            )
+        }
+    return {
+        "answerKey": answer_key_file,
+        "expected": expected_count,
+        "found": found_count,
+        "missing": sorted(missing),
+        "partial": sorted(partial),
+        "extra": sorted(extra),
+    }
 
-    print(f"Total Sites Expected: {len(expected_sites)}")
-    print(f"Total Sites Found: {found_count}")
-    print(f"Total Sites MISSING: {len(missing_sites)}")
 
-    if len(missing_sites) > 0:
+def find_answer_keys(directory, pattern=DEFAULT_PATTERN):
+    with os.scandir(directory) as entries:
+        return sorted(
+            entry.path
+            for entry in entries
+            if entry.is_file() and fnmatch.fnmatch(entry.name, pattern)
+        )
+
+
+def print_result(result):
+    print(f"--- Checking {result['answerKey']} ---")
+    if "error" in result:
+        print(f"Skipped: {result['error']}\n")
+        return
+    print(f"Total Sites Expected: {result['expected']}")
+    print(f"Total Sites Found: {result['found']}")
+    print(f"Total Sites MISSING: {len(result['missing'])}")
+    print(f"Total Sites PARTIAL: {len(result['partial'])}")
+    print(f"Total Sites EXTRA: {len(result['extra'])}")
+
+    if result["missing"]:
         print("\nHere are the exact sites you are missing:")
-        for missing in missing_sites:
+        for missing in result["missing"]:
             print(f"- {missing}")
-    else:
+    if result["partial"]:
+        print("\nThese sites are missing some parts of a multi-part tar:")
+        for partial in result["partial"]:
+            print(f"- {partial}")
+    if result["extra"]:
+        print("\nThese sites were generated but aren't in the answer key:")
+        for extra in result["extra"]:
+            print(f"- {extra}")
+    if not result["missing"] and not result["partial"]:
         print("\nSUCCESS! You have generated 100% of the files for this cruise.")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        default=".",
+        help="Folder of answer-key CSVs (default: here).",
+    )
+    parser.add_argument("--receipt", default=DEFAULT_RECEIPT)
+    parser.add_argument(
+        "--pattern",
+        default=DEFAULT_PATTERN,
+        help=f"Answer-key filename pattern (default: {DEFAULT_PATTERN}).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    arguments = parser.parse_args(argv)
+
+    if not os.path.exists(arguments.receipt):
+        print(f"Error: Make sure {arguments.receipt} is in this folder!")
+        return 2
+    answer_keys = find_answer_keys(arguments.directory, arguments.pattern)
+    if not answer_keys:
+        print(f"Error: no {arguments.pattern} answer keys in {arguments.directory}!")
+        return 2
+
+    index = GranuleIndex.from_receipt(arguments.receipt)
+    results = []
+    for answer_key_file in answer_keys:
+        try:
+            results.append(audit(answer_key_file, index))
+        except ValueError as error:
+            results.append({"answerKey": answer_key_file, "error": str(error)})
+
+    if arguments.json:
+        print(
+            json.dumps(
+                {"unparsedReceiptNames": index.unparsed, "results": results}, indent=2
+            )
+        )
+    else:
+        for result in results:
+            print_result(result)
+        for filename in index.unparsed:
+            print(f"Unrecognized filename in {arguments.receipt}: {filename}")
+
+    incomplete = any(
+        result.get("missing") or result.get("partial") for result in results
+    )
+    return 1 if incomplete else 0
+
 
-except FileNotFoundError:
-    print(f"Error: Make sure {answer_key_file} and {receipt_file} are in this folder!")
+if __name__ == "__main__":
+    sys.exit(main())
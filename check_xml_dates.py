@@ -8,36 +8,49 @@ Purpose:
 Usage:
     Acts as an automated QA check to ensure dynamic date calculations in
     xmlGenerate.py were applied correctly and to prevent historical data bleeding.
+    Prints the begin/end dates validate_xml.py found in one folder next to
+    the mission bounds from the lookup CSV; run validate_xml.py directly to
+    check several folders at once and get the full JSON report.
 """
 
 import os
-import re
+
+import validate_xml
 
 # Put the folder name containing your newly generated XMLs here
 FOLDER_TO_CHECK = "Updated_Main_Hawaiian_Islands_2026_04_20"
 
+DATE_ISSUES = (
+    "missing beginPosition",
+    "missing endPosition",
+    "date outside mission",
+    "mission range mismatch",
+    "unparseable filename",
+)
 
-def check_dates():
-    print(f"{'FILENAME'.ljust(60)} | {'START DATE'.ljust(12)} | {'END DATE'}")
-    print("-" * 90)
-
-    for filename in os.listdir(FOLDER_TO_CHECK):
-        if not filename.endswith(".xml"):
-            continue
-
-        with open(os.path.join(FOLDER_TO_CHECK, filename), "r", encoding="utf-8") as f:
-            content = f.read()
 
-            # Find the start and end dates in the XML
-            start_match = re.search(
-                r"<gml:beginPosition>(.*?)</gml:beginPosition>", content
-            )
-            end_match = re.search(r"<gml:endPosition>(.*?)</gml:endPosition>", content)
-
-            start_date = start_match.group(1) if start_match else "MISSING"
-            end_date = end_match.group(1) if end_match else "MISSING"
-
-            print(f"{filename[:58].ljust(60)} | {start_date.ljust(12)} | {end_date}")
+def check_dates():
+    report = validate_xml.validate([FOLDER_TO_CHECK])
+    print(
+        f"{'FILENAME'.ljust(60)} | {'START DATE'.ljust(12)} | {'END DATE'.ljust(12)} "
+        f"| {'CSV BOUNDS'.ljust(23)} | STATUS"
+    )
+    print("-" * 124)
+
+    for result in report["results"]:
+        filename = os.path.basename(result["file"])
+        start_date = result["begin"] or "MISSING"
+        end_date = result["end"] or "MISSING"
+        bounds = " - ".join(result["expected"]) if result["expected"] else "UNKNOWN"
+        problems = [
+            issue["kind"] for issue in result["issues"] if issue["kind"] in DATE_ISSUES
+        ]
+        status = ", ".join(problems) if problems else "OK"
+
+        print(
+            f"{filename[:58].ljust(60)} | {start_date.ljust(12)} | {end_date.ljust(12)} "
+            f"| {bounds.ljust(23)} | {status}"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+"""
+Collection (Parent) Records
+===========================
+Purpose:
+    Gathers what the parent record of each collection needs: the record
+    every granule's parentRecordID (e.g. SE1902_2019_StRS_sfm) points at.
+    As xmlGenerate.py resolves each batch of manifest rows, the batch's
+    granules are grouped by parent ID in one vectorized groupby and folded
+    into running per-collection totals: bounding box, survey date range,
+    granule, site and image counts, and total tar size. What is kept grows
+    with the number of collections and sites, not with the manifests.
+
+Usage:
+    collections = CollectionAggregator()
+    collections.add(mnfRecords, resolutions)  # once per resolved batch
+    for summary in collections.summaries():   # CollectionSummary tuples
+        ...
+
+    parent_record_id() is also what xmlGenerate.py stamps into each granule,
+    so a granule and its parent record can't disagree on the ID.
+"""
+
+import re
+from collections import namedtuple
+
+from lookup_store import SITE_DATE_FORMAT
+
+# Added to the mission in output folder names and parent record IDs.
+DESIGN_SUFFIXES = {"FIXED": "_Fixed", "StRS": "_StRS"}
+
+# What parent_record_id() builds: mission, year, SE2406's region, design.
+PARENT_RECORD_ID_PATTERN = re.compile(
+    r"^[A-Z]{2}\d{4}_\d{4}(?:_.+)?(?P<suffix>"
+    + "|".join(DESIGN_SUFFIXES.values())
+    + r")_sfm$"
+)
+
+CollectionSummary = namedtuple(
+    "CollectionSummary",
+    [
+        "parent_id",
+        "design",
+        "mission",
+        "year",
+        "regions",
+        "ships",
+        "west",
+        "east",
+        "south",
+        "north",
+        "start",
+        "end",
+        "sites",
+        "granules",
+        "images",
+        "size_bytes",
+    ],
+)
+
+# How each batch is reduced per parent ID, and how batch totals combine.
+_BATCH_TOTALS = {
+    "west": ("longitude", "min"),
+    "east": ("longitude", "max"),
+    "south": ("latitude", "min"),
+    "north": ("latitude", "max"),
+    "start": ("survey_date", "min"),
+    "end": ("survey_date", "max"),
+    "granules": ("tar_name", "size"),
+    "size_bytes": ("size_bytes", "sum"),
+}
+_COMBINE_TOTALS = {
+    "west": "min",
+    "east": "max",
+    "south": "min",
+    "north": "max",
+    "start": "min",
+    "end": "max",
+    "granules": "sum",
+    "size_bytes": "sum",
+}
+
+
+def parent_record_id(mission, year, region, design):
+    """Returns the parentRecordID of a granule's collection.
+
+    Collections are per mission, year and design, except that SE2406
+    surveyed more than one region and has a collection for each (region is
+    the site row's REGION).
+    """
+    suffix = DESIGN_SUFFIXES[design]
+    if mission == "SE2406":
+        return mission + "_" + year + "_" + region.replace(" ", "_") + suffix + "_sfm"
+    return mission + "_" + year + suffix + "_sfm"
+
+
+def parent_record_design(parent_id):
+    """Returns the design of a parent_record_id() ID, or None if parent_id
+    isn't one."""
+    match = PARENT_RECORD_ID_PATTERN.match(parent_id)
+    if match is None:
+        return None
+    for design, suffix in DESIGN_SUFFIXES.items():
+        if suffix == match.group("suffix"):
+            return design
+
+
+class CollectionAggregator:
+    """Running per-collection totals over every resolved granule of a run.
+
+    A tar listed in more than one manifest is only counted once, and the
+    images of a multi-part site only once per collection. Tars are told
+    apart by the (c-date, part) pairs already seen for their site, so no
+    tar names are kept.
+    """
+
+    def __init__(self):
+        self._totals = None
+        self._site_parts = {}
+        self._site_images = {}
+        self._labels = {}
+
+    def add(self, mnf_records, resolutions):
+        """Folds in one batch of manifest records and their Resolutions;
+        the ones that didn't fully resolve are left out."""
+        import pandas as pd
+
+        granules = [
+            (mnf_record, resolution)
+            for mnf_record, resolution in zip(mnf_records, resolutions)
+            if not resolution.unresolved
+        ]
+        if not granules:
+            return
+        site_rows = [resolution.site_row for _, resolution in granules]
+        frame = pd.DataFrame(
+            {
+                "tar_name": [resolution.tar_name for _, resolution in granules],
+                "part": [
+                    (resolution.granule.collection_date, resolution.granule.part)
+                    for _, resolution in granules
+                ],
+                "design": [resolution.granule.design for _, resolution in granules],
+                "mission": [row["MISSION"] for row in site_rows],
+                "year": [str(row["DATE"])[-4:] for row in site_rows],
+                "region": [row["REGION"] for row in site_rows],
+                "region_name": [
+                    resolution.island_row["Region_Name"] for _, resolution in granules
+                ],
+                "ship": [
+                    resolution.ship_row["Ship Keyword"] for _, resolution in granules
+                ],
+                "site": [resolution.site for _, resolution in granules],
+                "longitude": [row["LONGITUDE"] for row in site_rows],
+                "latitude": [row["LATITUDE"] for row in site_rows],
+                "survey_date": pd.to_datetime(
+                    [row["DATE"] for row in site_rows], format=SITE_DATE_FORMAT
+                ),
+                "images": [row["NUMBER OF IMAGES"] for row in site_rows],
+                "size_bytes": [mnf_record.size_bytes for mnf_record, _ in granules],
+            }
+        )
+        frame["parent_id"] = [
+            parent_record_id(mission, year, region, design)
+            for mission, year, region, design in zip(
+                frame["mission"], frame["year"], frame["region"], frame["design"]
+            )
+        ]
+        seen = self._site_parts
+        frame = frame[
+            [
+                part not in seen.get((parent_id, site), ())
+                for parent_id, site, part in zip(
+                    frame["parent_id"], frame["site"], frame["part"]
+                )
+            ]
+        ].drop_duplicates(["parent_id", "site", "part"])
+        if frame.empty:
+            return
+        for parent_id, site, part in zip(
+            frame["parent_id"], frame["site"], frame["part"]
+        ):
+            seen.setdefault((parent_id, site), set()).add(part)
+
+        totals = frame.groupby("parent_id").agg(**_BATCH_TOTALS)
+        if self._totals is not None:
+            totals = (
+                pd.concat([self._totals, totals]).groupby(level=0).agg(_COMBINE_TOTALS)
+            )
+        self._totals = totals
+
+        sites = frame.drop_duplicates(["parent_id", "site"])
+        self._site_images.update(
+            zip(zip(sites["parent_id"], sites["site"]), sites["images"])
+        )
+        labels = frame.drop_duplicates(["parent_id", "region_name", "ship"])
+        for parent_id, design, mission, year, region_name, ship in zip(
+            labels["parent_id"],
+            labels["design"],
+            labels["mission"],
+            labels["year"],
+            labels["region_name"],
+            labels["ship"],
+        ):
+            entry = self._labels.setdefault(
+                parent_id, (design, mission, year, set(), set())
+            )
+            entry[3].add(region_name)
+            entry[4].add(ship)
+
+    def __len__(self):
+        return 0 if self._totals is None else len(self._totals)
+
+    def summaries(self):
+        """Returns a CollectionSummary per collection, in parent ID order."""
+        if self._totals is None:
+            return []
+        sites = {}
+        images = {}
+        for (parent_id, _), site_images in self._site_images.items():
+            sites[parent_id] = sites.get(parent_id, 0) + 1
+            if site_images == site_images:  # not NaN (no image count)
+                images[parent_id] = images.get(parent_id, 0) + int(site_images)
+
+        summaries = []
+        for parent_id, totals in self._totals.sort_index().iterrows():
+            design, mission, year, regions, ships = self._labels[parent_id]
+            summaries.append(
+                CollectionSummary(
+                    parent_id,
+                    design,
+                    mission,
+                    year,
+                    tuple(sorted(regions)),
+                    tuple(sorted(ships)),
+                    float(totals["west"]),
+                    float(totals["east"]),
+                    float(totals["south"]),
+                    float(totals["north"]),
+                    totals["start"],
+                    totals["end"],
+                    sites[parent_id],
+                    int(totals["granules"]),
+                    images.get(parent_id, 0),
+                    int(totals["size_bytes"]),
+                )
+            )
+        return summaries
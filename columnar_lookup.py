@@ -0,0 +1,174 @@
+"""
+Columnar Site Lookups
+=====================
+Purpose:
+    Optional typed Parquet copies of the site lookup tables (strsLookup.csv
+    and fixedLookup.csv), which grow every cruise. The CSVs stay the masters;
+    the .parquet file beside each one holds the same rows with REGION,
+    ISLAND, MISSION and CAMERA_MODEL as categoricals and DATE as a parsed
+    date, plus the sha256 of the CSV it was converted from. A copy is only
+    read while that CSV is unchanged, so a stale one is simply ignored.
+
+    pyarrow is only needed to convert and to read the copies. Without it, or
+    without a current copy, everything reads the CSV exactly as before.
+
+Usage:
+    python columnar_lookup.py [DIRECTORY]   # (re)convert after editing a CSV
+
+    # Only the columns a tool needs, typed, from whichever source is current:
+    frame = read_site_table("strsLookup.csv", columns=["MISSION", "DATE"])
+
+    LookupStore reads a current copy instead of parsing the CSV (see
+    lookup_frame), so xmlGenerate.py and validate_xml.py use it with no
+    option to set.
+"""
+
+import importlib.util
+import io
+import json
+import os
+import sys
+
+from lookup_store import SITE_DATE_FORMAT, file_digest, fixedLookup, strsLookup
+
+SITE_TABLES = (strsLookup, fixedLookup)
+CATEGORICAL_COLUMNS = ("REGION", "ISLAND", "MISSION", "CAMERA_MODEL")
+
+# Parquet schema metadata: the CSV's sha256 and the dtypes pandas gave it.
+SOURCE_DIGEST_KEY = b"sfm.source_sha256"
+CSV_DTYPES_KEY = b"sfm.csv_dtypes"
+
+
+def columnar_path(csv_path):
+    """Returns where the Parquet copy of csv_path lives."""
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def have_pyarrow():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def typed_frame(frame):
+    """Returns a copy of frame with the categorical columns and DATE typed."""
+    import pandas as pd
+
+    typed = frame.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in typed:
+            typed[column] = typed[column].astype("category")
+    if "DATE" in typed:
+        typed["DATE"] = pd.to_datetime(typed["DATE"], format=SITE_DATE_FORMAT)
+    return typed
+
+
+def plain_frame(typed, dtypes):
+    """Undoes typed_frame, giving back the frame pd.read_csv produced.
+
+    DATE is written back the way the lookup CSVs have it (5/4/2019).
+    """
+    frame = typed.copy()
+    if "DATE" in frame:
+        dates = frame["DATE"]
+        text = (
+            dates.dt.month.astype("Int64").astype(str)
+            + "/"
+            + dates.dt.day.astype("Int64").astype(str)
+            + "/"
+            + dates.dt.year.astype("Int64").astype(str)
+        )
+        frame["DATE"] = text.where(dates.notna(), None)
+    for column, dtype in dtypes.items():
+        if str(frame[column].dtype) != dtype:
+            frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def convert(csv_path):
+    """Writes the Parquet copy of csv_path and returns its path.
+
+    Raises:
+        ValueError: The copy wouldn't read back as exactly the CSV's rows,
+            e.g. a DATE written 05/04/2019 rather than 5/4/2019.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    frame = pd.read_csv(io.BytesIO(data))
+    dtypes = {column: str(dtype) for column, dtype in frame.dtypes.items()}
+    typed = typed_frame(frame)
+    if not plain_frame(typed, dtypes).equals(frame):
+        raise ValueError(f"{csv_path} doesn't round-trip through the typed columns")
+
+    table = pa.Table.from_pandas(typed, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_DIGEST_KEY] = file_digest(csv_path).encode("ascii")
+    metadata[CSV_DTYPES_KEY] = json.dumps(dtypes).encode("utf-8")
+    path = columnar_path(csv_path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table.replace_schema_metadata(metadata), temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+def _current_metadata(csv_path, digest=None):
+    """Returns the schema metadata of csv_path's Parquet copy if there is one,
+    pyarrow can read it, and it was converted from the CSV as it is now."""
+    path = columnar_path(csv_path)
+    if not os.path.exists(path) or not have_pyarrow():
+        return None
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    if digest is None:
+        digest = file_digest(csv_path)
+    if metadata.get(SOURCE_DIGEST_KEY) != digest.encode("ascii"):
+        return None
+    return metadata
+
+
+def lookup_frame(csv_path, digest):
+    """Returns what pd.read_csv(csv_path) would, read from a current Parquet
+    copy, or None if there isn't one. digest is the CSV's sha256."""
+    metadata = _current_metadata(csv_path, digest)
+    if metadata is None:
+        return None
+    import pyarrow.parquet as pq
+
+    typed = pq.read_table(columnar_path(csv_path)).to_pandas()
+    return plain_frame(typed, json.loads(metadata[CSV_DTYPES_KEY]))
+
+
+def read_site_table(csv_path, columns=None):
+    """Returns csv_path's rows typed as in the Parquet copy, reading only
+    columns (all if None), from the copy when it is current."""
+    import pandas as pd
+
+    if _current_metadata(csv_path) is not None:
+        import pyarrow.parquet as pq
+
+        return pq.read_table(columnar_path(csv_path), columns=columns).to_pandas()
+    frame = typed_frame(pd.read_csv(csv_path, usecols=columns))
+    return frame if columns is None else frame[list(columns)]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    directory = argv[0] if argv else "."
+    if not have_pyarrow():
+        print("pyarrow is needed to write Parquet copies: pip install pyarrow")
+        return 1
+    for file_name in SITE_TABLES:
+        csv_path = os.path.join(directory, file_name)
+        path = convert(csv_path)
+        print(
+            f"{csv_path} ({os.path.getsize(csv_path):,} bytes) -> "
+            f"{path} ({os.path.getsize(path):,} bytes)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
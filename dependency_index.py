@@ -0,0 +1,126 @@
+"""
+Granule Dependency Index
+========================
+Purpose:
+    Works out which lookup-table rows and template each granule's XML is
+    built from, as (source, key, digest) triples that the run journal keeps
+    per granule. The source is a lookup CSV or template file name, the key
+    picks the rows of it the granule used (every row for its SITE, its
+    island's Island_Code, its mission's survey date bounds, ...), and the
+    digest hashes those rows as they were when the XML was written.
+
+    "xmlGenerate.py --regenerate-affected" digests every key in the journal
+    again from the CSVs and templates as they are now, and regenerates just
+    the granules holding a key whose rows changed, so a one-keyword fix in
+    SfM_Dictionary.csv rewrites the granules of that island, not the whole
+    accession.
+
+Usage:
+    index = DependencyIndex(lookupStore, templateRegistry)
+    dependencies = index.dependencies(resolution, projectNumber)
+    journal.record(tarFileName, inputHash, outputPath, dependencies, mnfRecord)
+    ...
+    stale = journal.stale_dependencies(index.digest)
+    for filename, mnfRecord in journal.manifest_records(journal.dependents(stale)):
+        ...
+"""
+
+import functools
+import json
+
+from lookup_store import (
+    dictionaryFileName,
+    islandLookup,
+    projectLookup,
+    regionKeywordLookupTable,
+    shipLookup,
+)
+from run_journal import input_hash
+
+# Key kinds that aren't a column: a mission's survey date bounds, which come
+# from every row of that mission, and a template's version.
+MISSION_DATES = "mission dates"
+TEMPLATE_VERSION = "version"
+
+
+@functools.lru_cache(maxsize=4096)
+def dependency_key(*parts):
+    """Returns the journal key for a key column (or kind) and value."""
+    return json.dumps(list(parts))
+
+
+class DependencyIndex:
+    """Digests what each granule was built from, cached for one run."""
+
+    def __init__(self, store, templates):
+        self.store = store
+        self.templates = templates
+        self._digests = {}
+        self._dependencies = {}
+
+    def dependencies(self, resolution, project_number):
+        """Returns the (source, key, digest) triples of a fully resolved
+        granule, as a tuple: its site, mission dates, dictionary, island,
+        region, ship and project rows, and its template."""
+        # Everything but the project and template follows from the site row,
+        # so every part of a multi-part site shares one tuple.
+        cache_key = (
+            resolution.lookup_file,
+            resolution.site,
+            resolution.granule.mission,
+            resolution.template,
+            project_number,
+        )
+        if cache_key not in self._dependencies:
+            self._dependencies[cache_key] = self._dependencies_of(
+                resolution, project_number
+            )
+        return self._dependencies[cache_key]
+
+    def _dependencies_of(self, resolution, project_number):
+        site_row = resolution.site_row
+        mission = resolution.granule.mission
+        if mission not in self.store.mission_dates(resolution.lookup_file).bounds:
+            # The bounds came from MissionDateIndex.bounds_for's fallback,
+            # which can use any mission in the table.
+            mission = None
+        keys = [
+            (resolution.lookup_file, dependency_key("SITE", resolution.site)),
+            (resolution.lookup_file, dependency_key(MISSION_DATES, mission)),
+            (dictionaryFileName, dependency_key("Island_Code", site_row["ISLAND"])),
+            (islandLookup, dependency_key("Island_Code", site_row["ISLAND"])),
+            (
+                regionKeywordLookupTable,
+                dependency_key("Region_Code", resolution.island_row["Region_Code"]),
+            ),
+            (
+                shipLookup,
+                dependency_key("Ship_Two_letter_code", site_row["MISSION"][:2]),
+            ),
+            (projectLookup, dependency_key("projectNumber", int(project_number))),
+            (resolution.template, dependency_key(TEMPLATE_VERSION)),
+        ]
+        return tuple((source, key, self.digest(source, key)) for source, key in keys)
+
+    def digest(self, source, key):
+        """Returns the digest of the rows key selects from source as they
+        are now (every row holding the key value, not just the first)."""
+        if (source, key) not in self._digests:
+            kind, *value = json.loads(key)
+            if kind == TEMPLATE_VERSION:
+                digest = self.templates.get(source).version
+            elif kind == MISSION_DATES:
+                bounds = self.store.mission_dates(source).bounds
+                if value[0] is None:
+                    digest = input_hash(sorted(bounds.items(), key=str))
+                else:
+                    digest = input_hash(bounds.get(value[0]))
+            else:
+                table = self.store.table(source)
+                if kind not in table.indexes:
+                    table.add_index(kind)
+                digest = input_hash(
+                    *[table.rows[n] for n in table.row_numbers(kind, value[0])]
+                )
+            self._digests[source, key] = digest
+        return self._digests[source, key]
@@ -0,0 +1,131 @@
+"""
+Granule Filename Parser
+=======================
+Purpose:
+    The one place that knows how an SfM granule is named. Every pipeline
+    script (xmlGenerate.py, check_missing.py, recover_uuids.py) turns a tar,
+    csv, dat or xml filename into a typed GranuleName with this module
+    instead of splitting on "_" and picking fields by position.
+
+Usage:
+    granule = parse_granule_name(
+        "NCRMP_SFM_FIXED_2024_MP2404_MHI_OAH_OCC-OAH-002_c20250903_part1of3.tar"
+    )
+    granule.design, granule.mission, granule.site  # "FIXED", "MP2404", "OCC-OAH-002"
+    granule.part, granule.parts                    # 1, 3
+    granule.collection_date                        # datetime.date(2025, 9, 3)
+
+    parse_granule_name raises GranuleNameError for anything that isn't a
+    granule name, so a malformed name fails fast with a reason instead of
+    resolving against the wrong site.
+"""
+
+import datetime
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# NCRMP_SFM_FIXED_2024_MP2404_MHI_OAH_OCC-OAH-002_c20250903_part1of3.tar
+GRANULE_NAME_PATTERN = re.compile(
+    r"^(?P<program>[A-Z]*CRMP)_SFM_(?P<design>FIXED|STRS)_(?P<year>\d{4})"
+    r"_(?P<mission>[A-Z]{2}\d{4})_(?P<region>[^_]+)_(?P<island>[^_]+)"
+    r"_(?P<site>[^_]+)_c(?P<created>\d{8})_part(?P<part>\d+)of(?P<parts>\d+)"
+    r"(?:[.](?P<extension>tar|csv|dat|xml))?$",
+    re.IGNORECASE,
+)
+
+# How each design is spelled in folder names, templates and parent IDs.
+DESIGN_NAMES = {"FIXED": "FIXED", "STRS": "StRS"}
+
+GranuleName = namedtuple(
+    "GranuleName",
+    [
+        "program",
+        "design",
+        "year",
+        "mission",
+        "region",
+        "island",
+        "site",
+        "collection_date",
+        "part",
+        "parts",
+        "extension",
+    ],
+)
+
+
+class GranuleNameError(ValueError):
+    """Raised for a filename that isn't a well-formed granule name."""
+
+
+def canonical_design(design):
+    """Returns "FIXED" or "StRS" for any casing of either, else raises."""
+    try:
+        return DESIGN_NAMES[design.upper()]
+    except KeyError:
+        raise GranuleNameError(f"unknown design {design!r}")
+
+
+def canonical_name(filename):
+    """Fixes up old CRMP_SFM_* names to the NCRMP program prefix."""
+    if "NCRMP" not in filename:
+        filename = filename.replace("CRMP", "NCRMP")
+    return filename
+
+
+# Each name is looked at by several stages within a few batches of each
+# other, so a small cache catches the repeats without growing with the run.
+@lru_cache(maxsize=4096)
+def parse_granule_name(filename):
+    """Parses a granule filename (any folder part is ignored).
+
+    Returns a GranuleName: design is "FIXED" or "StRS", year, part and
+    parts are ints, collection_date is the c-date as a datetime.date and
+    extension is lower-case ("" if there is none). Everything else is kept
+    as written.
+
+    Raises:
+        GranuleNameError: The name doesn't follow the granule layout, its
+            c-date isn't a real date, or its part isn't 1..parts.
+    """
+    name = os.path.basename(filename.strip())
+    match = GRANULE_NAME_PATTERN.match(name)
+    if match is None:
+        raise GranuleNameError(f"not a granule name: {name}")
+    (
+        program,
+        design,
+        year,
+        mission,
+        region,
+        island,
+        site,
+        created,
+        part,
+        parts,
+        extension,
+    ) = match.groups()
+    try:
+        collection_date = datetime.date(
+            int(created[:4]), int(created[4:6]), int(created[6:])
+        )
+    except ValueError:
+        raise GranuleNameError(f"bad collection date c{created}: {name}")
+    part, parts = int(part), int(parts)
+    if not 1 <= part <= parts:
+        raise GranuleNameError(f"part {part} of {parts}: {name}")
+    return GranuleName(
+        program,
+        DESIGN_NAMES[design.upper()],
+        int(year),
+        mission,
+        region,
+        island,
+        site,
+        collection_date,
+        part,
+        parts,
+        (extension or "").lower(),
+    )
@@ -0,0 +1,174 @@
+"""
+Generator Instrumentation
+=========================
+Purpose:
+    Lightweight counters and cumulative per-stage timers for xmlGenerate.py,
+    plus the JSON run report written at the end of a run: throughput, time
+    spent in each stage (lookup, date range, UUID, render, write), the
+    slowest records and skip reasons by category. Lets a production run be
+    profiled without editing the script.
+
+Usage:
+    metrics = Instrumentation()
+    with metrics.stage("render"):
+        xmlText = template.render(myDict)
+    metrics.count("written")
+    metrics.report(records=353, elapsedSeconds=1.2)
+
+    Worker processes collect into their own Instrumentation and hand a
+    drain() snapshot back with each result; the parent merge()s it.
+
+    FailureLog holds the records that failed, in bounded memory.
+"""
+
+import csv
+import heapq
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# How many of the slowest records the run report lists.
+DEFAULT_SLOWEST = 10
+
+# How many failures a FailureLog keeps in memory to list in the summary.
+DEFAULT_LISTED_FAILURES = 1000
+
+
+class Instrumentation:
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.slowest = slowest
+        self.counters = Counter()
+        self.skip_reasons = Counter()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = Counter()
+        self._slowest_records = []
+
+    @contextmanager
+    def stage(self, name):
+        """Adds the time spent inside the with-block to stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds, calls=1):
+        self.stage_seconds[name] += seconds
+        self.stage_calls[name] += calls
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def skip(self, reason, amount=1):
+        """Counts a record skipped for reason (e.g. "rowNumber issue")."""
+        self.skip_reasons[reason] += amount
+
+    def record_duration(self, label, seconds):
+        """Keeps label if it is among the slowest records seen so far."""
+        entry = (seconds, label)
+        if len(self._slowest_records) < self.slowest:
+            heapq.heappush(self._slowest_records, entry)
+        elif entry > self._slowest_records[0]:
+            heapq.heapreplace(self._slowest_records, entry)
+
+    def drain(self):
+        """Returns everything collected so far as a picklable dict and resets."""
+        snapshot = {
+            "counters": dict(self.counters),
+            "skip_reasons": dict(self.skip_reasons),
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_calls": dict(self.stage_calls),
+            "slowest_records": list(self._slowest_records),
+        }
+        self.__init__(self.slowest)
+        return snapshot
+
+    def merge(self, snapshot):
+        """Folds a drain() snapshot (e.g. from a worker) into this collector."""
+        self.counters.update(snapshot["counters"])
+        self.skip_reasons.update(snapshot["skip_reasons"])
+        for name, seconds in snapshot["stage_seconds"].items():
+            self.add_time(name, seconds, snapshot["stage_calls"].get(name, 0))
+        for seconds, label in snapshot["slowest_records"]:
+            self.record_duration(label, seconds)
+
+    def report(self, records, elapsedSeconds):
+        """Returns the JSON-serializable run report."""
+        return {
+            "records": records,
+            "elapsedSeconds": round(elapsedSeconds, 3),
+            "recordsPerSecond": (
+                round(records / elapsedSeconds, 1) if elapsedSeconds else None
+            ),
+            "stages": {
+                name: {
+                    "calls": self.stage_calls[name],
+                    "seconds": round(seconds, 4),
+                }
+                for name, seconds in sorted(
+                    self.stage_seconds.items(), key=lambda item: -item[1]
+                )
+            },
+            "counters": dict(self.counters),
+            "skipReasons": dict(self.skip_reasons.most_common()),
+            "slowestRecords": [
+                {"file": label, "seconds": round(seconds, 4)}
+                for seconds, label in sorted(self._slowest_records, reverse=True)
+            ],
+        }
+
+
+class FailureLog:
+    """The {filename: reason} entries of records that couldn't be generated.
+
+    Every entry is counted, and written to a filename,reason CSV as it
+    arrives if path is given, but only the first `listed` are kept in
+    memory, so a run with millions of failures still runs in flat memory.
+    Iterating yields the kept entries; len() is the total. With append,
+    rows are added to an existing CSV instead of starting a new one.
+    """
+
+    def __init__(self, listed=DEFAULT_LISTED_FAILURES, path=None, append=False):
+        self.listed = listed
+        self.entries = []
+        self.total = 0
+        self._file = None
+        self._writer = None
+        if path:
+            self._file = open(
+                path, "a" if append else "w", newline="", encoding="utf-8"
+            )
+            self._writer = csv.writer(self._file)
+            if self._file.tell() == 0:
+                self._writer.writerow(["Filename", "Reason"])
+
+    def append(self, badEntry):
+        self.total += 1
+        if len(self.entries) < self.listed:
+            self.entries.append(badEntry)
+        if self._writer is not None:
+            self._writer.writerows(badEntry.items())
+
+    def extend(self, badEntries):
+        for badEntry in badEntries:
+            self.append(badEntry)
+
+    @property
+    def omitted(self):
+        """How many entries were counted but not kept."""
+        return self.total - len(self.entries)
+
+    def clear(self):
+        self.entries = []
+        self.total = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = self._writer = None
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return iter(self.entries)
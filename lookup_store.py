@@ -0,0 +1,419 @@
+"""
+Lookup Table Store
+==================
+Purpose:
+    Loads each CSV lookup table used by xmlGenerate.py once per run and keeps
+    it in memory with hash indexes on the columns the generator searches by,
+    so resolving a manifest row is a handful of dictionary lookups instead of
+    a dozen pd.read_csv calls.
+
+Usage:
+    store = LookupStore(myDirectory)
+    siteRow = store.site_row("strsLookup.csv", "HAW-3341", tarFileName)
+    islandRow = store.dictionary_row(siteRow["ISLAND"])
+    missionStart, missionEnd = store.mission_dates("strsLookup.csv").bounds_for(
+        tarFileName
+    )
+
+    Each table is parsed and indexed once and then pickled into a
+    .lookup_cache folder beside the CSVs, so later runs (and the watch and
+    QA tools) load it without parsing the CSV at all. A cached table is used
+    while the CSV's size and mtime are unchanged, or if they changed but
+    its sha256 didn't (a copy or a touch); any real edit rebuilds it. Pass
+    LookupStore(directory, cache=False) to always read the CSVs. A table
+    not in the cache is read from its typed Parquet copy when there is a
+    current one (columnar_lookup.py, needs pyarrow).
+"""
+
+import hashlib
+import io
+import os
+import pickle
+
+# pandas is imported where a table is first read, not here, so importing
+# this module (and xmlGenerate.py) stays cheap until a lookup is needed.
+
+dictionaryFileName = "SfM_Dictionary.csv"
+islandLookup = "islandLookup.csv"
+fixedLookup = "fixedLookup.csv"
+strsLookup = "strsLookup.csv"
+projectLookup = "projectLookup.csv"
+regionKeywordLookupTable = "Region_Keywords.csv"
+shipLookup = "shipLookup.csv"
+
+# Format of the DATE column in strsLookup.csv / fixedLookup.csv (e.g. 5/4/2019).
+SITE_DATE_FORMAT = "%m/%d/%Y"
+
+# Folder (inside the lookup directory) holding the parsed tables, and the
+# version of what is pickled there; bump it when LookupTable's contents change.
+CACHE_DIRECTORY = ".lookup_cache"
+CACHE_VERSION = 1
+
+# Columns (or column tuples) each table is indexed on when it is loaded.
+TABLE_INDEXES = {
+    strsLookup: ("SITE", ("SITE", "MISSION")),
+    fixedLookup: ("SITE", ("SITE", "MISSION")),
+    dictionaryFileName: ("Island_Code",),
+    islandLookup: ("Island_Code",),
+    regionKeywordLookupTable: ("Region_Code",),
+    shipLookup: ("Ship_Two_letter_code",),
+    projectLookup: ("projectNumber",),
+}
+
+
+def file_fingerprint(path):
+    """Returns (size, mtime_ns) of path, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_digest(path):
+    """Returns the sha256 hex digest of the whole of path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LookupTable:
+    """A single CSV lookup table held as a list of row dicts plus indexes.
+
+    Row numbers are the positional index pandas assigns on read.
+
+    With a cache_path the parsed table is loaded from there when it is
+    still current, and written there after the CSV has been parsed.
+    """
+
+    def __init__(self, file_name, key_columns=(), cache_path=None):
+        self.file_name = file_name
+        self.fingerprint = file_fingerprint(file_name)
+        self._join_indexes = {}
+        key_columns = tuple(key_columns)
+        if cache_path is not None and self._load_cache(cache_path, key_columns):
+            return
+
+        import pandas as pd
+
+        from columnar_lookup import lookup_frame
+
+        with open(file_name, "rb") as f:
+            data = f.read()
+        self.digest = hashlib.sha256(data).hexdigest()
+        # A current Parquet copy (see columnar_lookup.py) reads faster than
+        # parsing the CSV and gives back the same frame.
+        df = lookup_frame(file_name, self.digest)
+        if df is None:
+            df = pd.read_csv(io.BytesIO(data))
+        self.frame = df
+        self.columns = list(df.columns)
+        self.rows = df.to_dict("records")
+        self.indexes = {}
+        for key in key_columns:
+            self.add_index(key)
+        if cache_path is not None:
+            self._save_cache(cache_path, key_columns)
+
+    def _load_cache(self, cache_path, key_columns):
+        """Takes the table from cache_path if it was built from this CSV."""
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except Exception:
+            # Missing, truncated, or pickled by another pandas: just rebuild.
+            return False
+        import pandas as pd
+
+        if (
+            not isinstance(cached, dict)
+            or cached.get("version") != CACHE_VERSION
+            or cached.get("pandas") != pd.__version__
+            or cached.get("key_columns") != key_columns
+            or self.fingerprint is None
+        ):
+            return False
+        if cached["fingerprint"] != self.fingerprint:
+            if file_digest(self.file_name) != cached["digest"]:
+                return False
+        self.digest = cached["digest"]
+        self.frame = cached["frame"]
+        self.columns = cached["columns"]
+        self.rows = cached["rows"]
+        self.indexes = cached["indexes"]
+        if cached["fingerprint"] != self.fingerprint:
+            # Same bytes under a new mtime: record it so the next load is quick.
+            self._save_cache(cache_path, key_columns)
+        return True
+
+    def _save_cache(self, cache_path, key_columns):
+        """Pickles the table to cache_path; a cache that can't be written is
+        simply skipped."""
+        import pandas as pd
+
+        cached = {
+            "version": CACHE_VERSION,
+            "pandas": pd.__version__,
+            "key_columns": key_columns,
+            "fingerprint": self.fingerprint,
+            "digest": self.digest,
+            "frame": self.frame,
+            "columns": self.columns,
+            "rows": self.rows,
+            "indexes": self.indexes,
+        }
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(temp_path, "wb") as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def add_index(self, key):
+        """Builds a hash index on one column name or a tuple of column names.
+
+        Every key maps to the row numbers holding it, in file order, so the
+        first entry is the same row a pandas boolean mask would find first.
+        """
+        index = {}
+        for row_number, row in enumerate(self.rows):
+            if isinstance(key, tuple):
+                value = tuple(row.get(column) for column in key)
+            else:
+                value = row.get(key)
+            index.setdefault(value, []).append(row_number)
+        self.indexes[key] = index
+
+    def join_index(self, key):
+        """Returns (values, row numbers) for joining a whole column of keys.
+
+        values is a pandas Index of every distinct non-null value of the
+        key column(s) and row numbers a numpy array of the first row holding
+        each, so values.get_indexer(keys) finds the same rows first() would
+        for a batch of keys at once. Built once per key from the hash index.
+        """
+        if key not in self._join_indexes:
+            import numpy as np
+            import pandas as pd
+
+            if key not in self.indexes:
+                self.add_index(key)
+            entries = [
+                (value, row_numbers[0])
+                for value, row_numbers in self.indexes[key].items()
+                if not _has_null(value)
+            ]
+            self._join_indexes[key] = (
+                pd.Index(
+                    [value for value, _ in entries], dtype=object, tupleize_cols=False
+                ),
+                np.array([row_number for _, row_number in entries], dtype=np.intp),
+            )
+        return self._join_indexes[key]
+
+    def changed(self):
+        """True if the CSV on disk is no longer the one this table was read from."""
+        return file_fingerprint(self.file_name) != self.fingerprint
+
+    def row_numbers(self, key, value):
+        return self.indexes[key].get(value, [])
+
+    def first(self, key, value):
+        """Returns the first row whose key column(s) equal value, or None."""
+        matches = self.row_numbers(key, value)
+        if not matches:
+            return None
+        return self.rows[matches[0]]
+
+    def append(self, row):
+        """Adds a row written to the CSV during this run to every index."""
+        self._join_indexes.clear()
+        row_number = len(self.rows)
+        self.rows.append(row)
+        for key, index in self.indexes.items():
+            if isinstance(key, tuple):
+                value = tuple(row.get(column) for column in key)
+            else:
+                value = row.get(key)
+            index.setdefault(value, []).append(row_number)
+
+
+def _has_null(value):
+    """True for NaN/None, or a tuple key containing one."""
+    if isinstance(value, tuple):
+        return any(_has_null(part) for part in value)
+    return value is None or value != value
+
+
+class MissionDateIndex:
+    """Survey date bounds for every mission in one site lookup table.
+
+    Built with a single groupby when the table is first needed, so finding
+    a granule's mission start/end is a dict lookup rather than a scan.
+    """
+
+    def __init__(self, frame):
+        import pandas as pd
+
+        dates = frame["DATE"]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, format=SITE_DATE_FORMAT)
+        grouped = pd.DataFrame({"MISSION": frame["MISSION"], "DATE": dates})
+        self.summary = grouped.groupby("MISSION")["DATE"].agg(["min", "max"])
+        self.bounds = {
+            mission: (start, end)
+            for mission, start, end in zip(
+                self.summary.index, self.summary["min"], self.summary["max"]
+            )
+        }
+        self.overall = (dates.min(), dates.max())
+
+    def mission_for(self, filename):
+        """Returns the mission token of an NCRMP_SFM_* filename, or None.
+
+        The mission is the fifth "_" field (e.g. MP2404); it only counts if
+        the table actually has rows for it.
+        """
+        fields = filename.split("_")
+        if len(fields) > 4 and fields[4] in self.bounds:
+            return fields[4]
+        return None
+
+    def bounds_for(self, filename):
+        """Returns (start, end) Timestamps for the mission in filename.
+
+        Names that don't follow the usual layout fall back to the old
+        behaviour: every mission appearing anywhere in the filename, and
+        the whole table if none do.
+        """
+        mission = self.mission_for(filename)
+        if mission is not None:
+            return self.bounds[mission]
+
+        matches = [
+            bounds for name, bounds in self.bounds.items() if str(name) in filename
+        ]
+        if not matches:
+            return self.overall
+        return (
+            min(start for start, _ in matches),
+            max(end for _, end in matches),
+        )
+
+
+class LookupStore:
+    """Lazily loads and caches every lookup table for the length of a run."""
+
+    def __init__(self, directory=".", cache=True):
+        self.directory = directory
+        self.cache = cache
+        self._tables = {}
+        self._mission_dates = {}
+
+    def table(self, file_name):
+        if file_name not in self._tables:
+            cache_path = None
+            if self.cache:
+                cache_path = os.path.join(
+                    self.directory, CACHE_DIRECTORY, file_name + ".pickle"
+                )
+            self._tables[file_name] = LookupTable(
+                os.path.join(self.directory, file_name),
+                TABLE_INDEXES.get(file_name, ()),
+                cache_path,
+            )
+        return self._tables[file_name]
+
+    def load_all(self):
+        """Loads every table and mission date index up front.
+
+        Used before handing the store to worker processes so that none of
+        them has to read a CSV of its own.
+        """
+        for file_name in TABLE_INDEXES:
+            self.table(file_name)
+        for lookup_file in (strsLookup, fixedLookup):
+            self.mission_dates(lookup_file)
+
+    def refresh(self):
+        """Forgets every loaded table whose CSV has changed since it was read.
+
+        Changed tables (and their mission date indexes) are read again the
+        next time they are needed. Returns the names of the changed files,
+        so a long-running caller can tell when its lookups were edited.
+        """
+        changed = sorted(
+            name for name, table in self._tables.items() if table.changed()
+        )
+        for name in changed:
+            del self._tables[name]
+            self._mission_dates.pop(name, None)
+        return changed
+
+    def mission_dates(self, lookup_file):
+        """Returns the MissionDateIndex for strsLookup.csv or fixedLookup.csv."""
+        if lookup_file not in self._mission_dates:
+            self._mission_dates[lookup_file] = MissionDateIndex(
+                self.table(lookup_file).frame
+            )
+        return self._mission_dates[lookup_file]
+
+    def site_row(self, lookup_file, site, target_filename=None):
+        """Finds the site row in strsLookup/fixedLookup.
+
+        When target_filename is given, prefer the row whose MISSION appears
+        in the filename and fall back to the first row for the site
+        otherwise.
+        """
+        table = self.table(lookup_file)
+        candidates = table.row_numbers("SITE", site)
+        if not candidates:
+            return None
+
+        if target_filename:
+            fields = target_filename.split("_")
+            if len(fields) > 4:
+                exact = table.row_numbers(("SITE", "MISSION"), (site, fields[4]))
+                if exact:
+                    return table.rows[exact[0]]
+            for row_number in candidates:
+                mission_in_row = str(table.rows[row_number].get("MISSION", ""))
+                if mission_in_row and mission_in_row in target_filename:
+                    return table.rows[row_number]
+
+        return table.rows[candidates[0]]
+
+    def dictionary_row(self, island_code):
+        return self.table(dictionaryFileName).first("Island_Code", island_code)
+
+    def island_row(self, island_code):
+        return self.table(islandLookup).first("Island_Code", island_code)
+
+    def region_row(self, region_code):
+        return self.table(regionKeywordLookupTable).first("Region_Code", region_code)
+
+    def ship_row(self, ship_code):
+        return self.table(shipLookup).first("Ship_Two_letter_code", ship_code)
+
+    def project_name(self, project_number):
+        """Returns the project name for a CRCP project number, or None."""
+        row = self.table(projectLookup).first("projectNumber", int(project_number))
+        if row is None:
+            return None
+        return row["projectName"]
+
+    def add_project(self, project_number, project_name):
+        """Records a project appended to projectLookup.csv during this run."""
+        table = self.table(projectLookup)
+        table.append(
+            {"projectNumber": int(project_number), "projectName": project_name}
+        )
+        # The row is already in memory, so the append isn't a change to reload.
+        table.fingerprint = file_fingerprint(table.file_name)
@@ -0,0 +1,165 @@
+"""
+Streaming Manifest Reader
+=========================
+Purpose:
+    Reads the .mnf manifests from the ABID/OER video portal one line at a
+    time and yields a typed record per granule, so the generator can start
+    writing XML as soon as the first row is parsed and very large
+    multi-cruise manifests run in bounded memory.
+
+Usage:
+    reader = ManifestReader(myDirectory)
+    for record in reader.records():
+        print(record.tar_name, record.size_bytes)
+    print(reader.skipped)  # Counter of skipped lines by reason
+
+Manifest layout (no header):
+    tar name, md5, size in bytes, source UUID, date (yyyymmdd)
+"""
+
+import csv
+import os
+import re
+from collections import Counter, namedtuple
+
+ManifestRecord = namedtuple(
+    "ManifestRecord",
+    [
+        "manifest",
+        "line_number",
+        "tar_name",
+        "md5",
+        "size_bytes",
+        "source_uuid",
+        "date",
+    ],
+)
+
+# Manifests are plain ASCII; anything else is replaced rather than fatal.
+MANIFEST_ENCODING = "utf-8"
+
+# Granule files the generator knows how to describe, checked in this order.
+GRANULE_NAME_PATTERNS = [
+    re.compile(r".*[.]tar"),
+    re.compile(r".*[.]csv"),
+    re.compile(r".*[.]dat"),
+]
+
+
+# Skipped lines kept for reporting; the rest are only counted.
+MAX_SKIPPED_LINES = 1000
+
+
+class ManifestRowError(ValueError):
+    """Raised for a manifest line that can't be turned into a record."""
+
+
+def parse_row(row, manifest="", line_number=0):
+    """Turns one csv row of a manifest into a ManifestRecord.
+
+    Raises:
+        ManifestRowError: The row is blank, has fewer than the three required
+            columns, names no .tar/.csv/.dat file, or has a non-numeric size.
+    """
+    fields = [field.strip() for field in row]
+    if not any(fields):
+        raise ManifestRowError("blank line")
+    if len(fields) < 3:
+        raise ManifestRowError("too few columns")
+
+    tar_name = None
+    for pattern in GRANULE_NAME_PATTERNS:
+        match = pattern.match(fields[0])
+        if match:
+            tar_name = match.group(0)
+            break
+    if tar_name is None:
+        raise ManifestRowError("no granule filename")
+
+    try:
+        size_bytes = int(fields[2])
+    except ValueError:
+        raise ManifestRowError("bad file size")
+
+    return ManifestRecord(
+        manifest=manifest,
+        line_number=line_number,
+        tar_name=tar_name,
+        md5=fields[1],
+        size_bytes=size_bytes,
+        source_uuid=fields[3] if len(fields) > 3 and fields[3] else None,
+        date=fields[4] if len(fields) > 4 and fields[4] else None,
+    )
+
+
+def iter_manifests(directory):
+    """Yields the path of each .mnf file in directory as it is found."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".mnf") and entry.is_file():
+                yield entry.path
+
+
+class ManifestReader:
+    """Lazily reads every manifest in a directory (or an explicit list).
+
+    An entry of manifests may also be a (path, offset, first_line) tuple to
+    read only the rows from that position on; see read().
+
+    Lines that fail parse_row are skipped and counted by reason in
+    self.skipped; self.skipped_lines keeps (manifest, line, reason) for the
+    first max_skipped_lines of them so the caller can report exactly what
+    was dropped.
+    """
+
+    def __init__(
+        self, directory=".", manifests=None, max_skipped_lines=MAX_SKIPPED_LINES
+    ):
+        self.directory = directory
+        self.manifests = manifests
+        self.max_skipped_lines = max_skipped_lines
+        self.skipped = Counter()
+        self.skipped_lines = []
+        self.manifests_read = []
+        self.positions = {}
+
+    def records(self):
+        manifests = self.manifests
+        if manifests is None:
+            manifests = iter_manifests(self.directory)
+        for manifest in manifests:
+            if isinstance(manifest, tuple):
+                yield from self.read(*manifest)
+            else:
+                yield from self.read(manifest)
+
+    def read(self, manifest, offset=0, first_line=1):
+        """Yields the records of one manifest from byte offset onwards.
+
+        offset must be the start of line first_line, e.g. a position saved
+        from self.positions by an earlier read. After reading,
+        self.positions[manifest] is the (offset, line number) just past the
+        last newline-terminated line, where a later read can pick up rows
+        appended since; an unterminated last line is read but not passed.
+        """
+        self.manifests_read.append(manifest)
+        self.positions[manifest] = (offset, first_line)
+        lines = self._lines(manifest, offset, first_line)
+        for line_number, row in enumerate(csv.reader(lines), first_line):
+            try:
+                yield parse_row(row, manifest, line_number)
+            except ManifestRowError as error:
+                reason = str(error)
+                self.skipped[reason] += 1
+                if len(self.skipped_lines) < self.max_skipped_lines:
+                    self.skipped_lines.append((manifest, line_number, reason))
+
+    def _lines(self, manifest, offset, line_number):
+        with open(manifest, "rb") as file_obj:
+            file_obj.seek(offset)
+            for line in file_obj:
+                if line.endswith(b"\n"):
+                    offset += len(line)
+                    line_number += 1
+                    self.positions[manifest] = (offset, line_number)
+                yield line.decode(MANIFEST_ENCODING, "replace")
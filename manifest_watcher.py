@@ -0,0 +1,102 @@
+"""
+Manifest Folder Watcher
+=======================
+Purpose:
+    Tells the watch mode of xmlGenerate.py which .mnf manifests dropped into
+    a folder (from the ABID/OER video portal emails) have rows it hasn't
+    handled yet. How far each manifest has been read is kept in the run
+    journal, so a restarted watcher carries on where the last one stopped:
+    a manifest that has grown is read from where reading last got to, and
+    one that was rewritten (anything before that point changed) is read
+    again from the top, with the journal skipping the granules whose inputs
+    haven't changed.
+
+Usage:
+    watcher = ManifestWatcher(directory, runJournal)
+    pending = watcher.poll()  # [(path, offset, first_line), ...]
+    reader = ManifestReader(directory, pending)
+    ...  # process reader.records()
+    watcher.handled(reader)
+
+    A manifest is only picked up once it has gone settle_seconds without
+    being modified, so a file still being copied in isn't read half-written.
+"""
+
+import hashlib
+import os
+import time
+
+from manifest_reader import iter_manifests
+
+DEFAULT_SETTLE_SECONDS = 2.0
+
+
+def prefix_digest(path, length):
+    """Returns the sha256 hex digest of the first length bytes of path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(length, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            length -= len(chunk)
+    return digest.hexdigest()
+
+
+class ManifestWatcher:
+    """Finds the new and changed rows in a folder of manifests."""
+
+    def __init__(self, directory, journal, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        self.directory = directory
+        self.journal = journal
+        self.settle_seconds = settle_seconds
+        self._stats = {}
+        self._rescan = False
+
+    def rescan(self):
+        """Makes the next poll() read every manifest from the top, e.g. after
+        a lookup table or template changed."""
+        self._rescan = True
+
+    def poll(self):
+        """Returns (path, offset, first_line) for every manifest with rows
+        that haven't been handled, in path order."""
+        now = time.time()
+        rescan, self._rescan = self._rescan, False
+        pending = []
+        for path in sorted(iter_manifests(self.directory)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime < self.settle_seconds:
+                continue
+            start = self._start(path, stat, rescan)
+            if start is not None:
+                self._stats[path] = (stat.st_size, stat.st_mtime_ns)
+                pending.append((path,) + start)
+        return pending
+
+    def _start(self, path, stat, rescan):
+        """Returns the (offset, first_line) to read path from, or None."""
+        state = self.journal.manifest_state(path)
+        if rescan or state is None:
+            return 0, 1
+        size, mtime_ns, offset, next_line, digest = state
+        if (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return None
+        if stat.st_size >= offset and prefix_digest(path, offset) == digest:
+            return offset, next_line
+        return 0, 1
+
+    def handled(self, reader):
+        """Records how far reader got through each manifest poll() returned."""
+        for path, (offset, next_line) in reader.positions.items():
+            if path not in self._stats:
+                continue
+            size, mtime_ns = self._stats.pop(path)
+            self.journal.record_manifest(
+                path, size, mtime_ns, offset, next_line, prefix_digest(path, offset)
+            )
+        self.journal.commit()
@@ -5,41 +5,36 @@ Purpose:
     Performs a comprehensive sweep of the final XML outputs to ensure all
     required metadata fields, tags, and coordinate bounds meet NOAA Catalog
     and OSIM harvest specifications.
+
+Usage:
+    Prints the suspicious "2019" and unfilled-placeholder findings of
+    validate_xml.py for one folder. Run validate_xml.py directly to check
+    several folders at once and get the full JSON report.
 """
 
-import os
+import validate_xml
 
 # Put your newly generated folder name here:
 # FOLDER_TO_CHECK = "Updated_Main_Hawaiian_Islands_2026_04_20"
 FOLDER_TO_CHECK = "Updated_MP2011_MHI_FixedSites_2026_04_20"
 
 # These are the valid references we EXPECT to see
-VALID_PHRASES = [
-    "since 2019",
-    "established in 2019",
-    "2019-04-21",  # This is the valid master parent project start date
-    "<gco:Date>2019</gco:Date>",  # The SOP publication date
-]
+VALID_PHRASES = validate_xml.VALID_PHRASES
+
+FIELD_ISSUES = ("suspicious 2019", "unfilled placeholder")
 
 
 def scan_files():
+    report = validate_xml.validate([FOLDER_TO_CHECK])
     suspicious_files = 0
 
-    for filename in os.listdir(FOLDER_TO_CHECK):
-        if not filename.endswith(".xml"):
-            continue
-
-        filepath = os.path.join(FOLDER_TO_CHECK, filename)
-        with open(filepath, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        for line_num, line in enumerate(lines):
-            if "2019" in line:
-                # If it's not one of our known valid phrases, flag it!
-                if not any(valid in line for valid in VALID_PHRASES):
-                    print(f"Suspicious 2019 found in {filename} (Line {line_num + 1}):")
-                    print(f"  -> {line.strip()}")
-                    suspicious_files += 1
+    for result in report["results"]:
+        filename = result["file"]
+        for issue in result["issues"]:
+            if issue["kind"] in FIELD_ISSUES:
+                print(f"{issue['kind']} in {filename} (Line {issue['line']}):")
+                print(f"  -> {issue['detail']}")
+                suspicious_files += 1
 
     if suspicious_files == 0:
         print("SUCCESS: 100% clean! No suspicious 2019 dates found in any files.")
@@ -9,60 +9,252 @@ Usage:
     To be run only in the event of local file corruption, catalog mismatch,
     or when migrating historical accessions into the current tracking system to
     prevent the creation of duplicate records in the NOAA Catalog.
+
+    python recover_uuids.py                     # scan here, write UPDATED_MASTER_uuidLookup.csv
+    python recover_uuids.py archive output --merge   # merge straight into the registry
+
+    Folders are walked with os.scandir, skipping hidden and cache folders.
+    Only the first HEADER_BYTES of each XML are read, where the root
+    MI_Metadata element carries its uuid attribute; files without it there
+    are searched through a memory map instead of being read whole. Files are
+    scanned on a thread pool. XML files that aren't named like a granule
+    (per granule_name.py), such as the templates, are skipped. A tar name
+    found with two different UUIDs is reported as a conflict and left out
+    of the output, so a bad copy can't silently overwrite the right one.
+    Exits 1 if there were conflicts.
 """
 
+import argparse
+import csv
+import mmap
 import os
 import re
-import csv
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from granule_name import GranuleNameError, parse_granule_name
 
 old_master_csv = "uuidLookup.csv"  # Your existing master list
 new_master_csv = "UPDATED_MASTER_uuidLookup.csv"
 
-print("Scanning your local folders for true UUIDs...")
-
-# 1. Get all your perfect local data
-local_data = {}
-for root, dirs, files in os.walk("."):
-    for filename in files:
-        if filename.endswith(".xml"):
-            filepath = os.path.join(root, filename)
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-                match = re.search(r'uuid="([^"]+)"', content)
-                if match:
-                    real_uuid = match.group(1)
-                    tar_filename = filename.replace(".xml", ".tar")
-                    local_data[tar_filename] = real_uuid
-
-print(f"Found {len(local_data)} true files in your folders.")
-
-# 2. Read the old CSV and keep ONLY the historical stuff
-historical_rows = []
-headers = []
-
-with open(old_master_csv, "r", encoding="utf-8", errors="ignore") as f:
-    reader = csv.reader(f)
-    headers = next(reader, ["Filename", "UUID"])  # Grab headers
-    for row in reader:
-        if len(row) >= 2:
-            filename = row[0]
-            # If the filename from the CSV is NOT in your local folders, it's historical. Keep it!
-            if filename not in local_data:
-                historical_rows.append(row)
-
-# 3. Write the new hybrid file
-with open(new_master_csv, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(headers)
-
-    # Write the untouched historical data first
-    writer.writerows(historical_rows)
-
-    # Write your clean, deduplicated data at the bottom
-    for filename, real_uuid in local_data.items():
-        writer.writerow([filename, real_uuid])
-
-print(f"Done! Saved to {new_master_csv}.")
-print(
-    f"Kept {len(historical_rows)} historical records and updated your {len(local_data)} perfect records."
-)
+# The root element's uuid sits in the first kilobyte of both templates.
+HEADER_BYTES = 8192
+ROOT_UUID_PATTERN = re.compile(rb'<gmi:MI_Metadata\b[^>]*?\buuid="([^"]+)"')
+# Older records may not use the gmi prefix; fall back to the first uuid.
+ANY_UUID_PATTERN = re.compile(rb'uuid="([^"]+)"')
+
+# Folders that never hold granule XML.
+PRUNED_DIRECTORIES = {"__pycache__", "node_modules", "benchmarks"}
+
+# Reads are mostly waiting on the disk, so use more threads than cores.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+BATCH_SIZE = 256
+
+
+def iter_xml_files(root):
+    """Yields the path of every .xml file under root, skipping pruned folders."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if (
+                        not entry.name.startswith(".")
+                        and entry.name not in PRUNED_DIRECTORIES
+                    ):
+                        stack.append(entry.path)
+                elif entry.name.endswith(".xml") and entry.is_file():
+                    yield entry.path
+
+
+def find_uuid(buffer):
+    """Returns the root element's uuid in buffer, else the first uuid, or None."""
+    match = ROOT_UUID_PATTERN.search(buffer) or ANY_UUID_PATTERN.search(buffer)
+    return match.group(1).decode("utf-8", "ignore") if match else None
+
+
+def read_uuid(path):
+    """Returns (path, uuid) for one XML file; uuid is None if it has none."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_BYTES)
+            match = ROOT_UUID_PATTERN.search(header)
+            if match is not None:
+                return path, match.group(1).decode("utf-8", "ignore")
+            if len(header) < HEADER_BYTES:
+                # The header was the whole file.
+                return path, find_uuid(header)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                return path, find_uuid(view)
+    except (OSError, ValueError):
+        return path, None
+
+
+def read_uuids(paths):
+    """read_uuid over a batch of paths; one pool task per batch keeps the
+    per-task overhead well below the cost of the reads themselves."""
+    return [read_uuid(path) for path in paths]
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def tar_name_for(path):
+    """Returns the tar name a granule XML was generated from.
+
+    Raises:
+        GranuleNameError: path isn't named like a granule (e.g. a template).
+    """
+    name = os.path.basename(path)
+    parse_granule_name(name)
+    return os.path.splitext(name)[0] + ".tar"
+
+
+def granule_paths(roots, ignored):
+    """Yields the granule XML files under roots; other XML goes in ignored."""
+    for root in roots:
+        for path in iter_xml_files(root):
+            try:
+                tar_name_for(path)
+            except GranuleNameError:
+                ignored.append(path)
+            else:
+                yield path
+
+
+def scan(roots, workers=DEFAULT_WORKERS):
+    """Finds the UUID of every granule XML under roots.
+
+    Returns (local_data, conflicts, unreadable, ignored): local_data maps
+    tar name to UUID, conflicts maps a tar name to {uuid: [paths]} when its
+    copies disagree, unreadable lists granule XML files with no uuid found
+    and ignored lists XML files that aren't named like a granule, which
+    aren't read at all.
+    """
+    ignored = []
+    paths = granule_paths(roots, ignored)
+    found = defaultdict(lambda: defaultdict(list))
+    unreadable = []
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        batches = executor.map(read_uuids, batched(paths, BATCH_SIZE))
+    else:
+        executor = None
+        batches = [read_uuids(paths)]
+    try:
+        for batch in batches:
+            for path, real_uuid in batch:
+                if real_uuid is None:
+                    unreadable.append(path)
+                else:
+                    found[tar_name_for(path)][real_uuid].append(path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    local_data = {}
+    conflicts = {}
+    for tar_filename, uuids in found.items():
+        if len(uuids) == 1:
+            local_data[tar_filename] = next(iter(uuids))
+        else:
+            conflicts[tar_filename] = {
+                real_uuid: sorted(paths) for real_uuid, paths in uuids.items()
+            }
+    return local_data, conflicts, unreadable, ignored
+
+
+def write_master(local_data, conflicts, old_csv, new_csv):
+    """Writes old_csv's rows that weren't found locally, then the local ones.
+
+    Returns how many historical rows were kept. Conflicting tar names keep
+    whatever old_csv had for them.
+    """
+    historical_rows = []
+    headers = ["Filename", "UUID"]
+    if os.path.exists(old_csv):
+        with open(old_csv, "r", encoding="utf-8", errors="ignore") as f:
+            reader = csv.reader(f)
+            headers = next(reader, headers)  # Grab headers
+            for row in reader:
+                # If the filename from the CSV is NOT in your local folders, it's historical. Keep it!
+                if len(row) >= 2 and row[0] not in local_data:
+                    historical_rows.append(row)
+
+    with open(new_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        # Write the untouched historical data first
+        writer.writerows(historical_rows)
+        # Write your clean, deduplicated data at the bottom
+        writer.writerows(local_data.items())
+    return len(historical_rows)
+
+
+def merge_into_registry(local_data, master_csv):
+    """Upserts every recovered UUID into the registry in one transaction and
+    rewrites master_csv from it."""
+    from uuid_registry import UUIDRegistry
+
+    registry = UUIDRegistry(master_csv)
+    registry.upsert(sorted(local_data.items()))
+    registry.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "roots", nargs="*", default=["."], metavar="FOLDER", help="Default: here."
+    )
+    parser.add_argument("--master", default=old_master_csv)
+    parser.add_argument("--output", default=new_master_csv)
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Merge into the UUID registry and rewrite --master instead of "
+        "writing --output.",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    arguments = parser.parse_args(argv)
+
+    print("Scanning your local folders for true UUIDs...")
+    local_data, conflicts, unreadable, ignored = scan(
+        arguments.roots, arguments.workers
+    )
+    print(f"Found {len(local_data)} true files in your folders.")
+    if ignored:
+        print(f"Ignored {len(ignored)} XML files that aren't granules.")
+
+    for path in unreadable:
+        print(f"No UUID found in {path}")
+    for tar_filename, uuids in sorted(conflicts.items()):
+        print(f"CONFLICT: {tar_filename} has {len(uuids)} different UUIDs:")
+        for real_uuid, paths in uuids.items():
+            print(f"  {real_uuid}: {', '.join(paths)}")
+
+    if arguments.merge:
+        merge_into_registry(local_data, arguments.master)
+        print(f"Done! Merged {len(local_data)} records into {arguments.master}.")
+    else:
+        kept = write_master(local_data, conflicts, arguments.master, arguments.output)
+        print(f"Done! Saved to {arguments.output}.")
+        print(
+            f"Kept {kept} historical records and updated your {len(local_data)} perfect records."
+        )
+    if conflicts:
+        print(f"{len(conflicts)} tar names were left as they were; see CONFLICT above.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
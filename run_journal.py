@@ -0,0 +1,306 @@
+"""
+Generation Run Journal
+======================
+Purpose:
+    Records, for every granule xmlGenerate.py has written, a hash of the
+    inputs its XML was built from: the manifest row, the lookup-table rows
+    it resolved to, the template version and the project number. A rerun
+    compares against the journal and skips granules whose inputs haven't
+    changed, so daily re-runs over the full accession history only cost
+    the delta, and a run that dies partway through picks up after the last
+    committed record.
+
+Usage:
+    journal = RunJournal("generationJournal.sqlite")
+    previousHash = journal.previous_hash(tarFileName)
+    ...
+    journal.record(tarFileName, digest, outputPath)
+    journal.close()
+
+    The watch mode of xmlGenerate.py also keeps each manifest's read
+    position here (see manifest_watcher.py), and every granule's manifest
+    row and the lookup rows and template it depends on (see
+    dependency_index.py), so the granules affected by a lookup edit can be
+    found and regenerated without rereading any manifest.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Bump when the generator starts producing different XML from the same
+# inputs, so every granule is regenerated once.
+JOURNAL_VERSION = "1"
+
+# Records are committed in batches; an interrupted run loses at most this many.
+DEFAULT_COMMIT_EVERY = 100
+
+
+class EncodedParts(str):
+    """Parts already serialized by encode_parts(); see input_hash."""
+
+
+# What json.dumps(part, sort_keys=True, ...) would build for every call.
+_encode = json.JSONEncoder(sort_keys=True, default=str, ensure_ascii=False).encode
+
+
+def encode_parts(*parts):
+    """Serializes parts once for hashing into many digests.
+
+    input_hash(a, encode_parts(b, c), d) == input_hash(a, b, c, d), so the
+    lookup rows every part of a site shares are only encoded once.
+    """
+    return EncodedParts(_encode(list(parts))[1:-1])
+
+
+def input_hash(*parts):
+    """Returns a stable sha256 hex digest of JSON-serializable parts.
+
+    Dicts are serialized with sorted keys and anything JSON can't encode
+    (dates, numpy scalars) via str(), so the same lookup row always hashes
+    the same way. The payload is the JSON list of JOURNAL_VERSION and the
+    parts, with EncodedParts spliced in as they are.
+    """
+    payload = (
+        "["
+        + ", ".join(
+            part if isinstance(part, EncodedParts) else _encode(part)
+            for part in (JOURNAL_VERSION, *parts)
+        )
+        + "]"
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """SQLite-backed filename -> (input hash, output path) journal."""
+
+    def __init__(self, path="generationJournal.sqlite", commit_every=None):
+        self.path = path
+        self.commit_every = commit_every or DEFAULT_COMMIT_EVERY
+        self._connection = None
+        self._pending = 0
+        self._key_ids = {}
+        self._key_id_lists = {}
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=300)
+            self._connection.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS granules (
+                    filename TEXT PRIMARY KEY,
+                    input_hash TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    written_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS manifests (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    next_line INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    handled_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS dependency_keys (
+                    key_id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    UNIQUE (source, key, digest)
+                );
+                CREATE TABLE IF NOT EXISTS granule_dependencies (
+                    filename TEXT PRIMARY KEY,
+                    key_ids TEXT NOT NULL,
+                    record TEXT NOT NULL
+                );
+                """)
+        return self._connection
+
+    def previous_hash(self, filename):
+        """Returns the input hash the granule was last written with.
+
+        Returns None if it was never written or its XML has since been
+        removed, so either way it gets generated again.
+        """
+        row = self.connection.execute(
+            "SELECT input_hash, output_path FROM granules WHERE filename = ?",
+            (filename,),
+        ).fetchone()
+        if row is None or not os.path.exists(row[1]):
+            return None
+        return row[0]
+
+    def record(
+        self, filename, digest, output_path, dependencies=None, manifest_record=None
+    ):
+        """Marks a granule as written from inputs hashing to digest.
+
+        dependencies, if given, are the (source, key, digest) triples of
+        what it was built from, a tuple, and replace any recorded before;
+        manifest_record is then the manifest row it was generated from.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO granules "
+            "(filename, input_hash, output_path, written_at) VALUES (?, ?, ?, ?)",
+            (filename, digest, output_path, time.time()),
+        )
+        if dependencies is not None:
+            self._replace_dependencies(filename, dependencies, manifest_record)
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def record_dependencies(self, filename, dependencies, manifest_record):
+        """Updates an unchanged granule's dependencies if they differ from
+        the ones recorded (or none were), without touching its hash."""
+        recorded = self.connection.execute(
+            "SELECT key_ids FROM granule_dependencies WHERE filename = ?",
+            (filename,),
+        ).fetchone()
+        if recorded is not None and recorded[0] == self._key_id_list(dependencies):
+            return
+        self._replace_dependencies(filename, dependencies, manifest_record)
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def _key_id(self, dependency):
+        # Each (source, key, digest) is stored once; granules list their ids.
+        if dependency not in self._key_ids:
+            row = self.connection.execute(
+                "SELECT key_id FROM dependency_keys "
+                "WHERE source = ? AND key = ? AND digest = ?",
+                dependency,
+            ).fetchone()
+            if row is None:
+                row = (
+                    self.connection.execute(
+                        "INSERT INTO dependency_keys (source, key, digest) "
+                        "VALUES (?, ?, ?)",
+                        dependency,
+                    ).lastrowid,
+                )
+            self._key_ids[dependency] = row[0]
+        return self._key_ids[dependency]
+
+    def _key_id_list(self, dependencies):
+        if dependencies not in self._key_id_lists:
+            self._key_id_lists[dependencies] = " ".join(
+                str(key_id) for key_id in sorted(map(self._key_id, dependencies))
+            )
+        return self._key_id_lists[dependencies]
+
+    def _replace_dependencies(self, filename, dependencies, manifest_record):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO granule_dependencies (filename, key_ids, record) "
+            "VALUES (?, ?, ?)",
+            (
+                filename,
+                self._key_id_list(dependencies),
+                json.dumps(list(manifest_record)),
+            ),
+        )
+
+    def _granule_key_ids(self):
+        for filename, key_ids in self.connection.execute(
+            "SELECT filename, key_ids FROM granule_dependencies"
+        ):
+            yield filename, {int(key_id) for key_id in key_ids.split()}
+
+    def stale_dependencies(self, current_digest):
+        """Returns every (source, key, digest) some granule is recorded with
+        whose digest is no longer current_digest(source, key)."""
+        in_use = set()
+        for _, key_ids in self._granule_key_ids():
+            in_use.update(key_ids)
+        return [
+            (source, key, digest)
+            for key_id, source, key, digest in self.connection.execute(
+                "SELECT key_id, source, key, digest FROM dependency_keys"
+            ).fetchall()
+            if key_id in in_use and current_digest(source, key) != digest
+        ]
+
+    def dependents(self, dependencies, among=None):
+        """Returns the sorted filenames of the granules recorded as built
+        from any of the (source, key, digest) dependencies.
+
+        among, a (source, key) pair, limits them to granules that also
+        depend on that key (e.g. one project number).
+        """
+        wanted = set()
+        for dependency in dependencies:
+            wanted.update(
+                key_id
+                for (key_id,) in self.connection.execute(
+                    "SELECT key_id FROM dependency_keys "
+                    "WHERE source = ? AND key = ? AND digest = ?",
+                    tuple(dependency),
+                )
+            )
+        required = None
+        if among is not None:
+            required = {
+                key_id
+                for (key_id,) in self.connection.execute(
+                    "SELECT key_id FROM dependency_keys WHERE source = ? AND key = ?",
+                    tuple(among),
+                )
+            }
+        return sorted(
+            filename
+            for filename, key_ids in self._granule_key_ids()
+            if key_ids & wanted and (required is None or key_ids & required)
+        )
+
+    def manifest_records(self, filenames):
+        """Yields (filename, manifest record fields) for each of filenames
+        whose manifest row was recorded."""
+        for filename in filenames:
+            row = self.connection.execute(
+                "SELECT record FROM granule_dependencies WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+            if row is not None:
+                yield filename, json.loads(row[0])
+
+    def manifest_state(self, path):
+        """Returns how much of a watched manifest has been handled, or None.
+
+        The state is a (size, mtime_ns, offset, next_line, digest) tuple:
+        the file's stat when it was last read, the byte offset and line
+        number reading got to, and the sha256 of the bytes before offset.
+        """
+        return self.connection.execute(
+            "SELECT size, mtime_ns, offset, next_line, digest FROM manifests "
+            "WHERE path = ?",
+            (path,),
+        ).fetchone()
+
+    def record_manifest(self, path, size, mtime_ns, offset, next_line, digest):
+        """Saves a watched manifest's state; see manifest_state()."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO manifests "
+            "(path, size, mtime_ns, offset, next_line, digest, handled_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, offset, next_line, digest, time.time()),
+        )
+        self._pending += 1
+
+    def commit(self):
+        if self._connection is not None:
+            self._connection.commit()
+        self._pending = 0
+
+    def close(self):
+        if self._connection is None:
+            return
+        self.commit()
+        self._connection.close()
+        self._connection = None
@@ -0,0 +1,222 @@
+"""
+ISO 19139 Schema Validation
+===========================
+Purpose:
+    Checks generated granules before they are submitted, so a broken one is
+    caught here rather than by the catalog harvest. Every document is
+    checked for well-formedness with the standard library's expat parser,
+    and, when lxml is installed and the schemas are on disk, validated
+    against the ISO 19139 schema the templates name in xsi:schemaLocation
+    (NOAA's schema.xsd and the gmd/gco/gml/xlink schemas it imports).
+
+    The schemas are read from a local mirror, never the network: a URL such
+    as http://www.isotc211.org/2005/gmd/gmd.xsd is looked up as
+    schemas/www.isotc211.org/2005/gmd/gmd.xsd. The repository bundles one
+    in schemas/ (NOAA's schema.xsd and everything it imports; see
+    schemas/README.md), so validation works offline out of the box. They
+    are compiled once per process (schema_validator() is cached), so
+    validating a whole run costs one schema load per worker, not one per
+    file.
+
+    Schema validation needs lxml, an optional dependency; without it only
+    well-formedness is checked.
+
+    Problems are returned as issue dicts like validate_xml.py's: the kind
+    ("not well-formed" or "schema"), the 1-based line and the message.
+
+Usage:
+    python schema_validation.py fetch [DIRECTORY]   # mirror from the network
+
+    validator = schema_validator("schemas")
+    if validator.unavailable:
+        print("well-formedness only:", validator.unavailable)
+    for issue in validator.issues(xmlText):
+        print(issue["line"], issue["detail"])
+
+    "validate_xml.py --schemas" does this for every file it checks, and
+    "xmlGenerate.py --validate" for every granule as it is rendered.
+"""
+
+import functools
+import importlib.util
+import os
+import sys
+import urllib.parse
+import xml.parsers.expat
+
+# The mirror bundled with the repository.
+SCHEMA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+# The schema every template's xsi:schemaLocation points at.
+ENTRY_SCHEMA_URL = "https://data.noaa.gov/resources/iso19139/schema.xsd"
+
+# Schema errors listed per file; a wrong element early on can cascade.
+MAX_SCHEMA_ERRORS = 20
+
+# The elements through which a schema pulls in others.
+REFERENCE_TAGS = {
+    "{http://www.w3.org/2001/XMLSchema}" + tag
+    for tag in ("import", "include", "redefine")
+}
+
+
+def mirror_path(directory, url):
+    """Returns where url's copy lives in the schema mirror, or None if url
+    isn't http(s)."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return os.path.join(directory, parts.netloc, *parts.path.lstrip("/").split("/"))
+
+
+def well_formedness_issues(data):
+    """Returns a "not well-formed" issue for data (str or bytes) if expat
+    can't parse it, else an empty list."""
+    parser = xml.parsers.expat.ParserCreate()
+    try:
+        parser.Parse(data, True)
+    except xml.parsers.expat.ExpatError as error:
+        return [
+            {
+                "kind": "not well-formed",
+                "line": error.lineno,
+                "detail": f"{xml.parsers.expat.errors.messages[error.code]} "
+                f"(column {error.offset + 1})",
+            }
+        ]
+    return []
+
+
+class SchemaValidator:
+    """The ISO 19139 schema compiled from a local mirror, if it can be.
+
+    unavailable says why documents are only checked for well-formedness:
+    lxml isn't installed, the mirror has no entry schema, or it doesn't
+    compile (typically an import missing from the mirror).
+    """
+
+    def __init__(self, directory=SCHEMA_DIRECTORY, entry_url=ENTRY_SCHEMA_URL):
+        self.directory = directory
+        self.unavailable = None
+        self._schema = None
+        self._parser = None
+
+        entry = mirror_path(directory, entry_url)
+        if importlib.util.find_spec("lxml") is None:
+            self.unavailable = "lxml is not installed (pip install lxml)"
+        elif not os.path.exists(entry):
+            self.unavailable = (
+                f"no schema at {entry} (python schema_validation.py fetch)"
+            )
+        else:
+            self._compile(entry)
+
+    def _compile(self, entry):
+        from lxml import etree
+
+        directory = self.directory
+
+        class LocalMirror(etree.Resolver):
+            def resolve(self, url, public_id, context):
+                path = mirror_path(directory, url)
+                if path is not None and os.path.exists(path):
+                    return self.resolve_filename(path, context)
+                return None
+
+        schema_parser = etree.XMLParser(no_network=True)
+        schema_parser.resolvers.add(LocalMirror())
+        try:
+            self._schema = etree.XMLSchema(etree.parse(entry, schema_parser))
+        except (etree.XMLSchemaParseError, etree.XMLSyntaxError, OSError) as error:
+            self.unavailable = f"{entry} doesn't compile: {error}"
+            return
+        self._parser = etree.XMLParser(no_network=True, resolve_entities=False)
+
+    def issues(self, data):
+        """Returns the issues found in one document (str or bytes)."""
+        issues = well_formedness_issues(data)
+        if issues or self._schema is None:
+            return issues
+
+        from lxml import etree
+
+        if isinstance(data, str):
+            # lxml refuses str input with an encoding declaration.
+            data = data.encode("utf-8")
+        document = etree.fromstring(data, self._parser)
+        if self._schema.validate(document):
+            return []
+        errors = list(self._schema.error_log)
+        issues = [
+            {"kind": "schema", "line": error.line, "detail": error.message}
+            for error in errors[:MAX_SCHEMA_ERRORS]
+        ]
+        if len(errors) > MAX_SCHEMA_ERRORS:
+            issues.append(
+                {
+                    "kind": "schema",
+                    "line": None,
+                    "detail": f"{len(errors) - MAX_SCHEMA_ERRORS} more errors",
+                }
+            )
+        return issues
+
+
+@functools.lru_cache(maxsize=None)
+def schema_validator(directory=SCHEMA_DIRECTORY):
+    """Returns this process's SchemaValidator for directory, compiling the
+    schemas the first time it is asked for."""
+    return SchemaValidator(directory)
+
+
+def fetch(directory=SCHEMA_DIRECTORY, url=ENTRY_SCHEMA_URL):
+    """Mirrors the schema at url and every schema it imports or includes
+    into directory, skipping files already there. Returns the new paths."""
+    import urllib.request
+    import xml.etree.ElementTree as ElementTree
+
+    fetched = []
+    pending = [url]
+    seen = set()
+    while pending:
+        url = pending.pop()
+        if url in seen:
+            continue
+        seen.add(url)
+        path = mirror_path(directory, url)
+        if path is None:
+            continue
+        if not os.path.exists(path):
+            with urllib.request.urlopen(url, timeout=60) as response:
+                data = response.read()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            fetched.append(path)
+        for element in ElementTree.parse(path).iter():
+            location = element.get("schemaLocation")
+            if location and element.tag in REFERENCE_TAGS:
+                pending.append(urllib.parse.urljoin(url, location))
+    return fetched
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "fetch":
+        print(__doc__.split("Usage:")[1].split("\n\n")[0].strip("\n"))
+        return 2
+    directory = argv[1] if len(argv) > 1 else SCHEMA_DIRECTORY
+    for path in fetch(directory):
+        print(path)
+    validator = SchemaValidator(directory)
+    if validator.unavailable:
+        print("Schemas fetched but not usable yet: " + validator.unavailable)
+        return 1
+    print(f"Schemas in {directory} compile; validation works offline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Compiled XML Template Engine
+============================
+Purpose:
+    Reads each xmlTemplate_*.xml once per run, detects its encoding once, and
+    splits it into static text fragments and [*Placeholder*] slots. Rendering
+    a record is then a single join over the fragments instead of one full
+    copy of the document per placeholder.
+
+Usage:
+    registry = TemplateRegistry(myDirectory, myDict.keys())
+    template = registry.get("xmlTemplate_StRS.xml")
+    xmlText = template.render(myDict)
+    template.missing(myDict)  # placeholders the record left unfilled
+"""
+
+import hashlib
+import logging
+import os
+import re
+
+# Every placeholder in the templates looks like [*Name*]; a few (e.g.
+# [*GCMD_PlaceKeyword]) are missing the closing star, so it is optional.
+PLACEHOLDER_PATTERN = re.compile(r"\[\*[^\[\]\r\n]*\]")
+
+logger = logging.getLogger(__name__)
+
+
+def detect_encoding(file):
+    # Imported here so it is only loaded when a template is first compiled.
+    import chardet.universaldetector
+
+    detector = chardet.universaldetector.UniversalDetector()
+    with open(file, "rb") as f:
+        for line in f:
+            detector.feed(line)
+            if detector.done:
+                break
+    detector.close()
+    return detector.result
+
+
+class CompiledTemplate:
+    """One XML template tokenized into static fragments and placeholder slots."""
+
+    def __init__(self, file_name, known_placeholders=None):
+        self.file_name = file_name
+        self.mtime_ns = os.stat(file_name).st_mtime_ns
+        self.encoding = detect_encoding(file_name)["encoding"]
+        with open(file_name, "r", encoding=self.encoding) as templateFile:
+            text = templateFile.read()
+        # Changes whenever the template does; part of each granule's input hash.
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        # _parts alternates static text and placeholder names; _slots holds
+        # the positions of the placeholders so render() can fill them in place.
+        self._parts = []
+        self._slots = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self._parts.append(text[position : match.start()])
+            self._slots.append((len(self._parts), match.group(0)))
+            self._parts.append(match.group(0))
+            position = match.end()
+        self._parts.append(text[position:])
+
+        self.placeholders = frozenset(name for _, name in self._slots)
+        if known_placeholders is None:
+            self.unknown = frozenset()
+        else:
+            self.unknown = self.placeholders - frozenset(known_placeholders)
+
+    def missing(self, values):
+        """Returns the placeholders in this template that values doesn't fill."""
+        return sorted(self.placeholders.difference(values))
+
+    def render(self, values):
+        """Fills every slot from values in one pass and returns the document.
+
+        Placeholders with no entry in values are left as-is in the output, the
+        same as the old chain of str.replace calls did.
+        """
+        parts = list(self._parts)
+        for position, name in self._slots:
+            if name in values:
+                parts[position] = values[name]
+        return "".join(parts)
+
+
+class TemplateRegistry:
+    """Compiles each template the first time it is asked for and keeps it."""
+
+    def __init__(self, directory=".", known_placeholders=None):
+        self.directory = directory
+        self.known_placeholders = known_placeholders
+        self._templates = {}
+
+    def refresh(self):
+        """Forgets every template changed on disk since it was compiled and
+        returns their names; they are compiled again when next asked for."""
+        changed = []
+        for template_name, template in list(self._templates.items()):
+            try:
+                mtime_ns = os.stat(template.file_name).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != template.mtime_ns:
+                del self._templates[template_name]
+                changed.append(template_name)
+        return sorted(changed)
+
+    def get(self, template_name):
+        if template_name not in self._templates:
+            template = CompiledTemplate(
+                os.path.join(self.directory, template_name), self.known_placeholders
+            )
+            for name in sorted(template.unknown):
+                logger.warning("Unknown placeholder in %s: %s", template_name, name)
+            self._templates[template_name] = template
+        return self._templates[template_name]
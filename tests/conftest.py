@@ -0,0 +1,69 @@
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from lookup_store import LookupStore
+from manifest_reader import parse_row
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The pipeline scripts are top-level modules in the repository root.
+sys.path.insert(0, REPOSITORY)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """A scratch copy of the scripts, lookup tables, templates and sample
+    manifest, so a run can write its XML, journal and registry there."""
+    for pattern in ("*.py", "*.csv", "*.xml", "*.mnf"):
+        for path in glob.glob(os.path.join(REPOSITORY, pattern)):
+            shutil.copy(path, tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def generate(workspace):
+    """Runs xmlGenerate.py in the workspace with the given arguments."""
+
+    def run(*arguments, stdin=""):
+        return subprocess.run(
+            [sys.executable, "xmlGenerate.py", *arguments],
+            cwd=workspace,
+            input=stdin,
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+
+    return run
+
+
+@pytest.fixture
+def store(workspace):
+    """A LookupStore over the workspace's lookup tables, without the cache."""
+    return LookupStore(str(workspace), cache=False)
+
+
+@pytest.fixture
+def sample_records(workspace):
+    """The ManifestRecords of the sample manifest, duplicates included."""
+    return [
+        parse_row(row.split(","), "SfM_Metadata.mnf", number)
+        for number, row in enumerate(manifest_rows(workspace), 1)
+    ]
+
+
+def manifest_rows(workspace, name="SfM_Metadata.mnf"):
+    with open(os.path.join(workspace, name)) as f:
+        return [line for line in f.read().splitlines() if line.strip()]
+
+
+def write_manifest(directory, name, rows):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write("\n".join(rows) + "\n")
+    return path
@@ -0,0 +1,112 @@
+import csv
+
+import pytest
+
+from batch_resolver import DESIGNS, BatchResolver
+from granule_name import parse_granule_name
+from lookup_store import fixedLookup
+
+
+def add_site_rows(workspace, template_site, rows):
+    """Appends copies of template_site's first fixedLookup row with the
+    given (SITE, MISSION) pairs."""
+    path = workspace / fixedLookup
+    with open(path, newline="", encoding="utf-8") as f:
+        table = list(csv.DictReader(f))
+    template = next(row for row in table if row["SITE"] == template_site)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(template))
+        for site, mission in rows:
+            writer.writerow(dict(template, SITE=site, MISSION=mission))
+
+
+@pytest.fixture
+def joined(monkeypatch):
+    """The tar names BatchResolver runs the site joins for, in order."""
+    names = []
+    resolve_sites = BatchResolver._resolve_sites
+
+    def counting(self, lookup_file, tar_names, granules):
+        names.extend(tar_names)
+        return resolve_sites(self, lookup_file, tar_names, granules)
+
+    monkeypatch.setattr(BatchResolver, "_resolve_sites", counting)
+    return names
+
+
+def granule(site, part=1, parts=2, mission="MP2404"):
+    return (
+        f"NCRMP_SFM_FIXED_2024_{mission}_MHI_OAH_{site}_c20250903_"
+        f"part{part}of{parts}.tar"
+    )
+
+
+def assert_same_site_rows(store, names):
+    resolutions = BatchResolver(store).resolve(names)
+    for name, resolution in zip(names, resolutions):
+        lookup_file = DESIGNS[parse_granule_name(name).design][0]
+        expected = store.site_row(lookup_file, parse_granule_name(name).site, name)
+        assert resolution.site_row is expected, name
+
+
+def test_dual_match_fallback_agrees_with_site_row(workspace, store):
+    add_site_rows(
+        workspace,
+        "OCC-OAH-002",
+        [
+            # No row for the filename's mission; one whose MISSION appears
+            # elsewhere in the name.
+            ("TST-001", "ZZ0001"),
+            ("TST-001", "MHI_OAH"),
+            # No row for the filename's mission and none in the name: the
+            # first row for the site.
+            ("TST-002", "ZZ0001"),
+            ("TST-002", "ZZ0002"),
+            # An exact (SITE, MISSION) row after a row for another mission.
+            ("TST-003", "ZZ0001"),
+            ("TST-003", "MP2404"),
+        ],
+    )
+    names = [
+        granule(site, part)
+        for site in ("TST-001", "TST-002", "TST-003")
+        for part in (1, 2)
+    ]
+    assert_same_site_rows(store, names + names[::-1])
+
+    resolved = dict(zip(names, BatchResolver(store).resolve(names)))
+    assert resolved[granule("TST-001", 2)].site_row["MISSION"] == "MHI_OAH"
+    assert resolved[granule("TST-002", 2)].site_row["MISSION"] == "ZZ0001"
+    assert resolved[granule("TST-003", 2)].site_row["MISSION"] == "MP2404"
+
+
+def test_sample_manifest_agrees_with_site_row(store, sample_records):
+    assert_same_site_rows(store, [record.tar_name for record in sample_records])
+
+
+def test_each_site_is_joined_once_across_batches(store, sample_records, joined):
+    names = [record.tar_name for record in sample_records]
+    sites = {
+        (parsed.design, parsed.mission, parsed.site)
+        for parsed in map(parse_granule_name, names)
+    }
+    resolver = BatchResolver(store)
+    resolutions = []
+    for start in range(0, len(names), 7):
+        resolutions.extend(resolver.resolve(names[start : start + 7]))
+
+    assert len(joined) == len(sites) < len(names)
+    first_part = {}
+    for resolution in resolutions:
+        parsed = resolution.granule
+        key = (parsed.design, parsed.mission, parsed.site)
+        assert first_part.setdefault(key, resolution).site_row is resolution.site_row
+    assert resolutions == BatchResolver(store).resolve(names)
+
+
+def test_fallback_sites_are_resolved_for_every_part(workspace, store, joined):
+    add_site_rows(workspace, "OCC-OAH-002", [("TST-001", "ZZ0001")])
+    resolver = BatchResolver(store)
+    resolver.resolve([granule("TST-001", 1)])
+    resolver.resolve([granule("TST-001", 2)])
+    assert joined == [granule("TST-001", 1), granule("TST-001", 2)]
@@ -0,0 +1,70 @@
+import csv
+
+import check_missing
+
+
+def granule(region, site, part=1, parts=1):
+    return (
+        f"NCRMP_SFM_StRS_2024_SE2406_{region}_OAH_{site}_c20250903_"
+        f"part{part}of{parts}.tar"
+    )
+
+
+def write_answer_key(directory, name, sites):
+    path = directory / name
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["SITE"])
+        writer.writerows([site] for site in sites)
+    return str(path)
+
+
+def test_two_region_mission_is_audited_per_region(tmp_path):
+    index = check_missing.GranuleIndex(
+        [
+            granule("MHI", "OAH-001"),
+            granule("MHI", "OAH-002", 1, 2),
+            granule("MHI", "OAH-002", 2, 2),
+            granule("MHI", "OAH-003"),
+            granule("NWHI", "FFS-4665"),
+            granule("NWHI", "FFS-4666", 1, 2),
+        ]
+    )
+
+    mhi = check_missing.audit(
+        write_answer_key(
+            tmp_path,
+            "NCRMP_SFM_StRS_2024_SE2406_MHI_metadata.csv",
+            ["OAH-001", "OAH-002", "OAH-004"],
+        ),
+        index,
+    )
+    assert mhi["found"] == 2
+    assert mhi["missing"] == ["OAH-004"]
+    assert mhi["extra"] == ["OAH-003"]
+    assert mhi["partial"] == []
+
+    nwhi = check_missing.audit(
+        write_answer_key(
+            tmp_path,
+            "NCRMP_SFM_StRS_2024_SE2406_NWHI_metadata.csv",
+            ["FFS-4665", "FFS-4666"],
+        ),
+        index,
+    )
+    assert nwhi["missing"] == []
+    assert nwhi["extra"] == []
+    assert nwhi["partial"] == ["FFS-4666"]
+
+    # An answer key that names no region covers the whole mission.
+    whole = check_missing.audit(
+        write_answer_key(
+            tmp_path,
+            "NCRMP_SFM_StRS_2024_SE2406_metadata.csv",
+            ["OAH-001", "OAH-002", "OAH-003", "FFS-4665"],
+        ),
+        index,
+    )
+    assert whole["found"] == 4
+    assert whole["extra"] == ["FFS-4666"]
+    assert whole["partial"] == []
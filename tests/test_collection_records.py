@@ -0,0 +1,21 @@
+from batch_resolver import BatchResolver
+from collection_records import CollectionAggregator
+
+
+def test_tars_listed_again_are_counted_once(store, sample_records):
+    resolutions = list(
+        BatchResolver(store).resolve([record.tar_name for record in sample_records])
+    )
+    once = CollectionAggregator()
+    once.add(sample_records, resolutions)
+
+    again = CollectionAggregator()
+    half = len(sample_records) // 2
+    again.add(sample_records[:half], resolutions[:half])
+    again.add(sample_records, resolutions)
+    again.add(sample_records[half:], resolutions[half:])
+
+    assert again.summaries() == once.summaries()
+    assert sum(summary.granules for summary in once.summaries()) == len(
+        {resolution.tar_name for resolution in resolutions if not resolution.unresolved}
+    )
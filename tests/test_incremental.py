@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from conftest import manifest_rows, write_manifest
+
+
+def counts(result):
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+    return summary["written"], summary["unchanged"], summary["failed"]
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_tar_listed_twice_is_written_once(workspace, generate, workers):
+    rows = manifest_rows(workspace)[:3]
+    (workspace / "cruise").mkdir()
+    write_manifest(workspace / "cruise", "a.mnf", rows + rows[:1])
+
+    assert counts(generate("--input", "cruise", "--workers", workers)) == (3, 1, 0)
+    assert counts(generate("--input", "cruise", "--workers", workers)) == (0, 4, 0)
+    assert counts(generate("--input", "cruise", "--workers", workers, "--full")) == (
+        3,
+        1,
+        0,
+    )
+
+
+def test_journal_skips_unchanged_granules(workspace, generate):
+    rows = manifest_rows(workspace)[:3]
+    (workspace / "cruise").mkdir()
+    write_manifest(workspace / "cruise", "a.mnf", rows)
+    assert counts(generate("--input", "cruise")) == (3, 0, 0)
+    written = {path: path.stat().st_mtime_ns for path in workspace.glob("*/*.xml")}
+    assert len(written) == 3
+
+    assert counts(generate("--input", "cruise")) == (0, 3, 0)
+    assert {path: path.stat().st_mtime_ns for path in written} == written
+
+    tar_name, md5, size, *rest = rows[1].split(",")
+    rows[1] = ",".join([tar_name, md5, str(int(size) * 2), *rest])
+    write_manifest(workspace / "cruise", "a.mnf", rows)
+    assert counts(generate("--input", "cruise")) == (1, 2, 0)
+    changed = [path for path in written if path.stat().st_mtime_ns != written[path]]
+    assert [path.name for path in changed] == [tar_name.replace(".tar", ".xml")]
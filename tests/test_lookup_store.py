@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+
+from lookup_store import CACHE_DIRECTORY, LookupStore, shipLookup
+
+
+def no_csv_read(*args, **kwargs):
+    raise AssertionError("read a lookup CSV instead of the cache")
+
+
+def ship_name(workspace, code="SE"):
+    return LookupStore(str(workspace)).ship_row(code)["Ship Keyword"]
+
+
+def set_mtime(path, seconds_later):
+    mtime = os.stat(path).st_mtime_ns + seconds_later * 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_cached_table_is_used_until_the_csv_changes(workspace, monkeypatch):
+    path = str(workspace / shipLookup)
+    assert ship_name(workspace) == "Oscar Elton Sette"
+    assert os.path.exists(workspace / CACHE_DIRECTORY / (shipLookup + ".pickle"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pd, "read_csv", no_csv_read)
+        assert ship_name(workspace) == "Oscar Elton Sette"
+        # Touched but not edited: still the cached table.
+        set_mtime(path, 10)
+        assert ship_name(workspace) == "Oscar Elton Sette"
+
+    watching = LookupStore(str(workspace))
+    watching.ship_row("SE")
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace("Oscar Elton Sette", "Oscar Elton Sette II"))
+    set_mtime(path, 20)
+
+    assert ship_name(workspace) == "Oscar Elton Sette II"
+    assert watching.refresh() == [shipLookup]
+    assert watching.ship_row("SE")["Ship Keyword"] == "Oscar Elton Sette II"
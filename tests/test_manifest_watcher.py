@@ -0,0 +1,61 @@
+from manifest_reader import ManifestReader
+from manifest_watcher import ManifestWatcher
+from run_journal import RunJournal
+
+from conftest import manifest_rows, write_manifest
+
+
+def read_pending(watcher, directory):
+    """Polls once and reads what is pending, as watch mode does; returns the
+    (line number, tar name) of every row read."""
+    pending = watcher.poll()
+    reader = ManifestReader(str(directory), pending)
+    rows = [(record.line_number, record.tar_name) for record in reader.records()]
+    watcher.handled(reader)
+    return rows
+
+
+def tar_names(rows):
+    return [row.split(",")[0] for row in rows]
+
+
+def test_reads_only_rows_appended_since_the_last_poll(workspace):
+    rows = manifest_rows(workspace)[:5]
+    incoming = workspace / "incoming"
+    incoming.mkdir()
+    journal = RunJournal(str(workspace / "journal.sqlite"))
+    watcher = ManifestWatcher(str(incoming), journal, settle_seconds=0)
+
+    write_manifest(incoming, "a.mnf", rows[:3])
+    assert read_pending(watcher, incoming) == list(zip([1, 2, 3], tar_names(rows[:3])))
+    assert read_pending(watcher, incoming) == []
+
+    write_manifest(incoming, "a.mnf", rows)
+    assert read_pending(watcher, incoming) == list(zip([4, 5], tar_names(rows[3:])))
+
+    # A restarted watcher carries on from the offsets in the journal.
+    journal.close()
+    journal = RunJournal(str(workspace / "journal.sqlite"))
+    restarted = ManifestWatcher(str(incoming), journal, settle_seconds=0)
+    assert read_pending(restarted, incoming) == []
+    restarted.rescan()
+    assert len(read_pending(restarted, incoming)) == 5
+    journal.close()
+
+
+def test_rewritten_prefix_is_read_again_from_the_top(workspace):
+    rows = manifest_rows(workspace)[:4]
+    incoming = workspace / "incoming"
+    incoming.mkdir()
+    journal = RunJournal(str(workspace / "journal.sqlite"))
+    watcher = ManifestWatcher(str(incoming), journal, settle_seconds=0)
+
+    write_manifest(incoming, "a.mnf", rows[:2])
+    assert len(read_pending(watcher, incoming)) == 2
+
+    # Longer than before, but the rows already read have changed.
+    write_manifest(incoming, "a.mnf", [rows[2]] + rows[1:2] + rows[3:])
+    assert read_pending(watcher, incoming) == list(
+        zip([1, 2, 3], tar_names([rows[2], rows[1], rows[3]]))
+    )
+    journal.close()
@@ -0,0 +1,40 @@
+import json
+
+from conftest import manifest_rows, write_manifest
+
+
+def test_lookup_edit_regenerates_only_the_granules_using_it(workspace, generate):
+    rows = manifest_rows(workspace)
+    (workspace / "cruise").mkdir()
+    # The three parts of OCC-OAH-002, and a granule of another site.
+    write_manifest(workspace / "cruise", "a.mnf", rows[:3] + rows[10:11])
+    first = generate("--input", "cruise")
+    assert json.loads(first.stdout)["written"] == 4, first.stderr
+    written = {path: path.read_text() for path in workspace.glob("*/*.xml")}
+
+    nothing = generate("--regenerate-affected")
+    assert json.loads(nothing.stdout)["affected"] == 0, nothing.stderr
+
+    lookup = workspace / "fixedLookup.csv"
+    text = lookup.read_text()
+    assert "OCC-OAH-002,6/7/2024,21.590657," in text
+    lookup.write_text(
+        text.replace(
+            "OCC-OAH-002,6/7/2024,21.590657,", "OCC-OAH-002,6/7/2024,21.5907,", 1
+        )
+    )
+    result = generate("--regenerate-affected")
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+    assert (summary["affected"], summary["written"]) == (3, 3)
+    assert summary["changedKeys"] == {"fixedLookup.csv": 1}
+
+    changed = sorted(
+        path.name for path, xml in written.items() if path.read_text() != xml
+    )
+    assert changed == sorted(
+        row.split(",")[0].replace(".tar", ".xml") for row in rows[:3]
+    )
+    for path in written:
+        if path.name in changed:
+            assert "21.5907<" in path.read_text()
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+import schema_validation
+
+pytest.importorskip("lxml")
+
+MINIMAL_RECORD = """<?xml version="1.0" encoding="UTF-8"?>
+<gmi:MI_Metadata xmlns:gmi="http://www.isotc211.org/2005/gmi"
+    xmlns:gmd="http://www.isotc211.org/2005/gmd"
+    xmlns:gco="http://www.isotc211.org/2005/gco">
+  <gmd:contact>
+    <gmd:CI_ResponsibleParty>
+      <gmd:organisationName>
+        <gco:CharacterString>NOAA</gco:CharacterString>
+      </gmd:organisationName>
+      <gmd:role>
+        <gmd:CI_RoleCode codeList="codelist#CI_RoleCode"
+            codeListValue="pointOfContact">pointOfContact</gmd:CI_RoleCode>
+      </gmd:role>
+    </gmd:CI_ResponsibleParty>
+  </gmd:contact>
+  {date_stamp}
+  <gmd:identificationInfo>
+    <gmd:MD_DataIdentification>
+      <gmd:citation>
+        <gmd:CI_Citation>
+          <gmd:title><gco:CharacterString>Granule</gco:CharacterString></gmd:title>
+          <gmd:date>
+            <gmd:CI_Date>
+              <gmd:date><gco:Date>2025-09-03</gco:Date></gmd:date>
+              <gmd:dateType>
+                <gmd:CI_DateTypeCode codeList="codelist#CI_DateTypeCode"
+                    codeListValue="creation">creation</gmd:CI_DateTypeCode>
+              </gmd:dateType>
+            </gmd:CI_Date>
+          </gmd:date>
+        </gmd:CI_Citation>
+      </gmd:citation>
+      <gmd:abstract><gco:CharacterString>Abstract</gco:CharacterString></gmd:abstract>
+      <gmd:language><gco:CharacterString>eng</gco:CharacterString></gmd:language>
+    </gmd:MD_DataIdentification>
+  </gmd:identificationInfo>
+</gmi:MI_Metadata>
+"""
+
+
+def record(date_stamp="<gmd:dateStamp><gco:Date>2025-09-03</gco:Date></gmd:dateStamp>"):
+    return MINIMAL_RECORD.replace("{date_stamp}", date_stamp)
+
+
+def test_bundled_schemas_validate_offline():
+    validator = schema_validation.SchemaValidator()
+    assert validator.unavailable is None
+
+    assert validator.issues(record()) == []
+
+    undated = record(date_stamp="")
+    issues = validator.issues(undated)
+    assert issues
+    assert issues[0]["kind"] == "schema"
+    # Reported where the missing dateStamp was expected.
+    assert (
+        issues[0]["line"]
+        == undated.splitlines().index("  <gmd:identificationInfo>") + 1
+    )
+    assert "dateStamp" in issues[0]["detail"]
+
+
+def test_local_mirror_resolves_absolute_imports(tmp_path):
+    entry_url = "https://example.org/schemas/entry.xsd"
+    types_url = "https://example.org/types/types.xsd"
+    files = {
+        entry_url: f"""<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    xmlns:t="urn:types" targetNamespace="urn:entry" elementFormDefault="qualified">
+  <xs:import namespace="urn:types" schemaLocation="{types_url}"/>
+  <xs:element name="survey" type="t:Count"/>
+</xs:schema>
+""",
+        types_url: """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="urn:types">
+  <xs:simpleType name="Count">
+    <xs:restriction base="xs:nonNegativeInteger"/>
+  </xs:simpleType>
+</xs:schema>
+""",
+    }
+    for url, text in files.items():
+        path = schema_validation.mirror_path(str(tmp_path), url)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    validator = schema_validation.SchemaValidator(str(tmp_path), entry_url)
+    assert validator.unavailable is None
+    assert validator.issues('<survey xmlns="urn:entry">3</survey>') == []
+
+    (issue,) = validator.issues('<survey xmlns="urn:entry">\n-3\n</survey>')
+    assert issue["kind"] == "schema"
+    assert issue["line"] == 1
+
+    (issue,) = validator.issues('<survey xmlns="urn:entry">\n3</surveys>')
+    assert issue["kind"] == "not well-formed"
+    assert issue["line"] == 2
@@ -0,0 +1,55 @@
+import csv
+import os
+import uuid
+
+from uuid_registry import CSV_HEADER, UUIDRegistry
+
+NEW_GRANULE = "NCRMP_SFM_FIXED_2024_MP2404_MHI_OAH_OCC-OAH-999_c20250903_part1of1.tar"
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_reuses_mints_and_exports(workspace):
+    path = str(workspace / "uuidLookup.csv")
+    before = read_csv(path)
+    filename, known = before[1]
+
+    registry = UUIDRegistry(path)
+    assert registry.get_or_create(filename) == known
+    assert registry.get(NEW_GRANULE) is None
+    minted = registry.get_or_create(NEW_GRANULE)
+    assert uuid.UUID(minted).version == 4
+    assert registry.get_or_create(NEW_GRANULE) == minted
+    registry.close()
+
+    after = read_csv(path)
+    assert after[0] == CSV_HEADER
+    assert after[:-1] == before
+    assert after[-1] == [NEW_GRANULE, minted]
+
+    reopened = UUIDRegistry(path)
+    assert reopened.get_or_create(NEW_GRANULE) == minted
+    reopened.close(export=False)
+
+
+def test_edited_csv_is_imported_again(workspace):
+    path = str(workspace / "uuidLookup.csv")
+    registry = UUIDRegistry(path)
+    minted = registry.get_or_create(NEW_GRANULE)
+    registry.close()
+
+    recovered = str(uuid.uuid4())
+    rows = read_csv(path)
+    rows[-1] = [NEW_GRANULE, recovered]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+    # Same size as before, so make sure the edit shows in the mtime.
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+    registry = UUIDRegistry(path)
+    assert registry.get(NEW_GRANULE) == recovered != minted
+    registry.close(export=False)
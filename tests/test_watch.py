@@ -0,0 +1,60 @@
+import csv
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+
+from conftest import manifest_rows, write_manifest
+
+
+def unknown_site(row, site):
+    return row.replace("OCC-OAH-002", site)
+
+
+def test_failures_file_keeps_every_poll(workspace):
+    first = manifest_rows(workspace)[0]
+    incoming = workspace / "incoming"
+    incoming.mkdir()
+    watcher = subprocess.Popen(
+        [
+            sys.executable,
+            "xmlGenerate.py",
+            "743",
+            "--watch",
+            "incoming",
+            "--settle",
+            "0",
+            "--poll-interval",
+            "0.1",
+            "--failures",
+            "failures.csv",
+        ],
+        cwd=workspace,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    summaries = queue.Queue()
+    threading.Thread(
+        target=lambda: [summaries.put(line) for line in watcher.stdout],
+        daemon=True,
+    ).start()
+    try:
+        write_manifest(incoming, "a.mnf", [unknown_site(first, "OCC-OAH-998")])
+        assert json.loads(summaries.get(timeout=60))["failed"] == 1
+        write_manifest(incoming, "b.mnf", [unknown_site(first, "OCC-OAH-999")])
+        assert json.loads(summaries.get(timeout=60))["failed"] == 1
+    finally:
+        watcher.send_signal(signal.SIGINT)
+        assert watcher.wait(timeout=60) == 0
+
+    with open(os.path.join(workspace, "failures.csv"), newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Filename", "Reason"]
+    assert [row[0] for row in rows[1:]] == [
+        unknown_site(first, site).split(",")[0]
+        for site in ("OCC-OAH-998", "OCC-OAH-999")
+    ]
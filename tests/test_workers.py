@@ -0,0 +1,23 @@
+import json
+import shutil
+
+
+def written_xml(workspace):
+    """Returns {relative path: bytes} of every XML under an output folder,
+    and removes the folders."""
+    paths = sorted(workspace.glob("*/*.xml"))
+    files = {str(path.relative_to(workspace)): path.read_bytes() for path in paths}
+    for folder in {path.parent for path in paths}:
+        shutil.rmtree(folder)
+    return files
+
+
+def test_workers_write_the_same_files_as_a_serial_run(workspace, generate):
+    serial = generate("--input", "SfM_Metadata.mnf", "--full")
+    assert serial.returncode == 0, serial.stderr
+    expected = written_xml(workspace)
+    assert len(expected) == json.loads(serial.stdout)["written"] > 0
+
+    parallel = generate("--input", "SfM_Metadata.mnf", "--full", "--workers", "3")
+    assert parallel.returncode == 0, parallel.stderr
+    assert written_xml(workspace) == expected
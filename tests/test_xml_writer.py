@@ -0,0 +1,31 @@
+import pytest
+
+import xml_writer
+from xml_writer import XmlWriter
+
+
+def test_unwritable_text_is_a_failure_not_a_dead_thread(tmp_path):
+    writer = XmlWriter(queue_size=1)
+    writer.submit(str(tmp_path / "bad.xml"), "<a>\ud800</a>", tag="bad")
+    for number in range(3):
+        writer.submit(str(tmp_path / f"{number}.xml"), "<a/>", tag=number)
+    summary = writer.close()
+
+    assert (summary["written"], summary["failed"]) == (3, 1)
+    [(tag, _, error)] = writer.failures()
+    assert tag == "bad" and "surrogate" in error
+    assert [tag for tag, _ in writer.completed()] == [0, 1, 2]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "0.xml",
+        "1.xml",
+        "2.xml",
+    ]
+
+
+def test_submit_raises_once_the_thread_has_stopped(tmp_path):
+    writer = XmlWriter(queue_size=1)
+    writer._queue.put(xml_writer._STOP)
+    writer._thread.join()
+    with pytest.raises(RuntimeError):
+        writer.submit(str(tmp_path / "a.xml"), "<a/>")
+    assert writer.close()["written"] == 0
@@ -0,0 +1,212 @@
+"""
+UUID Registry
+=============
+Purpose:
+    Keeps the granule filename -> UUID mapping in an indexed SQLite database
+    next to uuidLookup.csv, so xmlGenerate.py can get-or-create a UUID with a
+    primary-key lookup instead of re-reading the CSV for every record.
+
+    uuidLookup.csv stays the shared master copy. The database re-imports it
+    whenever the CSV changes on disk (e.g. after recover_uuids.py) and
+    exports back to it when a run closes the registry, so every tool that
+    reads the CSV keeps working.
+
+Concurrency:
+    Each new UUID is minted inside its own immediate SQLite write
+    transaction: the write lock is taken before re-checking the filename
+    and released as soon as the row is committed. A second run (or
+    recover_uuids.py --merge) only ever waits for one check-and-insert,
+    then sees the committed row, so one granule can never be handed two
+    UUIDs and concurrent runs aren't serialized end to end.
+
+Usage:
+    registry = UUIDRegistry("uuidLookup.csv")
+    granuleUUID = registry.get_or_create(tarFileName)
+    registry.close()  # commits and rewrites uuidLookup.csv
+
+    python uuid_registry.py import UPDATED_MASTER_uuidLookup.csv
+    python uuid_registry.py export uuidLookup.csv
+"""
+
+import csv
+import os
+import sqlite3
+import sys
+import uuid
+
+CSV_HEADER = ["Filename", "UUID"]
+
+
+class UUIDRegistry:
+    """Indexed filename -> UUID store mirrored to a Filename,UUID CSV."""
+
+    def __init__(self, csv_path="uuidLookup.csv", db_path=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or os.path.splitext(csv_path)[0] + ".sqlite"
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Opens the database on first use and syncs it with the CSV."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.db_path, timeout=300, isolation_level=None
+            )
+            self._connection.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS granules (
+                    filename TEXT PRIMARY KEY,
+                    uuid TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """)
+            self._sync_from_csv()
+        return self._connection
+
+    def _csv_fingerprint(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _sync_from_csv(self):
+        """Imports the CSV if it changed since this database last saw it."""
+        fingerprint = self._csv_fingerprint()
+        if fingerprint is None:
+            return
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'csv_fingerprint'"
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            self.import_csv(self.csv_path)
+
+    def get(self, filename):
+        """Returns the UUID recorded for filename, or None."""
+        row = self.connection.execute(
+            "SELECT uuid FROM granules WHERE filename = ?", (filename,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_or_create(self, filename):
+        """Returns the UUID for filename, minting and recording one if needed."""
+        existing = self.get(filename)
+        if existing is not None:
+            return existing
+
+        connection = self.connection
+        # Take the write lock before re-checking, so two runs can't both
+        # decide the granule is new, and release it once the row is in.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT uuid FROM granules WHERE filename = ?", (filename,)
+            ).fetchone()
+            if row is None:
+                row = (str(uuid.uuid4()),)
+                connection.execute(
+                    "INSERT INTO granules (filename, uuid) VALUES (?, ?)",
+                    (filename, row[0]),
+                )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return row[0]
+
+    def commit(self):
+        if self._connection is not None and self._connection.in_transaction:
+            self._connection.execute("COMMIT")
+
+    def import_csv(self, path):
+        """Merges a Filename,UUID CSV into the registry.
+
+        Rows in the CSV win over what the database holds for the same
+        filename; later rows win over earlier ones. Filenames only the
+        database knows about (minted but not yet exported) are kept.
+        """
+        with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = [(row[0], row[1]) for row in reader if len(row) >= 2 and row[0]]
+
+        self.upsert(rows, commit=False)
+        if os.path.abspath(path) == os.path.abspath(self.csv_path):
+            self._set_fingerprint()
+        self.commit()
+        return len(rows)
+
+    def upsert(self, rows, commit=True):
+        """Records (filename, uuid) pairs in one transaction, replacing any
+        UUID already held for those filenames; later pairs win."""
+        connection = self.connection
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(
+            "INSERT INTO granules (filename, uuid) VALUES (?, ?) "
+            "ON CONFLICT (filename) DO UPDATE SET uuid = excluded.uuid",
+            rows,
+        )
+        if commit:
+            self.commit()
+
+    def export_csv(self, path=None):
+        """Writes every filename and UUID to a Filename,UUID CSV.
+
+        The file is written to a temporary name and renamed into place under
+        the registry's write lock, so readers never see a partial file.
+        """
+        path = path or self.csv_path
+        connection = self.connection
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        rows = connection.execute(
+            "SELECT filename, uuid FROM granules ORDER BY rowid"
+        ).fetchall()
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+        os.replace(temp_path, path)
+
+        if os.path.abspath(path) == os.path.abspath(self.csv_path):
+            self._set_fingerprint()
+        self.commit()
+        return len(rows)
+
+    def _set_fingerprint(self):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_fingerprint', ?)",
+            (self._csv_fingerprint(),),
+        )
+
+    def close(self, export=True):
+        """Refreshes the CSV and closes the database."""
+        if self._connection is None:
+            return
+        self.commit()
+        if export:
+            self.export_csv()
+        self._connection.close()
+        self._connection = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python uuid_registry.py import|export <file.csv>")
+        sys.exit(2)
+
+    registry = UUIDRegistry()
+    if sys.argv[1] == "import":
+        count = registry.import_csv(sys.argv[2])
+        print(f"Imported {count} rows from {sys.argv[2]}.")
+    else:
+        count = registry.export_csv(sys.argv[2])
+        print(f"Exported {count} rows to {sys.argv[2]}.")
+    registry.close(export=sys.argv[1] == "import")
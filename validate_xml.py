@@ -0,0 +1,326 @@
+"""
+Unified Output Validator (Post-Processing)
+==========================================
+Purpose:
+    One validation pass over generated XML granules, replacing separate runs
+    of qa_check.py and check_xml_dates.py per folder. Each file is read once
+    and checked for:
+      - "2019" outside the known valid phrases (historical data bleeding)
+      - [*Placeholder*] text the generator left unfilled
+      - gml:beginPosition / gml:endPosition that are missing or fall outside
+        the mission's survey dates in the source lookup CSV
+      - a mission date range ("between X and Y") that doesn't match the CSV
+      - with --schemas, XML that isn't well-formed or, when lxml is
+        installed, isn't valid against the ISO 19139 schemas bundled in
+        schemas/ (see schema_validation.py; compiled once per worker)
+    Mission date bounds come from the same per-mission index xmlGenerate.py
+    uses and are resolved once per file in the parent; files are checked
+    across a process pool.
+
+Usage:
+    python validate_xml.py "MP2404_Fixed_Main Hawaiian Islands_2026_04_20"
+    python validate_xml.py output --workers 8 --report qa_report.json
+    python validate_xml.py output --schemas
+
+    Folders are searched recursively, so an --output-root folder can be
+    given directly. Prints the JSON report (also written to --report FILE)
+    and exits 1 if any file has an issue. Schema validation (~2.5 ms a
+    file) costs several times the other checks put together, so it is
+    opt-in; with it, the report's "schemas" entry says whether documents
+    were validated against the schemas or, and why, only checked for
+    well-formedness.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from collection_records import parent_record_design
+from granule_name import GranuleNameError, parse_granule_name
+from schema_validation import SCHEMA_DIRECTORY, schema_validator
+
+# These are the valid references we EXPECT to see
+VALID_PHRASES = [
+    "since 2019",
+    "established in 2019",
+    "2019-04-21",  # This is the valid master parent project start date
+    "<gco:Date>2019</gco:Date>",  # The SOP publication date
+    # Static template text: the SOP citations and the program history.
+    "Oliver T. 2019.",
+    "2019 update",
+    "beginning in 2019",
+    "began in 2019",
+]
+
+MISSION_RANGE_PATTERN = re.compile(
+    r"between (\d{4}-\d{2}-\d{2}) and (\d{4}-\d{2}-\d{2})</gco:CharacterString>"
+)
+PLACEHOLDER_PATTERN = re.compile(r"\[\*[^\[\]\r\n]*\]")
+
+# Same lookup tables, chosen the same way, as xmlGenerate.processRecord.
+FIXED_LOOKUP = "fixedLookup.csv"
+STRS_LOOKUP = "strsLookup.csv"
+DESIGN_LOOKUPS = {"FIXED": FIXED_LOOKUP, "StRS": STRS_LOOKUP}
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def iter_xml_files(folders):
+    """Yields every .xml file under the given folders, in sorted order."""
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".xml"):
+                    yield os.path.join(root, name)
+
+
+def lookup_for(filename):
+    """Returns the site lookup table a granule or parent record was
+    generated from, or None if filename is neither's name."""
+    try:
+        design = parse_granule_name(filename).design
+    except GranuleNameError:
+        design = parent_record_design(os.path.splitext(filename)[0])
+    return DESIGN_LOOKUPS.get(design)
+
+
+def expected_bounds(store, path):
+    """Returns the (start, end) yyyy-mm-dd mission bounds for one XML file.
+
+    Returns None if the filename isn't a granule or parent record name, so
+    there is nothing to check the dates against.
+    """
+    filename = os.path.basename(path)
+    lookup_file = lookup_for(filename)
+    if lookup_file is None:
+        return None
+    start, end = store.mission_dates(lookup_file).bounds_for(filename)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+
+def tag_text(content, tag):
+    """Returns the stripped text of the first <tag>...</tag> in content, or None."""
+    opening = "<" + tag + ">"
+    position = content.find(opening)
+    if position == -1:
+        return None
+    position += len(opening)
+    closing = content.find("</" + tag + ">", position)
+    if closing == -1:
+        return None
+    return content[position:closing].strip()
+
+
+class LineCounter:
+    """Turns string offsets into 1-based line numbers, counting forwards only
+    from the last offset asked about, so a file is counted through at most
+    once however many positions are reported in it."""
+
+    def __init__(self, content):
+        self.content = content
+        self.position = 0
+        self.line_number = 1
+
+    def line_at(self, position):
+        if position < self.position:
+            self.position, self.line_number = 0, 1
+        self.line_number += self.content.count("\n", self.position, position)
+        self.position = position
+        return self.line_number
+
+
+def check_file(path, bounds=None, schemas=None):
+    """Checks one XML file in a single read and returns its result dict.
+
+    bounds is the (start, end) pair from expected_bounds, and schemas the
+    schema mirror to validate against, if any. The result holds the
+    begin/end positions found and a list of issues, each a dict with the
+    issue kind, the 1-based line (if any) and a short detail.
+
+    The file is searched as one string rather than line by line; line
+    numbers are only worked out for positions that are reported.
+    """
+    issues = []
+    begin = end = mission_range = None
+
+    def issue(kind, line_number=None, detail=""):
+        issues.append({"kind": kind, "line": line_number, "detail": detail})
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as error:
+        issue("unreadable", None, str(error))
+        content = None
+
+    if content is not None:
+        if schemas is not None:
+            issues.extend(schema_validator(schemas).issues(content))
+
+        lines = LineCounter(content)
+        position = content.find("2019")
+        while position != -1:
+            line_start = content.rfind("\n", 0, position) + 1
+            line_end = content.find("\n", position)
+            if line_end == -1:
+                line_end = len(content)
+            line = content[line_start:line_end]
+            if not any(valid in line for valid in VALID_PHRASES):
+                issue("suspicious 2019", lines.line_at(position), line.strip())
+            position = content.find("2019", line_end)
+
+        if "[*" in content:
+            lines = LineCounter(content)
+            for match in PLACEHOLDER_PATTERN.finditer(content):
+                issue(
+                    "unfilled placeholder", lines.line_at(match.start()), match.group(0)
+                )
+
+        begin = tag_text(content, "gml:beginPosition")
+        end = tag_text(content, "gml:endPosition")
+        match = MISSION_RANGE_PATTERN.search(content)
+        if match:
+            mission_range = (
+                match.group(1),
+                match.group(2),
+                LineCounter(content).line_at(match.start()),
+            )
+
+        if begin is None:
+            issue("missing beginPosition")
+        if end is None:
+            issue("missing endPosition")
+        if bounds is None:
+            issue(
+                "unparseable filename",
+                None,
+                "not a granule or parent record name: " + os.path.basename(path),
+            )
+        else:
+            start, finish = bounds
+            for name, value in (("beginPosition", begin), ("endPosition", end)):
+                if value is not None and not start <= value <= finish:
+                    issue(
+                        "date outside mission",
+                        None,
+                        f"{name} {value} not within {start} - {finish}",
+                    )
+            if begin is not None and end is not None and begin > end:
+                issue("date outside mission", None, f"begin {begin} after end {end}")
+            if mission_range is not None and mission_range[:2] != (start, finish):
+                issue(
+                    "mission range mismatch",
+                    mission_range[2],
+                    f"{mission_range[0]} - {mission_range[1]}, "
+                    f"lookup CSV has {start} - {finish}",
+                )
+
+    return {
+        "file": path,
+        "begin": begin,
+        "end": end,
+        "expected": list(bounds) if bounds else None,
+        "issues": issues,
+    }
+
+
+def _check_job(job):
+    return check_file(*job)
+
+
+def validate(folders, lookup_directory=".", workers=DEFAULT_WORKERS, schemas=None):
+    """Validates every XML under folders and returns the consolidated report.
+
+    The report lists every file's result under "results" (begin/end
+    positions, expected bounds, issues), so callers can print their own
+    views of it. schemas is the schema mirror to validate every file
+    against, or None to skip that check.
+    """
+    from lookup_store import LookupStore
+
+    start_time = time.time()
+    store = LookupStore(lookup_directory)
+    jobs = [
+        (path, expected_bounds(store, path), schemas)
+        for path in iter_xml_files(folders)
+    ]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = list(executor.map(_check_job, jobs, chunksize=chunksize))
+    else:
+        results = [_check_job(job) for job in jobs]
+
+    issue_counts = Counter(
+        issue["kind"] for result in results for issue in result["issues"]
+    )
+    report = {
+        "folders": list(folders),
+        "files": len(results),
+        "failedFiles": sum(1 for result in results if result["issues"]),
+        "issues": dict(issue_counts.most_common()),
+        "elapsedSeconds": round(time.time() - start_time, 3),
+        "results": results,
+    }
+    if schemas is not None:
+        skipped = schema_validator(schemas).unavailable
+        report["schemas"] = {
+            "directory": schemas,
+            "validated": skipped is None,
+            "skipped": skipped,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("folders", nargs="+", metavar="FOLDER")
+    parser.add_argument(
+        "--lookup-dir",
+        default=".",
+        help="Folder holding fixedLookup.csv and strsLookup.csv (default: here).",
+    )
+    parser.add_argument(
+        "--schemas",
+        nargs="?",
+        const=SCHEMA_DIRECTORY,
+        metavar="DIR",
+        help="Also check every file is well-formed and valid against the ISO "
+        "19139 schemas in DIR (default: the bundled schemas/).",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--report", metavar="FILE", help="Also write the report here.")
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="List every file in the report, not just those with issues.",
+    )
+    arguments = parser.parse_args(argv)
+
+    missing = [folder for folder in arguments.folders if not os.path.isdir(folder)]
+    if missing:
+        parser.error("not a folder: " + ", ".join(missing))
+
+    report = validate(
+        arguments.folders, arguments.lookup_dir, arguments.workers, arguments.schemas
+    )
+    if not arguments.all:
+        report["results"] = [result for result in report["results"] if result["issues"]]
+
+    report_text = json.dumps(report, indent=2)
+    if arguments.report:
+        with open(arguments.report, "w", encoding="utf-8") as f:
+            f.write(report_text + "\n")
+    print(report_text)
+    return 1 if report["failedFiles"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
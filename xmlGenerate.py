@@ -1,18 +1,40 @@
 #!/usr/bin/python
-from xml.etree import ElementTree as ET
-import pandas as pd
-from datetime import date
-from datetime import datetime
 import datetime
-import numpy as np
 import os
 import sys
 import csv
-import re
-import fnmatch
-import math
+import argparse
+import json
+import logging
+import itertools
+import time
 import uuid
-import chardet
+from collections import Counter, deque
+
+from batch_resolver import (
+    DESIGNS,
+    DIMENSIONS,
+    SITE_CACHE_SIZE,
+    UNRESOLVED_REASONS,
+    BatchResolver,
+    Resolution,
+    unparsed,
+)
+from collection_records import DESIGN_SUFFIXES, CollectionAggregator, parent_record_id
+from dependency_index import DependencyIndex, dependency_key
+from granule_name import GranuleNameError, canonical_name, parse_granule_name
+from instrumentation import FailureLog, Instrumentation
+from lookup_store import LookupStore, projectLookup
+from manifest_reader import (
+    ManifestReader,
+    ManifestRecord,
+    iter_manifests,
+)
+from run_journal import RunJournal, encode_parts, input_hash
+from schema_validation import SCHEMA_DIRECTORY, schema_validator
+from template_engine import TemplateRegistry
+from uuid_registry import UUIDRegistry
+from xml_writer import XmlWriter, atomic_write
 
 """
 xmlGenerate.py
@@ -126,6 +148,44 @@ HOW TO USE THIS SCRIPT
 6. This program will create one xml metadata file for each mnf class manifest file that it finds. The xml metadata
    file will have the same file name as the mnf file that it corresponds to.
 
+7. For unattended or scheduled runs, pass one or more --input paths (.mnf files or cruise directories) and
+   the menu and prompts are skipped entirely, e.g.:
+       python xmlGenerate.py 743 --input SE2406 --input MP2404 --output-root output --workers 4
+   A new project number needs --project-name. The run prints a JSON summary (also written to --summary FILE)
+   and exits 0 when everything was generated, 1 with failed records or skipped manifest lines, 2 for a
+   configuration error and 3 when --fail-fast stopped it. Lookup tables stay loaded across all inputs.
+
+8. Output is quiet by default: only skipped records and other problems are logged, to stderr. Add -v for
+   progress or -vv for every record's lookups and template values, and --report FILE for a JSON run report
+   with the time spent per stage (resolve, journal, uuid, render, write), records per second,
+   the slowest records and skip reasons by category. In batch mode the report is also in the summary.
+
+9. To have new cruise deliveries turn into XML as they arrive, run it as a watcher over the folder the
+   .mnf files are saved into:
+       python xmlGenerate.py 743 --watch incoming --output-root output -v
+   Lookup tables and templates stay loaded and are reloaded when their files change. Only new or
+   changed manifest rows are processed; how far each manifest has been read is kept in the run
+   journal, so restarting the watcher doesn't reprocess anything. --once processes what is there and exits.
+
+10. Add --parents to a batch run to also write the parent (collection) record that every granule's
+    parentRecordID points at, one per mission, year and design (per region too for SE2406), into a
+    parents_<date> folder. Each holds the collection's bounding box, survey dates, site, granule and
+    image counts and total size, gathered while the granules are resolved.
+
+11. After correcting a lookup table (a keyword in SfM_Dictionary.csv, a site's coordinates in
+    strsLookup.csv, ...), regenerate just the granules built from the rows that changed:
+        python xmlGenerate.py 743 --regenerate-affected
+    Every granule written since the run journal started keeping dependencies is regenerated from
+    the manifest row stored for it, so no manifest has to be read. Granules of other projects are
+    left alone.
+
+12. Add --validate to check every record against the ISO 19139 schemas before it is written:
+        python xmlGenerate.py 743 --input SE2406 --validate
+    Records that aren't well-formed or don't validate are logged with the line of each problem and
+    reported as "invalid XML" instead of written. The schemas are read from the mirror bundled
+    in schemas/ (or the folder given) and need lxml, an optional dependency; without it only
+    well-formedness is checked. Validating costs about 2.5 ms per record (under 1 ms without lxml).
+
 """
 
 # Declare some variables here to be used elsewhere in the program.
@@ -145,80 +205,140 @@ islandLookup = "islandLookup.csv"
 fixedLookup = "fixedLookup.csv"
 strsLookup = "strsLookup.csv"
 uuidLookup = "uuidLookup.csv"
-badFileList = []
-
-try:
-    crcpProjectNumber = sys.argv[1]
-except:
-    crcpProjectNumber = 743
+badFileList = FailureLog()
+
+# Bounds on each stage of oneRecordPerFile's pipeline: manifest records
+# resolved per BatchResolver pass, records each render worker may be given
+# ahead of the writer (the writer's own queue is xml_writer.DEFAULT_QUEUE_SIZE).
+RESOLVE_BATCH_SIZE = 1000
+RENDER_WINDOW = 4
+
+# Every placeholder editTemplateForReal knows how to fill. Anything else found
+# in a template is reported once, when the template is compiled.
+templatePlaceholders = (
+    "[*CRCPProjectNumber*]",
+    "[*Date*]",
+    "[*SurveyDate*]",
+    "[*CoRISPlaceCountry*]",
+    "[*CoRISPlaceOcean*]",
+    "[*MissionStartTime*]",
+    "[*MissionEndTime*]",
+    "[*SiteName*]",
+    "[*SiteWestLon*]",
+    "[*SiteEastLon*]",
+    "[*SiteSouthLat*]",
+    "[*SiteNorthLat*]",
+    "[*IslandName*]",
+    "[*Region*]",
+    "[*FileSize*]",
+    "[*ImageStartTime*]",
+    "[*ImageEndTime*]",
+    "[*FileIdentifier*]",
+    "[*SfMSiteFileName*]",
+    "[*Year*]",
+    "[*DistributorFormat*]",
+    "[*CRCPProjectKeyword*]",
+    "[*parent metadata ID*]",
+    "[*parent metadata landing page link or DOI link*]",
+    "[*CoRISPlaceIslandCountry*]",
+    "[*CoRISPlaceIslandOcean*]",
+    "[*KeywordShipName*]",
+    "[*GCMD_PlaceKeyword]",
+    "[*UUID*]",
+)
+
+# The collection-level record rendered for each parentRecordID with --parents,
+# and the placeholders of it that the granule templates don't have.
+parentTemplate = "xmlTemplate_parent.xml"
+parentTemplatePlaceholders = (
+    "[*MissionID*]",
+    "[*SiteDesign*]",
+    "[*WestBoundLon*]",
+    "[*EastBoundLon*]",
+    "[*SouthBoundLat*]",
+    "[*NorthBoundLat*]",
+    "[*SiteCount*]",
+    "[*GranuleCount*]",
+    "[*ImageCount*]",
+)
+
+# How each design's sites are named in parent record titles.
+designSiteNames = {"FIXED": "Fixed Sites", "StRS": "Stratified Random Sites"}
+
+# Overridden from the command line in main() (and in each worker process).
+crcpProjectNumber = 743
+
+# Folder the date-stamped output folders are created in; "" is the working directory.
+outputRoot = ""
+
+# Schema mirror every rendered record is validated against with --validate
+# (see schema_validation.py); None skips validation.
+validationSchemas = None
 
 
 # If myDirectory is left like this you can really only run this script from your current working directory.
 # This does allow the user to run this application anywhere they have access though. I think it works as-is.
 myDirectory = os.getcwd()
 
+# Every lookup table is read once, on first use, and indexed for the rest of the run.
+lookupStore = LookupStore(myDirectory)
+
+# Templates are likewise read, encoding-detected and tokenized only once.
+templateRegistry = TemplateRegistry(
+    myDirectory, templatePlaceholders + parentTemplatePlaceholders
+)
+
+# Granule UUIDs; the database is opened on first use and uuidLookup.csv is
+# rewritten from it when oneRecordPerFile finishes.
+uuidRegistry = UUIDRegistry(os.path.join(myDirectory, uuidLookup))
+
+# Input hash of every granule written so far, used to skip unchanged granules.
+runJournal = RunJournal(os.path.join(myDirectory, "generationJournal.sqlite"))
+
+# Per-record detail is logged at DEBUG and skipped records at WARNING, so a
+# default run only shows what went wrong; -v / -vv turn the detail back on.
+logger = logging.getLogger("xmlGenerate")
+
+# Stage timings collected by processRecord in this process (the parent, or a
+# worker). They are drained after every record and merged into the run's
+# Instrumentation by oneRecordPerFile.
+recordMetrics = Instrumentation()
+
+# (design, mission, site) -> (what it was built from, SiteContext), for the
+# sites processRecord has seen most recently in this process.
+siteContexts = {}
+
 
 def getFileList(myDirectory):
-    """This function gets a list of mnf files from the user's current directory.
-    Specifically, the os.listdir command gets a list of everything in the directory
-    and then this function iterates over that list and grabs everything where the
-    filename ends with .mnf. These are then added to another list.
+    """This function yields the mnf files in the user's current directory.
+    Specifically, os.scandir walks the directory entries lazily and this
+    function yields every one where the filename ends with .mnf, so work can
+    start on the first manifest before the rest of the directory is read.
 
     Args:
         myDirectory (string): This directory is the user's current working
         directory.
 
-    Returns:
-        list: This is a list of mnf files in the user's current directory.
+    Yields:
+        string: The path of each mnf file in the user's current directory.
     """
-    dataFiles = []
-    myFiles = os.listdir(myDirectory)
-    for file in myFiles:
-        if file.endswith(".mnf"):
-            dataFiles.append(file)
-    return dataFiles
-
-
-def getLonLat(columnName, fileName, minOrMax):
-    df = pd.read_csv(fileName)
-    column = df[columnName]
-    max_value = column.max()
-    min_value = column.min()
-    if minOrMax == "min":
-        return min_value
-    elif minOrMax == "max":
-        return max_value
-    else:
-        return "INVALID INPUT"
+    yield from iter_manifests(myDirectory)
 
 
 def getDateRange(file, minOrMax, targetFilename=None):
     """
-    Reads a CSV and calculates the min/max dates.
-    If targetFilename is provided, it filters the data to only include rows
-    where the MISSION matches the current file being processed.
+    Looks up the min/max survey dates for a site lookup table.
+    If targetFilename is provided, the range is narrowed to the MISSION
+    named in the file being processed, using the per-mission date index
+    the lookup store builds once per run.
     """
-    import pandas as pd
-
-    df = pd.read_csv(file)
-
-    # If we passed a filename, filter the dataframe to ONLY the current mission
-    if targetFilename and "MISSION" in df.columns:
-        # Keep rows where the MISSION string (e.g., 'MP2011') is inside the filename
-        mask = df["MISSION"].apply(
-            lambda x: str(x) in targetFilename if pd.notnull(x) else False
-        )
-        # Only apply the filter if we actually found a match
-        if mask.any():
-            df = df[mask]
-
-    df["DATE"] = pd.to_datetime(df["DATE"])
-    column = df["DATE"]
-    max_value = column.max()
-    min_value = column.min()
+    missionDates = lookupStore.mission_dates(file)
+    if targetFilename:
+        min_value, max_value = missionDates.bounds_for(targetFilename)
+    else:
+        min_value, max_value = missionDates.overall
 
     dateRange = str(min_value) + " - " + str(max_value)
-    del df
 
     if minOrMax == "min":
         return min_value
@@ -243,34 +363,50 @@ def dateConvert(dateString, format):
 
 
 def getUUID(csvFileName):
-    myUUID = ""
-    try:
-        fileNameRowNumber = getRowNumber(str(csvFileName), uuidLookup, "File Name")
-        myUUID = getData(fileNameRowNumber, uuidLookup, "uuid")
-        print("FILENAME AND UUID FOUND. UUID: " + str(myUUID))
-    except:
-        myUUID = uuid.uuid4()
-        # print("UUID GENERATED: " + str(myUUID))
-        data = [str(csvFileName), str(myUUID)]
-        with open(uuidLookup, "a") as f:
-            writer = csv.writer(f)
-            writer.writerow(data)
-    return myUUID
-
-
-def detect_encoding(file):
-    detector = chardet.universaldetector.UniversalDetector()
-    with open(file, "rb") as f:
-        for line in f:
-            detector.feed(line)
-            if detector.done:
-                break
-    detector.close()
-    return detector.result
+    """Returns the UUID for a granule, minting one the first time it is seen.
+
+    Backed by the indexed UUID registry, which mirrors uuidLookup.csv.
+    """
+    return uuidRegistry.get_or_create(str(csvFileName))
+
 
+def getProjectKeyword():
+    """Returns the project name for crcpProjectNumber.
 
-def editTemplateForReal(
-    myTemplate,
+    Unknown project numbers prompt the user for a name once and append it to
+    projectLookup.csv. oneRecordPerFile calls this before starting any worker
+    processes so the prompt never happens inside a worker.
+    """
+    crcpProjectKeyword = ""
+    if str(crcpProjectNumber) == "743":
+        crcpProjectKeyword = "National Coral Reef Monitoring Program (NCRMP)"
+    else:
+        crcpProjectKeyword = lookupStore.project_name(crcpProjectNumber)
+        if crcpProjectKeyword is None:
+            crcpProjectKeyword = input(
+                "\nProject information not found. Please enter the project name for project number "
+                + str(crcpProjectNumber)
+                + ":\n"
+            )
+            registerProject(crcpProjectNumber, crcpProjectKeyword)
+    return crcpProjectKeyword
+
+
+def registerProject(projectNumber, projectName):
+    """Appends a new project to projectLookup.csv and the in-memory store."""
+    projectLookup = "projectLookup.csv"
+    data = [int(projectNumber), str(projectName)]
+    with open(projectLookup, "a") as f:
+        writer = csv.writer(f)
+        writer.writerow(data)
+    lookupStore.add_project(projectNumber, projectName)
+    with open(projectLookup, "r") as csvFile:
+        reader = csv.reader(csvFile)
+        for item in reader:
+            logger.info("projectLookup.csv: %s", item)
+
+
+def siteTemplateValues(
     surveyDate,
     islandKeywords,
     islandOceanKeywords,
@@ -283,61 +419,24 @@ def editTemplateForReal(
     southLat,
     islandFullName,
     regionName,
-    fileSize,
-    csvFileName,
     year,
     parentRecordID,
     regionCountryKeyword,
     regionOceanKeyword,
     shipName,
-    currentDate,
-    tarFileName,
     gcmdKeyword,
-    myUUID,
 ):
-    projectLookup = "projectLookup.csv"
-    charenc = detect_encoding(myTemplate)
-    charenc = charenc["encoding"]
-    print("Encoding:", charenc)
-
-    with open(myTemplate, "r", encoding=charenc) as newXmlTemplate:
-        print("TEMPLATE OPEN")
-        templateText = newXmlTemplate.read()
-
+    """Returns the template values every part of a site has in common;
+    granuleTemplateValues has the ones that differ."""
     # landingPageLink = 'https://data.noaa.gov/metaview/page?xml=NOAA/NESDIS/ncei/paleo//iso/xml/[*INSERT*].xml\&view=getDataView\&header=none'
     landingPageLink = "https://data.noaa.gov/waf/NOAA/NESDIS/ncei/coral/iso/[*INSERT*].xml&amp;view=getDataView&amp;header=none"
     landingPageLink = landingPageLink.replace("[*INSERT*]", parentRecordID)
 
-    crcpProjectKeyword = ""
-    if str(crcpProjectNumber) == "743":
-        crcpProjectKeyword = "National Coral Reef Monitoring Program (NCRMP)"
-    else:
-        try:
-            projectRowNumber = getRowNumber(
-                int(crcpProjectNumber), projectLookup, "projectNumber"
-            )
-            # ("This is your project row number: " + str(projectRowNumber))
-            crcpProjectKeyword = getData(projectRowNumber, projectLookup, "projectName")
-            # print("THIS IS YOUR PROJECT NAME: " + crcpProjectKeyword)
-        except:
-            crcpProjectKeyword = input(
-                "\nProject information not found. Please enter the project name for project number "
-                + str(crcpProjectNumber)
-                + ":\n"
-            )
-            data = [int(crcpProjectNumber), str(crcpProjectKeyword)]
-            with open(projectLookup, "a") as f:
-                writer = csv.writer(f)
-                writer.writerow(data)
-            with open(projectLookup, "r") as csvFile:
-                reader = csv.reader(csvFile)
-                for item in reader:
-                    print(item)
+    crcpProjectKeyword = getProjectKeyword()
 
     surveyDate = dateConvert(surveyDate, "%m/%d/%Y")
-    myDict = {
+    return {
         "[*CRCPProjectNumber*]": str(crcpProjectNumber),
-        "[*Date*]": str(currentDate),
         "[*SurveyDate*]": str(surveyDate),
         "[*CoRISPlaceCountry*]": str(regionCountryKeyword),
         "[*CoRISPlaceOcean*]": str(regionOceanKeyword),
@@ -350,11 +449,8 @@ def editTemplateForReal(
         "[*SiteNorthLat*]": str(northLat),
         "[*IslandName*]": str(islandFullName),
         "[*Region*]": regionName,
-        "[*FileSize*]": str(fileSize),
         "[*ImageStartTime*]": str(surveyDate),
         "[*ImageEndTime*]": str(surveyDate),
-        "[*FileIdentifier*]": str(tarFileName),
-        "[*SfMSiteFileName*]": str(tarFileName),
         "[*Year*]": str(year),
         "[*DistributorFormat*]": "JPEG",
         "[*CRCPProjectKeyword*]": str(crcpProjectKeyword),
@@ -364,36 +460,234 @@ def editTemplateForReal(
         "[*CoRISPlaceIslandOcean*]": str(islandOceanKeywords),
         "[*KeywordShipName*]": str(shipName),
         "[*GCMD_PlaceKeyword]": str(gcmdKeyword),
+    }
+
+
+def granuleTemplateValues(fileSize, tarFileName, currentDate, myUUID):
+    """Returns the template values that differ between the parts of a site."""
+    return {
+        "[*Date*]": str(currentDate),
+        "[*FileSize*]": str(fileSize),
+        "[*FileIdentifier*]": str(tarFileName),
+        "[*SfMSiteFileName*]": str(tarFileName),
         "[*UUID*]": str(myUUID),
     }
 
-    print(myDict)
 
-    for entry in myDict:
-        templateText = templateText.replace(entry, myDict[entry])
+def siteContext(resolution):
+    """Returns the SiteContext of a resolved granule's site.
 
-    findThis = "[[][*].*[*][]]"
-    thingsToReplace = re.findall(findThis, templateText)
-    sortedList = []
-    [sortedList.append(x) for x in thingsToReplace if x not in sortedList]
-    for x in sortedList:
-        print(x)
-    return templateText
+    It is built for the first part of each (design, mission, site) seen in
+    this process and reused for the other parts, as long as they resolved
+    to the same rows and template; a lookup table or template reloaded by
+    watch mode builds a new one. Returns None if the site's dictionary,
+    island, region or ship row is missing.
+    """
+    template = templateRegistry.get(resolution.template)
+    key = (resolution.granule.design, resolution.granule.mission, resolution.site)
+    builtFrom = (
+        resolution.lookup_file,
+        resolution.mission_start,
+        resolution.mission_end,
+        resolution.site_row,
+        resolution.dictionary_row,
+        resolution.island_row,
+        resolution.region_row,
+        resolution.ship_row,
+        template.version,
+        crcpProjectNumber,
+    )
+    cached = siteContexts.get(key)
+    if cached is None or cached[0] != builtFrom:
+        if key not in siteContexts and len(siteContexts) >= SITE_CACHE_SIZE:
+            del siteContexts[next(iter(siteContexts))]
+        rows = (
+            resolution.dictionary_row,
+            resolution.island_row,
+            resolution.region_row,
+            resolution.ship_row,
+        )
+        site = None if None in rows else SiteContext(resolution, template)
+        cached = (builtFrom, site)
+        siteContexts[key] = cached
+    return cached[1]
 
 
-def generateFilename(row):
+class SiteContext:
+    """What every part (..._part1of3.tar, ...) of a fully resolved site has
+    in common: the encoded hash inputs and output folder fields, and, once a
+    part needs rendering, the shared template values. Unchanged sites
+    therefore cost only the hash inputs.
     """
-    This function is currently unused.
+
+    def __init__(self, resolution, template):
+        self.resolution = resolution
+        self.template = template
+        siteRow = resolution.site_row
+
+        startString = str(resolution.mission_start).split(" ")
+        self.missionStart = startString[0]
+
+        endString = str(resolution.mission_end).split(" ")
+        self.missionEnd = endString[0]
+
+        self.mission = siteRow["MISSION"]
+        self.regionName = resolution.island_row["Region_Name"]
+        self.fixedOrRandom = DESIGN_SUFFIXES[resolution.granule.design]
+
+        # Everything the XML is built from except today's date, which would
+        # otherwise make every granule look changed on every run, and the
+        # tar's own name, size and UUID, which processRecord adds.
+        self.inputs = encode_parts(
+            siteRow,
+            [self.missionStart, self.missionEnd],
+            resolution.dictionary_row,
+            resolution.island_row,
+            resolution.region_row,
+            resolution.ship_row,
+            template.version,
+            str(crcpProjectNumber),
+            getProjectKeyword(),
+        )
+        self._values = None
+
+    def values(self):
+        """Returns the template values shared by every part of the site."""
+        if self._values is None:
+            resolution = self.resolution
+            siteRow = resolution.site_row
+            dictionaryRow = resolution.dictionary_row
+            regionRow = resolution.region_row
+
+            surveyDate = siteRow["DATE"]
+            dateString = str(surveyDate)
+            count = len(dateString)
+            year = (
+                str(surveyDate[count - 4])
+                + str(surveyDate[count - 3])
+                + str(surveyDate[count - 2])
+                + str(surveyDate[count - 1])
+            )
+
+            # 2. Build the Parent Record ID
+            parentRecordID = parent_record_id(
+                self.mission, year, siteRow["REGION"], resolution.granule.design
+            )
+
+            values = siteTemplateValues(
+                surveyDate,
+                dictionaryRow["CoRIS Region"],
+                dictionaryRow["CoRIS Ocean"],
+                self.missionStart,
+                self.missionEnd,
+                resolution.site,
+                siteRow["LONGITUDE"],
+                siteRow["LONGITUDE"],
+                siteRow["LATITUDE"],
+                siteRow["LATITUDE"],
+                dictionaryRow["ISLAND"],
+                self.regionName,
+                year,
+                parentRecordID,
+                regionRow["CoRIS Country"],
+                regionRow["CoRIS Ocean"],
+                resolution.ship_row["Ship Keyword"],
+                dictionaryRow["GCMD Keyword"],
+            )
+            self._values = values
+        return self._values
+
+
+def renderGranule(site, tarFileName, fileSize, currentDate, myUUID):
+    """Renders one part's XML from its SiteContext."""
+    template = site.template
+    values = {
+        **site.values(),
+        **granuleTemplateValues(fileSize, tarFileName, currentDate, myUUID),
+    }
+    logger.debug("Template values for %s: %s", tarFileName, values)
+
+    with recordMetrics.stage("render"):
+        templateText = template.render(values)
+
+    for x in template.missing(values):
+        logger.warning("%s left unfilled in %s", x, tarFileName)
+    return templateText
+
+
+def validRecord(xmlText, fileName):
+    """With --validate, checks a rendered record against the schemas and
+    logs each problem with its line; returns False if there were any."""
+    if validationSchemas is None:
+        return True
+    with recordMetrics.stage("validate"):
+        issues = schema_validator(validationSchemas).issues(xmlText)
+    for issue in issues:
+        logger.warning(
+            "Invalid XML for %s, line %s: %s (%s)",
+            fileName,
+            issue["line"],
+            issue["detail"],
+            issue["kind"],
+        )
+    return not issues
+
+
+def renderParentRecord(summary, currentDate, previousHash=None):
+    """Renders the parent record of one collection.
+
+    Args:
+        summary (CollectionSummary): The collection's totals from the
+            CollectionAggregator.
+        currentDate (date): Date stamped into the record.
+        previousHash (string): Input hash from the run journal, if the record
+            was written before. Rendering is skipped when nothing changed.
+
+    Returns:
+        tuple: (xmlText, inputHash); xmlText is None if unchanged.
     """
-    myFilename = f"{row['filename']}"
-    # print("Here is the autogenerated filename: " + myFilename)
-    updatedFilename = input(
-        "If you'd like, enter a different filename now (without the extension). Otherwise, hit ENTER.\n"
+    template = templateRegistry.get(parentTemplate)
+    inputHash = input_hash(
+        list(summary),
+        template.version,
+        str(crcpProjectNumber),
+        getProjectKeyword(),
+    )
+    if inputHash == previousHash:
+        return None, inputHash
+
+    # Stable across runs without a uuidLookup.csv entry, which is for granules.
+    landingPage = "https://data.noaa.gov/waf/NOAA/NESDIS/ncei/coral/iso/" + (
+        summary.parent_id + ".xml"
     )
-    if len(updatedFilename) > 0:
-        myFilename = updatedFilename
-        # print("Filename updated successfully.\n")
-    return myFilename
+    myDict = {
+        "[*UUID*]": str(uuid.uuid5(uuid.NAMESPACE_URL, landingPage)),
+        "[*FileIdentifier*]": summary.parent_id,
+        "[*Date*]": str(currentDate),
+        "[*CRCPProjectNumber*]": str(crcpProjectNumber),
+        "[*CRCPProjectKeyword*]": str(getProjectKeyword()),
+        "[*MissionID*]": summary.mission,
+        "[*Year*]": summary.year,
+        "[*SiteDesign*]": designSiteNames[summary.design],
+        "[*Region*]": ", ".join(summary.regions),
+        "[*KeywordShipName*]": ", ".join(summary.ships),
+        "[*MissionStartTime*]": str(summary.start).split(" ")[0],
+        "[*MissionEndTime*]": str(summary.end).split(" ")[0],
+        "[*WestBoundLon*]": str(summary.west),
+        "[*EastBoundLon*]": str(summary.east),
+        "[*SouthBoundLat*]": str(summary.south),
+        "[*NorthBoundLat*]": str(summary.north),
+        "[*SiteCount*]": str(summary.sites),
+        "[*GranuleCount*]": str(summary.granules),
+        "[*ImageCount*]": str(summary.images),
+        "[*FileSize*]": convert_size(summary.size_bytes),
+        "[*DistributorFormat*]": "JPEG",
+    }
+    with recordMetrics.stage("render"):
+        xmlText = template.render(myDict)
+    for x in template.missing(myDict):
+        logger.warning("%s left unfilled in %s", x, summary.parent_id)
+    return xmlText, inputHash
 
 
 def convert_size(size_bytes):
@@ -402,277 +696,528 @@ def convert_size(size_bytes):
     return sizeString
 
 
-def getFileSize(data):
+def resolveRecord(csvFileName):
+    """Resolves one tar name against the lookup tables, one lookup at a time.
+
+    Returns the same Resolution a BatchResolver would; oneRecordPerFile
+    resolves whole batches instead, and this is used when processRecord is
+    called without one.
+    """
     try:
-        # The original developer's exact logic
-        fileSize = str(data).split(",")
-        fileSize = fileSize[2]
-        fileSize = fileSize.replace("'", "")
-        fileSize = fileSize.replace("]", "")
-        fileSize = fileSize.strip()
-        fileSize = convert_size(int(fileSize))
-        return fileSize
-    except Exception:
-        # Our safety net: if it's a dummy file, short string, or blank line, just return 0!
-        return "0"
-
-
-def oneRecordPerFile():
+        granule = parse_granule_name(csvFileName)
+    except GranuleNameError:
+        return unparsed(csvFileName)
+    lookupFile, myTemplate = DESIGNS[granule.design]
+
+    siteName = granule.site
+    # Pass the filename so the function filters by the specific Mission!
+    with recordMetrics.stage("date_range"):
+        missionStart = getDateRange(lookupFile, "min", str(csvFileName))
+        missionEnd = getDateRange(lookupFile, "max", str(csvFileName))
+
+    # We pass csvFileName so the store knows to dual-match the Mission!
+    with recordMetrics.stage("lookup"):
+        siteRow = lookupStore.site_row(lookupFile, siteName, str(csvFileName))
+    if siteRow is None:
+        return Resolution(
+            csvFileName,
+            granule,
+            lookupFile,
+            myTemplate,
+            siteName,
+            missionStart,
+            missionEnd,
+            *[None] * 5,
+            unresolved=["site"],
+        )
+
+    island = siteRow["ISLAND"]
+    with recordMetrics.stage("lookup"):
+        dictionaryRow = lookupStore.dictionary_row(island)
+        islandRow = lookupStore.island_row(island)
+        regionRow = None
+        if islandRow is not None:
+            regionRow = lookupStore.region_row(islandRow["Region_Code"])
+        shipRow = lookupStore.ship_row(siteRow["MISSION"][0] + siteRow["MISSION"][1])
+    rows = (dictionaryRow, islandRow, regionRow, shipRow)
+    return Resolution(
+        csvFileName,
+        granule,
+        lookupFile,
+        myTemplate,
+        siteName,
+        missionStart,
+        missionEnd,
+        siteRow,
+        *rows,
+        unresolved=[
+            dimension for dimension, row in zip(DIMENSIONS[2:], rows) if row is None
+        ],
+    )
+
+
+def processRecord(
+    mnfRecord, csvFileName, myUUID, currentDate, previousHash=None, resolution=None
+):
+    """Renders one manifest row's XML from its resolved lookup rows.
+
+    This does no writing of its own so that it can run in a worker process;
+    the UUID is assigned beforehand and the caller writes the result.
+
+    Args:
+        mnfRecord (ManifestRecord): One parsed row of a .mnf file.
+        csvFileName (string): The tar filename from getTarFileName(mnfRecord).
+        myUUID (string): The UUID getUUID assigned to csvFileName.
+        currentDate (date): Date stamped into the record.
+        previousHash (string): Input hash from the run journal, if the granule
+            was written before. Rendering is skipped when nothing changed.
+        resolution (Resolution): csvFileName's lookup rows from a
+            BatchResolver; resolveRecord looks them up if not given.
+
+    Returns:
+        tuple: (xmlRecord, badEntries, inputHash). xmlRecord holds the writeXml
+        arguments, or is None if the record was skipped or is unchanged.
+        badEntries lists the {filename: reason} dicts destined for
+        badFileList, one per lookup that failed. inputHash covers the
+        manifest row, every lookup row used, the template version and the
+        project; it is None if resolution failed.
     """
-    myFileList - List of .mnf files found in current working directory.
-        This is generated by the getFileList function.
+    if resolution is None:
+        resolution = resolveRecord(csvFileName)
+    badEntries = []
+    for dimension in resolution.unresolved:
+        reason = UNRESOLVED_REASONS[dimension]
+        logger.warning("Skipped processing on this file: %s (%s)", csvFileName, reason)
+        badEntries.append({csvFileName: reason})
+    if resolution.site_row is None:
+        return None, badEntries, None
+
+    siteRow = resolution.site_row
+    logger.debug(
+        "%s RECORD FOUND: %s, site %s in %s",
+        resolution.granule.design.upper(),
+        csvFileName,
+        resolution.site,
+        resolution.lookup_file,
+    )
+    logger.debug(
+        "Mission %s, %s images, island %s, surveyed %s",
+        siteRow["MISSION"],
+        siteRow["NUMBER OF IMAGES"],
+        siteRow["ISLAND"],
+        siteRow["DATE"],
+    )
+
+    site = siteContext(resolution)
+    if site is None:
+        return None, badEntries, None
+
+    # Manifest columns the XML doesn't use (md5, delivery date) are left out.
+    inputHash = input_hash(
+        [mnfRecord.tar_name, mnfRecord.size_bytes], site.inputs, str(myUUID)
+    )
+    if inputHash == previousHash:
+        return None, badEntries, inputHash
 
-    file - Current file in iteration of the myFileList list of mnf files.
+    xmlText = renderGranule(
+        site, csvFileName, convert_size(mnfRecord.size_bytes), currentDate, myUUID
+    )
+    if not validRecord(xmlText, csvFileName):
+        badEntries.append({csvFileName: "invalid XML"})
+        return None, badEntries, None
+    xmlRecord = (
+        xmlText,
+        csvFileName,
+        site.regionName,
+        site.mission,
+        site.fixedOrRandom,
+    )
+    return xmlRecord, badEntries, inputHash
+
+
+def oneRecordPerFile(
+    workers=1,
+    manifests=None,
+    incremental=True,
+    failFast=False,
+    reader=None,
+    failuresFile=None,
+    parents=False,
+    records=None,
+    appendFailures=False,
+):
+    """
+    reader - Streams parsed rows from every .mnf file found in the current
+        working directory (via getFileList), or from manifests if given.
+        Blank and malformed lines are skipped and counted by reason. Watch
+        mode passes its own ManifestReader holding only the unhandled rows.
 
-    mnfData - This is the string extracted from the current file in the
-        iteration of the myFileList list.
+    mnfRecord - The current ManifestRecord: tar name, md5, size in bytes,
+        source UUID and date from one manifest line.
 
     siteName - Site name code extracted from the filename listed in each
         mnf file. This will be used to extract relevant data from the
         data csv file.
 
+    workers - Number of processes to resolve and render records with. With
+        more than one, rows are fanned out to a process pool that shares the
+        already loaded lookup tables and compiled templates. UUIDs are still
+        assigned, and files still written, in manifest order by this process,
+        so the output is identical to a serial run.
+
+    incremental - Skip granules whose inputs hash the same as when the run
+        journal last recorded writing them. A rerun after an interruption
+        therefore resumes after the last committed record, and a lookup-table
+        edit only regenerates the granules that used the edited rows. Pass
+        False to regenerate everything (the journal is still updated).
+
+    failFast - Stop at the first record that can't be generated instead of
+        carrying on and reporting it in badFileList.
+
+    failuresFile - Also write every failure to this filename,reason CSV as it
+        happens. The summary only lists the first DEFAULT_LISTED_FAILURES.
+
+    appendFailures - Add to failuresFile rather than starting it again, so
+        it keeps the failures of every poll in watch mode.
+
+    parents - Also write the parent record of every collection (parentRecordID)
+        the granules belong to, from totals gathered as each batch is resolved
+        (see collection_records.py). Unchanged parent records are skipped like
+        granules. Nothing is written for them if the run stops early.
+
+    records - ManifestRecords to generate instead of reading any manifest;
+        --regenerate-affected passes the ones the run journal stored for the
+        granules it found affected.
+
+    The run is a pipeline of stages that each pull from the one before, so
+    nothing is collected up front and memory stays flat however many
+    manifests and rows are fed in:
+        read     ManifestReader, one manifest line at a time
+        resolve  recordJobs, RESOLVE_BATCH_SIZE records per BatchResolver pass
+        render   processRecord, at most RENDER_WINDOW records per worker ahead
+        write    a background XmlWriter, whose bounded queue blocks
+                 rendering when the disk falls behind
+    Files are written atomically as UTF-8, and a granule is only recorded in
+    the run journal once its file is on disk, along with the lookup rows and
+    template it depends on (see dependency_index.py). Failures and skipped
+    lines are counted in full but only the first few are kept to report.
+
+    Returns a summary dict of the run (counts, failures, skipped lines) that
+    main() reports as JSON in batch mode. Its "report" entry is the
+    Instrumentation run report: time per stage, throughput, the slowest
+    records and skip reasons by category.
     """
-    myFileList = getFileList(myDirectory)
-    currentDate = date.today()
-    myLookup = ""
-
-    print("\nTHIS IS YOUR FILE LIST: " + str(myFileList))
-    for file in myFileList:
-        dataCount = 0
-        # print("STARTING WITH THIS FILE: " + str(file))
-        mnfDataList = parseMnf(file)
-        listLength = str(len(mnfDataList))
-        print("YOU SHOULD SEE THIS NUMBER OF RECORDS: " + listLength)
-        # print("HERE IS YOUR MNF DATA: " + str(mnfDataList))
-        for mnfData in mnfDataList:
-            dataCount += 1
-            myTemplate = ""
-            if "fixed" in str(mnfData).lower():
-                print("FIXED RECORD FOUND")
-                myLookup = fixedLookup
-                myTemplate = "xmlTemplate_fixed.xml"
-            elif "strs" in str(mnfData).lower():
-                print("STRS RECORD FOUND")
-                myLookup = strsLookup
-                myTemplate = "xmlTemplate_StRS.xml"
-
-            print("\nCURRENTLY WORKING ON FILE NUMBER: " + str(dataCount))
-            csvFileName = getFileName(mnfData)
-            # print("FOUND THIS FILE: " + str(csvFileName))
-
-            if "NCRMP" not in csvFileName:
-                csvFileName = csvFileName.replace("CRMP", "NCRMP")
-
-            siteName = getSiteName(str(csvFileName))
-            # print("HERE IS YOUR SITENAME: "+ siteName)
-            fileSize = getFileSize(mnfData)
-
-            # Pass the filename so the function filters by the specific Mission!
-            missionStart = getDateRange(myLookup, "min", str(csvFileName))
-            startString = str(missionStart).split(" ")
-            missionStart = startString[0]
-
-            missionEnd = getDateRange(myLookup, "max", str(csvFileName))
-            endString = str(missionEnd).split(" ")
-            missionEnd = endString[0]
-
-            try:
-                # We pass csvFileName so the function knows to dual-match the Mission!
-                rowNumber = getRowNumber(siteName, myLookup, "SITE", str(csvFileName))
-            except:
-                rowNumber = False
-            print("HERE IS YOUR ROW NUMBER: " + str(rowNumber))
-            print("HERE IS YOUR SITE NAME: " + str(siteName))
-            print("HERE IS YOUR LOOKUP FILE: " + str(myLookup))
-            if rowNumber is not False:
-                mission = getData(rowNumber, myLookup, "MISSION")
-                print("FOUND THIS MISSION: " + str(mission))
-                numberOfImages = getData(rowNumber, myLookup, "NUMBER OF IMAGES")
-                print("FOUND THIS number of images: " + str(numberOfImages))
-                island = getData(rowNumber, myLookup, "ISLAND")
-                print("FOUND THIS ISLAND: " + str(island))
-                surveyDate = getData(rowNumber, myLookup, "DATE")
-                print("FOUND THIS SURVEY DATE: " + str(surveyDate))
-
-                dateString = str(surveyDate)
-                count = len(dateString)
-                year = (
-                    str(surveyDate[count - 4])
-                    + str(surveyDate[count - 3])
-                    + str(surveyDate[count - 2])
-                    + str(surveyDate[count - 1])
-                )
-
-                regionName = getData(rowNumber, myLookup, "REGION").replace(" ", "_")
-
-                fixedOrRandom = ""
-                print("THIS IS THE FILENAME YOU're LOOKING FOR: " + str(csvFileName))
-
-                if "fixed" in str(csvFileName).lower():
-                    fixedOrRandom = "_Fixed"
-                elif "strs" in str(csvFileName).lower():
-                    fixedOrRandom = "_StRS"
+    if reader is None:
+        reader = ManifestReader(myDirectory, manifests)
+    currentDate = datetime.date.today()
+    startTime = time.time()
+    runMetrics = Instrumentation()
+    if validationSchemas is not None:
+        # Compiled here first, so an unusable mirror is reported once.
+        validator = schema_validator(validationSchemas)
+        if validator.unavailable:
+            logger.warning("Checking well-formedness only: %s", validator.unavailable)
+
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Do anything that reads or prompts only once, before the pool exists.
+        getProjectKeyword()
+        lookupStore.load_all()
+        templateRegistry.get("xmlTemplate_fixed.xml")
+        templateRegistry.get("xmlTemplate_StRS.xml")
+        if parents:
+            templateRegistry.get(parentTemplate)
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=initWorker,
+            initargs=(
+                lookupStore,
+                templateRegistry,
+                crcpProjectNumber,
+                logging.getLogger().level,
+                validationSchemas,
+            ),
+        )
 
-                # 2. Build the Parent Record ID
-                if mission == "SE2406":
-                    parentRecordID = (
-                        mission + "_" + year + "_" + regionName + fixedOrRandom + "_sfm"
-                    )
-                else:
-                    parentRecordID = mission + "_" + year + fixedOrRandom + "_sfm"
-
-                eastLon = getData(rowNumber, myLookup, "LONGITUDE")
-                westLon = getData(rowNumber, myLookup, "LONGITUDE")
-                southLat = getData(rowNumber, myLookup, "LATITUDE")
-                northLat = getData(rowNumber, myLookup, "LATITUDE")
-            else:
-                myDict = {csvFileName: "rowNumber issue"}
-                print("Skipped processing on this file: " + str(csvFileName))
-                badFileList.append(myDict)
-            try:
-                dictionaryRowNumber = getRowNumber(
-                    island, dictionaryFileName, "Island_Code"
-                )
-            except:
-                dictionaryRowNumber = False
+    collections = CollectionAggregator() if parents else None
+    dependencyIndex = DependencyIndex(lookupStore, templateRegistry)
+    mnfRecords = reader.records() if records is None else iter(records)
+    jobs = recordJobs(mnfRecords, currentDate, incremental, runMetrics, collections)
+    if executor is None:
+        results = ((job, timedProcessRecord(*job)) for job in jobs)
+    else:
+        results = mapInOrder(
+            executor, timedProcessRecord, jobs, workers * RENDER_WINDOW
+        )
 
-            if dictionaryRowNumber is not False:
-                islandKeywords = getData(
-                    dictionaryRowNumber, dictionaryFileName, "CoRIS Region"
-                )
-                islandOceanKeywords = getData(
-                    dictionaryRowNumber, dictionaryFileName, "CoRIS Ocean"
-                )
-                islandFullName = getData(
-                    dictionaryRowNumber, dictionaryFileName, "ISLAND"
-                )
-                gcmdKeyword = getData(
-                    dictionaryRowNumber, dictionaryFileName, "GCMD Keyword"
+    # Files are written on a background thread, which hands back the ones
+    # that made it to disk (so the journal is only updated from here) and
+    # the ones that couldn't be written.
+    writer = XmlWriter()
+    dateStamp = datetime.datetime.today().strftime("%Y_%m_%d")
+    runFailures = FailureLog(path=failuresFile, append=appendFailures)
+
+    def drainWriter():
+        nonlocal writtenCount, parentsWritten
+        for (
+            tarFileName,
+            inputHash,
+            mnfRecord,
+            resolution,
+        ), outputPath in writer.completed():
+            if resolution is None:
+                runJournal.record(tarFileName, inputHash, os.path.abspath(outputPath))
+                parentsWritten += 1
+                continue
+            runJournal.record(
+                tarFileName,
+                inputHash,
+                os.path.abspath(outputPath),
+                dependencyIndex.dependencies(resolution, crcpProjectNumber),
+                mnfRecord,
+            )
+            writtenCount += 1
+        for (tarFileName, *_), outputPath, error in writer.failures():
+            logger.error("Could not write %s: %s", outputPath, error)
+            badEntry = {tarFileName: "write error"}
+            badFileList.append(badEntry)
+            runFailures.append(badEntry)
+            runMetrics.skip("write error")
+
+    recordCount = 0
+    writtenCount = 0
+    unchangedCount = 0
+    parentsWritten = 0
+    parentsUnchanged = 0
+    stoppedEarly = False
+    # The input hash of every granule handed to the writer this run. A tar
+    # listed twice is checked against it rather than the journal, which the
+    # writer thread may not have updated yet when the second copy is read.
+    submittedHashes = {}
+    try:
+        for dataCount, (job, (result, metrics)) in enumerate(results, 1):
+            logger.debug("FINISHED FILE NUMBER: %d (%s)", dataCount, job[1])
+            recordCount = dataCount
+            runMetrics.merge(metrics)
+            xmlRecord, badEntries, inputHash = result
+            badFileList.extend(badEntries)
+            runFailures.extend(badEntries)
+            for badEntry in badEntries:
+                for reason in badEntry.values():
+                    runMetrics.skip(reason)
+            if xmlRecord is not None and submittedHashes.get(job[1]) == inputHash:
+                unchangedCount += 1
+            elif xmlRecord is not None:
+                submittedHashes[job[1]] = inputHash
+                outputPath = xmlOutputPath(*xmlRecord[1:], dateStamp=dateStamp)
+                writer.submit(
+                    outputPath, xmlRecord[0], tag=(job[1], inputHash, job[0], job[5])
                 )
-            else:
-                myDict = {csvFileName: "dictionaryRowNumber issue"}
-                print("Skipped processing on this file: " + str(csvFileName))
-                badFileList.append(myDict)
-
-            try:
-                islandRowNumber = getRowNumber(island, islandLookup, "Island_Code")
-            except:
-                islandRowNumber = False
-
-            if islandRowNumber is not False:
-                regionName = getData(islandRowNumber, islandLookup, "Region_Name")
-                regionCode = getData(islandRowNumber, islandLookup, "Region_Code")
-            else:
-                myDict = {csvFileName: "islandRowNumber issue"}
-                print("Skipped processing on this file: " + str(csvFileName))
-                badFileList.append(myDict)
-
-            regionKeywordLookupTable = "Region_Keywords.csv"
-
-            try:
-                regionNumber = getRowNumber(
-                    regionCode, regionKeywordLookupTable, "Region_Code"
+                drainWriter()
+                if failFast and writer.failed:
+                    stoppedEarly = True
+                    break
+            elif inputHash is not None:
+                unchangedCount += 1
+                runJournal.record_dependencies(
+                    job[1],
+                    dependencyIndex.dependencies(job[5], crcpProjectNumber),
+                    job[0],
                 )
-            except:
-                regionNumber = False
+            elif failFast:
+                stoppedEarly = True
+                break
 
-            if regionNumber is not False:
-                regionCountryKeyword = getData(
-                    regionNumber, regionKeywordLookupTable, "CoRIS Country"
-                )
-                regionOceanKeyword = getData(
-                    regionNumber, regionKeywordLookupTable, "CoRIS Ocean"
-                )
-            else:
-                myDict = {csvFileName: "regionNumber issue"}
-                print("Skipped processing on this file: " + str(csvFileName))
-                badFileList.append(myDict)
-
-            missionCode = mission[0] + mission[1]
-            print("MISSION CODE: " + str(missionCode))
-            shipLookup = "shipLookup.csv"
-            try:
-                missionLookupNumber = getRowNumber(
-                    missionCode, shipLookup, "Ship_Two_letter_code"
-                )
-            except:
-                missionLookupNumber = False
-
-            if missionLookupNumber is not False:
-                shipName = getData(missionLookupNumber, shipLookup, "Ship Keyword")
-            else:
-                myDict = {csvFileName: "shipName lookup issue"}
-                print("Skipped processing on this file: " + str(csvFileName))
-                badFileList.append(myDict)
-
-            # tarFileName = str(file)
-            # tarFileName = tarFileName.replace(".mnf","")
-
-            myUUID = getUUID(csvFileName)
-
-            print("Here are your variables: ")
-            print(str(rowNumber))
-            print(str(missionLookupNumber))
-            print(str(regionNumber))
-            print(str(islandRowNumber))
-            print(str(dictionaryRowNumber))
-            if (
-                rowNumber is not False
-                and missionLookupNumber is not False
-                and regionNumber is not False
-                and islandRowNumber is not False
-                and dictionaryRowNumber is not False
-            ):
-                # Call the function that edits the xml template with all the gathered information
-                xmlText = editTemplateForReal(
-                    myTemplate,
-                    surveyDate,
-                    islandKeywords,
-                    islandOceanKeywords,
-                    missionStart,
-                    missionEnd,
-                    siteName,
-                    eastLon,
-                    westLon,
-                    northLat,
-                    southLat,
-                    islandFullName,
-                    regionName,
-                    fileSize,
-                    csvFileName,
-                    year,
-                    parentRecordID,
-                    regionCountryKeyword,
-                    regionOceanKeyword,
-                    shipName,
-                    currentDate,
-                    csvFileName,
-                    gcmdKeyword,
-                    myUUID,
+        if collections is not None and not stoppedEarly:
+            for collection in collections.summaries():
+                previousHash = None
+                if incremental:
+                    previousHash = runJournal.previous_hash(collection.parent_id)
+                with runMetrics.stage("parents"):
+                    xmlText, inputHash = renderParentRecord(
+                        collection, currentDate, previousHash
+                    )
+                runMetrics.merge(recordMetrics.drain())
+                if xmlText is None:
+                    parentsUnchanged += 1
+                    continue
+                if not validRecord(xmlText, collection.parent_id):
+                    badEntry = {collection.parent_id: "invalid XML"}
+                    badFileList.append(badEntry)
+                    runFailures.append(badEntry)
+                    runMetrics.skip("invalid XML")
+                    continue
+                writer.submit(
+                    parentOutputPath(collection.parent_id, dateStamp),
+                    xmlText,
+                    tag=(collection.parent_id, inputHash, None, None),
                 )
-                writeXml(xmlText, csvFileName, regionName, mission, fixedOrRandom)
-            elif rowNumber == False:
-                print("rowNumber is False!!!!!!!!!!!!!")
-            elif missionLookupNumber == False:
-                print("missionLookupNumber is False!!!!!!!!!!!!!")
-            elif regionNumber == False:
-                print("regionNumber is False!!!!!!!!!!!!!")
-            elif islandRowNumber == False:
-                print("islandRowNumber is False!!!!!!!!!!")
-            elif dictionaryRowNumber == False:
-                print("dictionaryRowNumber is False!!!!!!!!!!!!")
+                drainWriter()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        writeSummary = writer.close()
+        drainWriter()
+        runFailures.close()
+        uuidRegistry.close()
+        runJournal.close()
+
+    runMetrics.add_time("write", writeSummary["writeSeconds"], writeSummary["written"])
+    runMetrics.add_time("write_wait", writeSummary["waitSeconds"])
+
+    for manifest, lineNumber, reason in reader.skipped_lines:
+        logger.warning("Skipped line %d of %s: %s", lineNumber, manifest, reason)
+
+    elapsedSeconds = time.time() - startTime
+    runMetrics.count("written", writtenCount)
+    runMetrics.count("unchanged", unchangedCount)
+    runMetrics.count("failed", recordCount - writtenCount - unchangedCount)
+    report = runMetrics.report(recordCount, elapsedSeconds)
+    report["skippedManifestLines"] = dict(reader.skipped)
+    logger.info(
+        "%d records in %.1fs (%s/s): %d written, %d unchanged, %d failed",
+        recordCount,
+        elapsedSeconds,
+        report["recordsPerSecond"],
+        writtenCount,
+        unchangedCount,
+        recordCount - writtenCount - unchangedCount,
+    )
+    if reader.skipped:
+        logger.info("SKIPPED MANIFEST LINES: %s", dict(reader.skipped))
+
+    summary = {
+        "manifests": reader.manifests_read,
+        "records": recordCount,
+        "written": writtenCount,
+        "unchanged": unchangedCount,
+        "failed": recordCount - writtenCount - unchangedCount,
+        "failures": [
+            {"file": fileName, "reason": reason}
+            for badEntry in runFailures
+            for fileName, reason in badEntry.items()
+        ],
+        "skippedLines": dict(reader.skipped),
+        "stoppedEarly": stoppedEarly,
+        "elapsedSeconds": round(elapsedSeconds, 3),
+        "report": report,
+    }
+    if runFailures.omitted:
+        summary["failuresNotListed"] = runFailures.omitted
+    if collections is not None:
+        summary["parents"] = {
+            "collections": len(collections),
+            "written": parentsWritten,
+            "unchanged": parentsUnchanged,
+        }
+    if validationSchemas is not None:
+        summary["validation"] = {
+            "schemas": validationSchemas,
+            "skipped": schema_validator(validationSchemas).unavailable,
+        }
+    return summary
+
+
+def recordJobs(
+    mnfRecords, currentDate, incremental=True, metrics=None, collections=None
+):
+    """Yields processRecord arguments, assigning each record its UUID.
+
+    Records are taken RESOLVE_BATCH_SIZE at a time and resolved against the
+    lookup tables with one BatchResolver pass per batch. getUUID and the run
+    journal lookup happen here too, in the parent process and in manifest
+    order, so only one process ever touches either store. The time spent on
+    each is added to metrics, if given. Each resolved batch is also added to
+    collections (a CollectionAggregator), if given, unchanged granules
+    included.
+    """
+    if metrics is None:
+        metrics = Instrumentation()
+    resolver = BatchResolver(lookupStore)
+    for batch in iterBatches(mnfRecords, RESOLVE_BATCH_SIZE):
+        csvFileNames = [getTarFileName(mnfRecord) for mnfRecord in batch]
+        with metrics.stage("resolve"):
+            resolutions = resolver.resolve(csvFileNames)
+        if collections is not None:
+            with metrics.stage("collect"):
+                collections.add(batch, resolutions)
+        for mnfRecord, csvFileName, resolution in zip(batch, csvFileNames, resolutions):
+            previousHash = None
+            if incremental:
+                with metrics.stage("journal"):
+                    previousHash = runJournal.previous_hash(csvFileName)
+            with metrics.stage("uuid"):
+                myUUID = getUUID(csvFileName)
+            yield mnfRecord, csvFileName, myUUID, currentDate, previousHash, resolution
+
+
+def iterBatches(iterable, size):
+    """Yields lists of up to size consecutive items of iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def timedProcessRecord(*job):
+    """Runs processRecord and returns (result, drained recordMetrics).
+
+    Used for both serial and pool runs, so the per-stage times collected in
+    whichever process did the work travel back with the record.
+    """
+    start = time.perf_counter()
+    result = processRecord(*job)
+    recordMetrics.record_duration(job[1], time.perf_counter() - start)
+    return result, recordMetrics.drain()
 
 
-def writeXml(xmlData, xmlFileName, regionName, mission, fixedOrRandom):
+def mapInOrder(executor, function, jobs, window):
+    """Like executor.map, but pulls at most window jobs ahead of the results.
+
+    executor.map submits every job before returning, which would read all
+    manifests into memory; this keeps the pool busy with bounded memory.
+    Yields (job, result) pairs in job order.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append((job, executor.submit(function, *job)))
+        if len(pending) >= window:
+            job, future = pending.popleft()
+            yield job, future.result()
+    while pending:
+        job, future = pending.popleft()
+        yield job, future.result()
+
+
+def initWorker(store, registry, projectNumber, logLevel=logging.WARNING, schemas=None):
+    """Installs the parent's lookup store, templates, project, log level and
+    validation schemas."""
+    global lookupStore, templateRegistry, crcpProjectNumber, validationSchemas
+    lookupStore = store
+    templateRegistry = registry
+    crcpProjectNumber = projectNumber
+    validationSchemas = schemas
+    configureLogging(logLevel)
+
+
+def xmlOutputPath(xmlFileName, regionName, mission, fixedOrRandom, dateStamp=None):
+    """Returns where the XML for xmlFileName goes, without touching the disk.
+
+    oneRecordPerFile passes the dateStamp it took at the start of the run, so
+    a run that crosses midnight still writes into one set of folders.
+    """
     # 1. Clean up the batch type (removes any trailing underscores like "_StRS")
     batch_type = fixedOrRandom.replace("_", "")
 
     # 2. Setup folder based on your new format (mission_StRS_Region_yyyy_mm_dd)
-    date_stamp = datetime.datetime.today().strftime("%Y_%m_%d")
-    output_folder = f"{mission}_{batch_type}_{regionName}_{date_stamp}"
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    date_stamp = dateStamp or datetime.datetime.today().strftime("%Y_%m_%d")
+    output_folder = os.path.join(
+        outputRoot, f"{mission}_{batch_type}_{regionName}_{date_stamp}"
+    )
 
     # 3. Clean the filename
     xmlFileName = str(xmlFileName).replace(".tar", "")
@@ -680,111 +1225,438 @@ def writeXml(xmlData, xmlFileName, regionName, mission, fixedOrRandom):
     xmlFileName = xmlFileName + ".xml"
 
     # 4. Create final path inside the folder
-    output_path = os.path.join(output_folder, xmlFileName)
+    return os.path.join(output_folder, xmlFileName)
 
-    # 5. Save the file
-    with open(output_path, "w") as f:
-        f.write(xmlData)
 
+def parentOutputPath(parentRecordID, dateStamp=None):
+    """Returns where the parent record for parentRecordID goes.
 
-def getData(rowNumber, csvFileName, columnName):
-    df = pd.read_csv(csvFileName)
-    myVariable = df.loc[[rowNumber], [columnName]]
-    variableData = myVariable.iloc[0][columnName]
-    # print(variableData)
-    return variableData
-
-
-def getRowNumber(dataInHand, csvFileName, columnOfInterest, targetFilename=None):
-    """
-    Gets the row number where dataInHand equals the columnOfInterest.
-    If targetFilename is provided, it does a dual-match to ensure the MISSION
-    in the CSV matches the mission in the file being processed (If you give it the csvFileName (which contains the mission name like MP2011), it will filter the results so the MISSION column matches the file name).
+    Parent records get a folder of their own, next to the granule folders,
+    since one collection can span several of those.
     """
-    import pandas as pd
+    date_stamp = dateStamp or datetime.datetime.today().strftime("%Y_%m_%d")
+    return os.path.join(outputRoot, f"parents_{date_stamp}", parentRecordID + ".xml")
 
-    df = pd.read_csv(csvFileName)
 
-    # Find all rows that match the primary target (e.g., SITE == OCC-OAH-005)
-    matches = df[df[columnOfInterest] == dataInHand]
-
-    if matches.empty:
-        return False
-
-    # If we passed the filename being processed, do the dual-match for the Mission
-    if targetFilename:
-        for index, row in matches.iterrows():
-            mission_in_row = str(row.get("MISSION", ""))
-            # If the mission (e.g., "MP2011") is inside the filename, it's the exact right row
-            if mission_in_row and mission_in_row in targetFilename:
-                return index
-
-    # Fallback for other lookups (like Island or Region) that only need a single match
-    return matches.index[0]
+def writeXml(xmlData, xmlFileName, regionName, mission, fixedOrRandom):
+    """Writes one XML synchronously (atomically, as UTF-8) and returns its path."""
+    output_path = xmlOutputPath(xmlFileName, regionName, mission, fixedOrRandom)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    atomic_write(output_path, xmlData)
+    return output_path
 
 
-def getFileName(mnfData):
+def getTarFileName(mnfRecord):
     """
-    Gets the filename of the CSV file from the mnf data file.
+    Gets the tar filename from a manifest record, fixing up old CRMP names.
     """
-    extensionList = ["tar", "csv", "dat"]
-    for extension in extensionList:
-        if extension == "csv":
-            regex = ".*[.]csv"
-        elif extension == "tar":
-            regex = ".*[.]tar"
-        elif extension == "dat":
-            regex = ".*[.]dat"
-        for item in mnfData:
-            # print("\n\nLooking through this data: " + str(item))
-            filename = re.findall(regex, item)
-            if len(filename) > 0:
-                filename = (
-                    str(filename).replace("[", "").replace("'", "").replace("]", "")
-                )
-                # print(str(filename))
-                return filename
-
+    return canonical_name(mnfRecord.tar_name)
 
-def getSiteName(fileName):
-    splitsies = fileName.split("_", 8)
-    siteName = str(splitsies[7])
-    return siteName
 
-
-def parseMnf(mnfFile):
-    # df = pd.read_csv(mnfFile)
-    # Open file
-    rowList = []
-    with open(mnfFile) as file_obj:
-        # Create reader object by passing the file
-        # object to reader method
-        reader_obj = csv.reader(file_obj)
-        # Iterate over each row in the csv
-        # file using reader object
-        for row in reader_obj:
-            rowList.append(row)
-    return rowList
-
-
-def setup():
+def setup(workers=1, incremental=True):
     """_summary_"""
     print("1. Run the application.")
     print("2. Exit the program.")
     selection = input("Enter your selection now:\n")
     if selection == "1":
-        oneRecordPerFile()
+        return oneRecordPerFile(workers, incremental=incremental)
     elif selection == "2":
         print("Thanks for using this program. Goodbye.")
         sys.exit()
     elif selection != "1" and selection != "2" and selection != "3":
         print("Please follow directions")
-        setup()
+        return setup(workers, incremental)
+
+
+def expandInputs(inputs):
+    """Yields the .mnf files named by a list of manifest files and directories."""
+    for path in inputs:
+        if os.path.isdir(path):
+            yield from sorted(iter_manifests(path))
+        else:
+            yield path
+
+
+def checkProject(arguments):
+    """Registers an unknown project number under --project-name without
+    prompting; returns an error message if there is no name to give it."""
+    if (
+        str(crcpProjectNumber) != "743"
+        and lookupStore.project_name(crcpProjectNumber) is None
+    ):
+        if not arguments.projectName:
+            return (
+                "unknown project number "
+                + str(crcpProjectNumber)
+                + "; pass --project-name to register it"
+            )
+        registerProject(crcpProjectNumber, arguments.projectName)
+    return None
+
 
+def runBatch(arguments):
+    """Runs the generator without prompting and returns (exit status, summary).
 
-# Main goes here I guess.
-setup()
-print("\n")
-print(str(len(badFileList)))
-for badFile in badFileList:
-    print(str(badFile))
+    Exit status: 0 when every record was written or unchanged and no manifest
+    line was skipped, 1 when the run finished with failed records or skipped
+    lines, 2 for a configuration error (nothing generated), and 3 when
+    --fail-fast stopped the run early.
+    """
+    global outputRoot
+    outputRoot = arguments.outputRoot
+
+    missing = [path for path in arguments.inputs if not os.path.exists(path)]
+    if missing:
+        return 2, {
+            "status": "error",
+            "error": "inputs not found: " + ", ".join(missing),
+        }
+
+    error = checkProject(arguments)
+    if error:
+        return 2, {"status": "error", "error": error}
+
+    summary = oneRecordPerFile(
+        arguments.workers,
+        expandInputs(arguments.inputs),
+        not arguments.full,
+        arguments.failFast,
+        failuresFile=arguments.failures,
+        parents=arguments.parents,
+    )
+    return batchStatus(summary), summary
+
+
+def batchStatus(summary):
+    """Returns the exit status for a batch run's summary and records it there."""
+    if summary["stoppedEarly"]:
+        status = 3
+    elif summary["failed"] or summary["skippedLines"]:
+        status = 1
+    else:
+        status = 0
+    summary["status"] = ["ok", "failures", "error", "stopped"][status]
+    return status
+
+
+def regenerateAffected(arguments):
+    """Regenerates only the granules whose lookup rows or template changed.
+
+    Every key in the run journal's dependency index (see dependency_index.py)
+    is digested again from the CSVs and templates as they are now. The
+    granules of this run's project recorded with a key whose digest changed
+    are regenerated from the manifest rows the journal stored for them, so
+    no manifest is read. Returns (exit status, summary) like runBatch; the
+    summary also counts the changed keys per file under "changedKeys".
+    """
+    global outputRoot
+    outputRoot = arguments.outputRoot
+
+    dependencyIndex = DependencyIndex(lookupStore, templateRegistry)
+    stale = runJournal.stale_dependencies(dependencyIndex.digest)
+    project = (projectLookup, dependency_key("projectNumber", int(crcpProjectNumber)))
+    filenames = runJournal.dependents(stale, among=project)
+    records = [
+        ManifestRecord(*fields) for _, fields in runJournal.manifest_records(filenames)
+    ]
+    logger.info(
+        "%d lookup keys changed; regenerating %d granules", len(stale), len(records)
+    )
+
+    summary = oneRecordPerFile(
+        arguments.workers,
+        [],
+        not arguments.full,
+        arguments.failFast,
+        failuresFile=arguments.failures,
+        records=records,
+    )
+    summary["changedKeys"] = dict(Counter(source for source, _, _ in stale))
+    summary["affected"] = len(filenames)
+    return batchStatus(summary), summary
+
+
+def watchFolder(arguments):
+    """Generates XML for manifests dropped into arguments.watch until stopped.
+
+    Lookup tables and compiled templates are loaded at startup and stay
+    loaded between polls. Every poll reloads any lookup CSV or template
+    that changed on disk since, and then
+    processes only the manifest rows the ManifestWatcher hasn't handled yet;
+    after a lookup or template change every manifest is read again, and the
+    run journal regenerates just the granules whose inputs changed. Each
+    poll that processed anything prints its summary as one JSON line.
+    --full and --fail-fast apply to every poll; a poll stopped by
+    --fail-fast leaves its manifests unhandled, so they are picked up
+    again on the next start. An unregistered project number needs
+    --project-name, as in a batch run; without it nothing is watched and
+    2 is returned. Returns 0 when interrupted with Ctrl-C, 3 when
+    --fail-fast stopped it.
+    """
+    from manifest_watcher import ManifestWatcher
+
+    global outputRoot
+    outputRoot = arguments.outputRoot
+    error = checkProject(arguments)
+    if error:
+        logger.error(error)
+        return 2
+    getProjectKeyword()
+    lookupStore.load_all()
+    templateRegistry.get("xmlTemplate_fixed.xml")
+    templateRegistry.get("xmlTemplate_StRS.xml")
+    if arguments.failures:
+        # Started afresh once; every poll then appends its own failures.
+        FailureLog(path=arguments.failures).close()
+    watcher = ManifestWatcher(arguments.watch, runJournal, arguments.settleSeconds)
+    logger.info("Watching %s for .mnf files", arguments.watch)
+    try:
+        while True:
+            changed = lookupStore.refresh() + templateRegistry.refresh()
+            if changed:
+                logger.info("Reloading %s", ", ".join(changed))
+                watcher.rescan()
+            pending = watcher.poll()
+            if pending:
+                badFileList.clear()
+                reader = ManifestReader(arguments.watch, pending)
+                summary = oneRecordPerFile(
+                    arguments.workers,
+                    incremental=not arguments.full,
+                    failFast=arguments.failFast,
+                    reader=reader,
+                    failuresFile=arguments.failures,
+                    appendFailures=True,
+                )
+                if not summary["stoppedEarly"]:
+                    watcher.handled(reader)
+                if arguments.report:
+                    writeReport(arguments.report, summary["report"])
+                del summary["report"]
+                print(json.dumps(summary), flush=True)
+                if summary["stoppedEarly"]:
+                    return 3
+            if arguments.once:
+                return 0
+            time.sleep(arguments.pollInterval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        runJournal.close()
+
+
+def configureLogging(level):
+    """Sends log records at level and above to stderr, keeping stdout for the
+    menu and the batch summary."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger().setLevel(level)
+
+
+def logLevel(arguments):
+    """WARNING by default; each -v steps down to INFO then DEBUG, -q to ERROR."""
+    if arguments.quiet:
+        return logging.ERROR
+    return max(logging.DEBUG, logging.WARNING - 10 * arguments.verbose)
+
+
+def projectNumberArgument(text):
+    """argparse type for the project number: kept as typed, but it has to be
+    a number, since projectLookup.csv is keyed by int(projectNumber)."""
+    try:
+        int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a project number: {text!r}")
+    return text
+
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate SfM granule XML from .mnf manifests. With no --input "
+        "this shows the interactive menu and processes the working directory.",
+        epilog="Batch exit status: 0 ok, 1 finished with failures or skipped "
+        "manifest lines, 2 configuration error, 3 stopped by --fail-fast.",
+    )
+    parser.add_argument(
+        "projectNumber",
+        nargs="?",
+        default=743,
+        type=projectNumberArgument,
+        help="CRCP project number (default: 743, NCRMP).",
+    )
+    parser.add_argument(
+        "--input",
+        dest="inputs",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="A .mnf file or a cruise directory of them; repeat for several. "
+        "Runs non-interactively.",
+    )
+    parser.add_argument(
+        "--output-root",
+        dest="outputRoot",
+        default="",
+        help="Folder to create the date-stamped output folders in (default: here).",
+    )
+    parser.add_argument(
+        "--project-name",
+        dest="projectName",
+        help="Name to register for a project number not in projectLookup.csv.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to resolve and render records (default: 1).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Regenerate every granule, even those unchanged since the last run.",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        dest="failFast",
+        action="store_true",
+        help="Stop at the first record that can't be generated.",
+    )
+    parser.add_argument(
+        "--regenerate-affected",
+        dest="regenerateAffected",
+        action="store_true",
+        help="Instead of reading manifests, regenerate just the granules whose "
+        "lookup rows or template changed since they were written. Runs "
+        "non-interactively.",
+    )
+    parser.add_argument(
+        "--validate",
+        nargs="?",
+        const=SCHEMA_DIRECTORY,
+        metavar="SCHEMAS",
+        help="Check every record is well-formed and valid against the ISO 19139 "
+        "schemas mirrored in SCHEMAS (default: the bundled schemas/; see "
+        "schema_validation.py) before writing it. Invalid records are reported "
+        "with their line numbers and not written.",
+    )
+    parser.add_argument(
+        "--parents",
+        action="store_true",
+        help="Also write a parent (collection) record for every parentRecordID "
+        "the granules point at, into a parents_<date> folder.",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep running and generate XML for new or changed .mnf files "
+        "dropped into DIR, reloading lookup tables and templates when they "
+        "change. Stop with Ctrl-C.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        dest="pollInterval",
+        type=float,
+        default=5.0,
+        help="Seconds between checks of the --watch folder (default: 5).",
+    )
+    parser.add_argument(
+        "--settle",
+        dest="settleSeconds",
+        type=float,
+        default=2.0,
+        help="Seconds a manifest must go unmodified before it is read " "(default: 2).",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="With --watch, process what is there now and exit.",
+    )
+    parser.add_argument(
+        "--summary",
+        metavar="FILE",
+        help="Also write the batch summary JSON to FILE.",
+    )
+    parser.add_argument(
+        "--failures",
+        metavar="FILE",
+        help="Write every record that couldn't be generated to FILE as a "
+        "Filename,Reason CSV; the summary lists only the first 1000.",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="FILE",
+        help="Write the run report JSON (stage timings, throughput, slowest "
+        "records, skip reasons) to FILE.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Log progress (-v) or every record's details (-vv).",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="Only log errors, not skipped records.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global crcpProjectNumber, validationSchemas
+    arguments = parseArguments(argv)
+    crcpProjectNumber = arguments.projectNumber
+    validationSchemas = arguments.validate
+    configureLogging(logLevel(arguments))
+
+    if arguments.watch:
+        if arguments.parents:
+            # A poll only sees the rows that are new, not whole collections.
+            print("--parents can't be used with --watch")
+            return 2
+        if not os.path.isdir(arguments.watch):
+            print("Not a folder: " + arguments.watch)
+            return 2
+        return watchFolder(arguments)
+
+    if arguments.regenerateAffected and (arguments.parents or arguments.inputs):
+        # Only the affected granules are regenerated; no manifest is read.
+        print("--regenerate-affected can't be used with --parents or --input")
+        return 2
+
+    if not arguments.inputs and not arguments.regenerateAffected:
+        summary = setup(arguments.workers, not arguments.full)
+        if summary and arguments.report:
+            writeReport(arguments.report, summary["report"])
+        print("\n")
+        print(str(len(badFileList)))
+        for badFile in badFileList:
+            print(str(badFile))
+        if badFileList.omitted:
+            print(str(badFileList.omitted) + " more not listed")
+        return 0
+
+    if arguments.regenerateAffected:
+        status, summary = regenerateAffected(arguments)
+    else:
+        status, summary = runBatch(arguments)
+    if arguments.report and "report" in summary:
+        writeReport(arguments.report, summary["report"])
+    summaryText = json.dumps(summary, indent=2)
+    if arguments.summary:
+        with open(arguments.summary, "w", encoding="utf-8") as f:
+            f.write(summaryText + "\n")
+    print(summaryText)
+    return status
+
+
+def writeReport(fileName, report):
+    with open(fileName, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+# Guarded so worker processes can import this module.
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Background XML Writer
+=====================
+Purpose:
+    Output side of xmlGenerate.py. Rendered documents are handed to a
+    bounded queue and written by a background thread, so rendering the next
+    record overlaps with writing the last one. Every file is written as
+    explicit UTF-8 to a temporary name in the same folder and renamed into
+    place, so an interrupted run never leaves a half-written .xml behind for
+    the harvester to pick up. Output folders are created once per run.
+
+Usage:
+    writer = XmlWriter()
+    writer.submit(outputPath, xmlText, tag=tarFileName)
+    for tag, outputPath in writer.completed():
+        ...  # e.g. record in the run journal, from the submitting thread
+    for tag, outputPath, error in writer.failures():
+        ...
+    summary = writer.close()  # flushes the queue, then {"written", "failed", ...}
+
+    atomic_write(outputPath, xmlText) writes a single file synchronously.
+"""
+
+import os
+import queue
+import threading
+import time
+
+# Rendered documents waiting to be written; bounds memory if the disk is slow.
+DEFAULT_QUEUE_SIZE = 64
+
+_STOP = object()
+
+
+def atomic_write(path, text, encoding="utf-8"):
+    """Writes text to path via a temporary file and an atomic rename."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w", encoding=encoding) as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class XmlWriter:
+    """Writes documents on a background thread, creating folders as needed.
+
+    Any error writing one document is reported through failures() and the
+    thread carries on with the next. With background=False, submit()
+    writes immediately in the calling thread; everything else behaves the
+    same.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, background=True):
+        self._created = set()
+        self._done = queue.SimpleQueue()
+        self._failures = queue.SimpleQueue()
+        self.failed = 0
+        self.written = 0
+        self.write_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(
+                target=self._run, name="XmlWriter", daemon=True
+            )
+            self._thread.start()
+
+    def ensure_folder(self, folder):
+        """Creates folder the first time it is seen this run."""
+        if folder not in self._created:
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._created.add(folder)
+
+    def submit(self, path, text, tag=None):
+        """Queues text to be written to path; blocks while the queue is full.
+
+        Raises:
+            RuntimeError: The writer is closed, or its thread has stopped.
+        """
+        if self._queue is None:
+            self._write(path, text, tag)
+            return
+        if self._thread is None:
+            raise RuntimeError("XmlWriter is closed")
+        start = time.perf_counter()
+        self._put((path, text, tag))
+        self.wait_seconds += time.perf_counter() - start
+
+    def _put(self, item):
+        # Waits in short steps so a thread that has died can't block the
+        # caller forever on a full queue.
+        while True:
+            if not self._thread.is_alive():
+                raise RuntimeError("XmlWriter thread has stopped")
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def completed(self):
+        """Returns the (tag, path) of every file written since the last call."""
+        finished = []
+        while True:
+            try:
+                finished.append(self._done.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def failures(self):
+        """Returns the (tag, path, error) of every failed write since the last
+        call."""
+        failed = []
+        while True:
+            try:
+                failed.append(self._failures.get_nowait())
+            except queue.Empty:
+                return failed
+
+    def close(self):
+        """Writes everything still queued, stops the thread and returns a summary.
+
+        Call completed() and failures() afterwards to collect the last files
+        written and the last failures.
+        """
+        if self._thread is not None:
+            start = time.perf_counter()
+            if self._thread.is_alive():
+                self._put(_STOP)
+            self._thread.join()
+            self.wait_seconds += time.perf_counter() - start
+            self._thread = None
+        return {
+            "written": self.written,
+            "failed": self.failed,
+            "writeSeconds": round(self.write_seconds, 4),
+            "waitSeconds": round(self.wait_seconds, 4),
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._write(*item)
+
+    def _write(self, path, text, tag):
+        start = time.perf_counter()
+        try:
+            self.ensure_folder(os.path.dirname(path))
+            atomic_write(path, text)
+        except Exception as error:
+            self.failed += 1
+            self._failures.put((tag, path, str(error)))
+        else:
+            self.written += 1
+            self._done.put((tag, path))
+        finally:
+            self.write_seconds += time.perf_counter() - start